@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from rest_framework.request import Request
+from .hashing import hash_password, verify_password
+
+UserModel = get_user_model()
+
+class PooledHashingBackend(ModelBackend):
+    """
+    ModelBackend with password checks run in the hashing pool. Used by the
+    login endpoint and the admin alike.
+
+    API logins let HashingBusy through so the view can answer 503; other
+    callers (the admin login form) hash inline rather than fail when the
+    pool is saturated.
+    """
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        inline_when_busy = not isinstance(request, Request)
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as wrong passwords
+            hash_password(password, inline_when_busy=inline_when_busy)
+            return None
+        if verify_password(user, password, inline_when_busy=inline_when_busy) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, BCryptSHA256PasswordHasher, PBKDF2PasswordHasher
+)
+
+# Password hashers with their cost taken from settings
+#
+# Django's hashers compare a stored hash's parameters with these values on
+# every successful login, so raising or lowering a cost setting transparently
+# rehashes each user's password the next time they log in.
+
+class TunableArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
+
+class TunableBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    @property
+    def rounds(self):
+        return settings.BCRYPT_ROUNDS
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PBKDF2_ITERATIONS
@@ -0,0 +1,96 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, is_password_usable, make_password
+
+# Password hashing off the request thread
+#
+# Hashing is CPU-bound and holds the GIL, so it runs in a small process pool
+# owned by each web process. At most AUTH_HASH_CONCURRENCY requests per
+# process wait on the pool at once; the rest get HashingBusy (a 503 from the
+# API views) after AUTH_HASH_WAIT seconds instead of queueing. With threaded
+# gunicorn workers that keeps a login spike from tying up every thread that
+# trading requests need. AUTH_HASH_WORKERS = 0 hashes inline, which is handy for development.
+
+class HashingBusy(Exception):
+    """
+    Every hashing slot stayed taken for AUTH_HASH_WAIT seconds
+    """
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+def _init_worker():
+    # Spawned workers inherit DJANGO_SETTINGS_MODULE but start without apps loaded
+    import django
+    django.setup()
+
+def get_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.AUTH_HASH_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_init_worker)
+            _slots = threading.BoundedSemaphore(settings.AUTH_HASH_CONCURRENCY)
+        return _pool
+
+def _hash(password):
+    return make_password(password)
+
+def _verify(password, encoded):
+    """
+    Check a password; also return a fresh hash when the stored one uses an
+    old algorithm or cost
+    """
+    updated = []
+    valid = check_password(password, encoded, setter=lambda raw: updated.append(make_password(raw)))
+    return valid, updated[0] if updated else None
+
+def _run(fn, *args, inline_when_busy=False):
+    if settings.AUTH_HASH_WORKERS <= 0:
+        return fn(*args)
+    pool = get_pool()
+    if not _slots.acquire(timeout=settings.AUTH_HASH_WAIT):
+        if inline_when_busy:
+            return fn(*args)
+        raise HashingBusy()
+    try:
+        return pool.submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+def hash_password(password, inline_when_busy=False):
+    """
+    Hash for a new password; None gives an unusable password
+    """
+    if password is None:
+        return make_password(None)
+    return _run(_hash, password, inline_when_busy=inline_when_busy)
+
+def hash_passwords(passwords, chunksize=8):
+    """
+    Hash many passwords across the whole pool, for bulk provisioning
+    """
+    passwords = list(passwords)
+    usable = [password for password in passwords if password is not None]
+    if settings.AUTH_HASH_WORKERS <= 0 or len(usable) < 2:
+        hashed = iter([_hash(password) for password in usable])
+    else:
+        hashed = get_pool().map(_hash, usable, chunksize=chunksize)
+    return [make_password(None) if password is None else next(hashed) for password in passwords]
+
+def verify_password(user, password, inline_when_busy=False):
+    """
+    user.check_password() through the pool, saving an upgraded hash if needed.
+    Raises HashingBusy when the pool is saturated, unless `inline_when_busy`.
+    """
+    if not is_password_usable(user.password):
+        return False
+    valid, updated = _run(_verify, password, user.password, inline_when_busy=inline_when_busy)
+    if valid and updated:
+        user.password = updated
+        user.save(update_fields=['password'])
+    return valid
@@ -0,0 +1,102 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+from accounts.provisioning import bulk_provision, provision_user
+from accounts.views import RegisterView
+
+class Rollback(Exception):
+    pass
+
+class QueryCounter:
+    """
+    Count statements without keeping them (the debug query log is capped)
+    """
+    def __init__(self):
+        self.queries = 0
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        if sql.lstrip().upper().startswith(('INSERT', 'UPDATE')):
+            self.writes += 1
+        return execute(sql, params, many, context)
+
+def previous_signup(username, password):
+    """
+    The write chain RegisterView used before provisioning was streamlined
+    """
+    user = User.objects.create(username=username, email=f"{username}@example.com")
+    user.set_password(password)
+    user.save()
+    # The old post_save receiver re-saved the profile on every user save
+    user.profile.save()
+    user.profile.save()
+    Token.objects.get_or_create(user=user)
+
+class Command(BaseCommand):
+    help = "Measure signup throughput and writes per account; everything is rolled back"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200)
+        parser.add_argument('--bulk-count', type=int, default=5000)
+        parser.add_argument('--real-hasher', action='store_true',
+                            help="Keep the configured password hasher instead of a fast one, "
+                                 "to see hashing cost on top of the database writes")
+
+    def run(self, label, count, fn):
+        counter = QueryCounter()
+        try:
+            with transaction.atomic(), connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                fn()
+                elapsed = time.perf_counter() - started
+                raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(
+            f"{label:<24} {count / elapsed:>9.0f} signups/s  "
+            f"{counter.queries / count:>5.2f} queries/signup  {counter.writes / count:>5.2f} writes/signup"
+        )
+
+    def handle(self, *args, **options):
+        # Pool workers load their own settings, so the fast hasher has to run inline
+        fast = {} if options['real_hasher'] else {
+            'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+            'AUTH_HASH_WORKERS': 0,
+        }
+        with override_settings(**fast):
+            count = options['count']
+            factory = APIRequestFactory()
+            view = RegisterView.as_view()
+
+            def previous():
+                for i in range(count):
+                    previous_signup(f"bench_prev_{i}", "bench-password-123")
+
+            def streamlined():
+                for i in range(count):
+                    provision_user(f"bench_new_{i}", f"bench_new_{i}@example.com", "bench-password-123")
+
+            def register():
+                for i in range(count):
+                    request = factory.post('/api/accounts/register/', {
+                        'username': f"bench_reg_{i}", 'email': f"bench_reg_{i}@example.com",
+                        'password': 'bench-password-123', 'password2': 'bench-password-123'
+                    }, format='json')
+                    response = view(request)
+                    assert response.status_code == 201, response.data
+
+            bulk_count = options['bulk_count']
+
+            def bulk():
+                bulk_provision({'username': f"bench_bulk_{i}", 'password': 'bench-password-123'}
+                               for i in range(bulk_count))
+
+            self.run("previous write chain", count, previous)
+            self.run("provision_user", count, streamlined)
+            self.run("register endpoint", count, register)
+            self.run("bulk provisioning", bulk_count, bulk)
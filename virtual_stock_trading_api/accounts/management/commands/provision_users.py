@@ -0,0 +1,47 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from accounts.provisioning import bulk_provision, USER_FIELDS
+
+class Command(BaseCommand):
+    help = "Create accounts for a class or cohort in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', help="CSV with a username column and optional "
+                                          "email, first_name, last_name and password columns")
+        parser.add_argument('--prefix', help="Generate usernames <prefix>001, <prefix>002, ...")
+        parser.add_argument('--count', type=int, default=0)
+        parser.add_argument('--password', help="Initial password for accounts without one; "
+                                               "left unusable when omitted")
+        parser.add_argument('--tokens-out', help="Write username,token pairs to this CSV")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options['csv']:
+            with open(options['csv'], newline='', encoding='utf-8') as fh:
+                accounts = list(csv.DictReader(fh))
+            if accounts and 'username' not in accounts[0]:
+                raise CommandError("CSV needs a username column")
+        elif options['prefix'] and options['count'] > 0:
+            width = max(3, len(str(options['count'])))
+            accounts = [{'username': f"{options['prefix']}{i:0{width}d}"}
+                        for i in range(1, options['count'] + 1)]
+        else:
+            raise CommandError("Pass --csv or --prefix with --count")
+
+        for account in accounts:
+            if not account.get('password'):
+                account['password'] = options['password']
+            for field in USER_FIELDS:
+                account[field] = (account.get(field) or '').strip()
+
+        users, skipped = bulk_provision(accounts, batch_size=options['batch_size'])
+
+        if options['tokens_out']:
+            with open(options['tokens_out'], 'w', newline='', encoding='utf-8') as fh:
+                writer = csv.writer(fh)
+                writer.writerow(['username', 'token'])
+                writer.writerows((user.username, user.auth_token.key) for user in users)
+
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped {len(skipped)} existing usernames"))
+        self.stdout.write(self.style.SUCCESS(f"Provisioned {len(users)} accounts"))
@@ -0,0 +1,74 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+from portfolios.sharding import mirror
+from .hashing import hash_password, hash_passwords
+from .models import UserProfile
+
+# Account provisioning
+#
+# A new account is one User, one UserProfile and one Token. Single signups
+# insert each row once (the profile comes from the post_save receiver);
+# bulk provisioning skips signals and inserts each table in batches.
+
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+def build_user(username, email='', password=None, first_name='', last_name='', encoded=None):
+    """
+    Unsaved User with its password already hashed, so it is written once.
+    Pass `encoded` when the hash was computed ahead of time.
+    """
+    return User(
+        username=username,
+        email=email or '',
+        first_name=first_name or '',
+        last_name=last_name or '',
+        password=encoded or hash_password(password or None)
+    )
+
+def provision_user(username, email='', password=None, first_name='', last_name=''):
+    """
+    Create a user with profile and token: one insert per table
+    """
+    # Hash before opening the transaction so it isn't held during the work
+    user = build_user(username, email, password, first_name, last_name)
+    with transaction.atomic():
+        user.save()
+        # Token(user=user) also caches user.auth_token for the caller
+        Token.objects.create(user=user)
+    return user
+
+def bulk_provision(accounts, batch_size=500):
+    """
+    Create users from dicts of USER_FIELDS plus an optional password.
+    Usernames that already exist are skipped. Returns (users, skipped).
+    """
+    accounts = list(accounts)
+    usernames = [account['username'] for account in accounts]
+    existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+
+    seen = set()
+    pending = []
+    skipped = []
+    for account in accounts:
+        username = account['username']
+        if username in existing or username in seen:
+            skipped.append(username)
+            continue
+        seen.add(username)
+        pending.append(account)
+
+    # Hash up front so the whole pool works on the batch
+    encoded = hash_passwords(account.get('password') or None for account in pending)
+    users = [build_user(encoded=password, **{field: account.get(field, '') for field in USER_FIELDS})
+             for account, password in zip(pending, encoded)]
+
+    with transaction.atomic():
+        # bulk_create fills in primary keys on PostgreSQL and SQLite
+        User.objects.bulk_create(users, batch_size=batch_size)
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users], batch_size=batch_size)
+        Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users],
+                                  batch_size=batch_size)
+    # bulk_create sends no post_save, so copy the users to the shards here
+    mirror(User, users)
+    return users, skipped
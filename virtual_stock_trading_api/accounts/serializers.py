@@ -1,6 +1,7 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
 from .models import UserProfile
+from .provisioning import provision_user
 
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -49,8 +50,4 @@ class RegisterSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         validated_data.pop('password2')
-        password = validated_data.pop('password')
-        user = User.objects.create(**validated_data)
-        user.set_password(password)
-        user.save()
-        return user
\ No newline at end of file
+        return provision_user(**validated_data)
\ No newline at end of file
@@ -1,14 +1,27 @@
 from django.shortcuts import render
 from django.contrib.auth.models import User
 from rest_framework import generics, permissions, status
+from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.authtoken.models import Token
+from .hashing import HashingBusy
 from .serializers import UserSerializer, RegisterSerializer
 
 # Accounts API views
 
-class RegisterView(generics.CreateAPIView):
+class HashingBusyMixin:
+    """
+    Answer 503 when the password hashing pool is saturated
+    """
+    def handle_exception(self, exc):
+        if isinstance(exc, HashingBusy):
+            return Response(
+                {"error": "Too many logins in progress, please retry shortly."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        return super().handle_exception(exc)
+
+class RegisterView(HashingBusyMixin, generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = [permissions.AllowAny]
     serializer_class = RegisterSerializer
@@ -16,13 +29,16 @@ class RegisterView(generics.CreateAPIView):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        # Creates the user, profile and token
         user = serializer.save()
-        token, created = Token.objects.get_or_create(user=user)
         return Response({
             "user": UserSerializer(user, context=self.get_serializer_context()).data,
-            "token": token.key
+            "token": user.auth_token.key
         }, status=status.HTTP_201_CREATED)
 
+class LoginView(HashingBusyMixin, ObtainAuthToken):
+    pass
+
 class UserDetailView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import PriceAlert
+
+@admin.register(PriceAlert)
+class PriceAlertAdmin(admin.ModelAdmin):
+    list_display = ['stock', 'user', 'direction', 'threshold', 'created_at', 'triggered_at', 'notified_at']
+    list_select_related = ['stock', 'user']
+    list_filter = ['direction', 'triggered_at', 'notified_at']
+    search_fields = ['stock__symbol', 'user__username']
+    raw_id_fields = ['user', 'stock']
@@ -0,0 +1,268 @@
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from portfolios.money import to_cents, from_cents
+from .models import PriceAlert
+
+logger = logging.getLogger(__name__)
+
+# Price alert evaluation
+#
+# Each process keeps the armed alerts of the symbols it has seen tick in an
+# AlertIndex: per symbol, two sorted arrays of thresholds in cents with the
+# alert ids alongside. Keys are ordered so the alerts a price crosses are
+# always a suffix of the array ('above' keys are negated thresholds,
+# 'below' keys the thresholds themselves), so a tick costs one bisect per
+# side and fired alerts are removed by truncating the arrays.
+#
+# The index is a cache of the database, not the source of truth. Alerts
+# created elsewhere are picked up by id every ALERTS_SYNC_SECONDS; ids are
+# allocated before commit, so each sync rescans the last ALERTS_SYNC_LOOKBACK
+# ids below the high-water mark for late commits, skipping ones it has. Alerts
+# deleted or fired by another process stay in the arrays until
+# their threshold is crossed; claim() only fires rows that are still armed,
+# so each alert fires exactly once however many processes see the tick.
+# If a claim fails, the symbols involved are dropped and reloaded from the
+# database on their next tick, so no armed alert is lost from the index.
+# Splits rescale armed thresholds in the split's transaction; claim() checks
+# the stored threshold, so a process still holding the old one reloads the
+# symbol instead of firing.
+# Fired alerts are sent by the dispatcher in alerts.notifications.
+
+UPDATE_BATCH = 500
+
+class SymbolAlerts:
+    __slots__ = ('above_keys', 'above_ids', 'below_keys', 'below_ids')
+
+    def __init__(self):
+        self.above_keys = array('q')
+        self.above_ids = array('q')
+        self.below_keys = array('q')
+        self.below_ids = array('q')
+
+    def __len__(self):
+        return len(self.above_ids) + len(self.below_ids)
+
+    def add(self, alert_id, direction, threshold_cents):
+        if direction == PriceAlert.ABOVE:
+            keys, ids, key = self.above_keys, self.above_ids, -threshold_cents
+        else:
+            keys, ids, key = self.below_keys, self.below_ids, threshold_cents
+        position = bisect_right(keys, key)
+        keys.insert(position, key)
+        ids.insert(position, alert_id)
+
+    def load(self, rows):
+        """
+        Replace the arrays from (alert id, direction, threshold cents) rows
+        """
+        above = sorted((-threshold, alert_id) for alert_id, direction, threshold in rows
+                       if direction == PriceAlert.ABOVE)
+        below = sorted((threshold, alert_id) for alert_id, direction, threshold in rows
+                       if direction == PriceAlert.BELOW)
+        self.above_keys = array('q', (key for key, _ in above))
+        self.above_ids = array('q', (alert_id for _, alert_id in above))
+        self.below_keys = array('q', (key for key, _ in below))
+        self.below_ids = array('q', (alert_id for _, alert_id in below))
+
+    def cross(self, price_cents):
+        """
+        Remove and return the ids of alerts reached by `price_cents`
+        """
+        fired = []
+        position = bisect_left(self.above_keys, -price_cents)
+        if position < len(self.above_keys):
+            fired.extend(self.above_ids[position:])
+            del self.above_keys[position:]
+            del self.above_ids[position:]
+        position = bisect_left(self.below_keys, price_cents)
+        if position < len(self.below_keys):
+            fired.extend(self.below_ids[position:])
+            del self.below_keys[position:]
+            del self.below_ids[position:]
+        return fired
+
+class AlertIndex:
+    """
+    Armed alerts per stock id. Symbols are loaded on their first tick.
+    """
+    def __init__(self):
+        self.symbols = {}
+        self.high_water = None
+        # Ids in the lookback window that are indexed or were already handled
+        self.seen = set()
+        self.synced_at = 0.0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(alerts) for alerts in self.symbols.values())
+
+    def _armed(self):
+        return PriceAlert.objects.filter(triggered_at__isnull=True)
+
+    def _rows(self, alerts):
+        return [(alert_id, direction, to_cents(threshold))
+                for alert_id, direction, threshold in alerts.values_list('id', 'direction', 'threshold')]
+
+    def _ensure(self, stock_id):
+        """
+        Load a symbol's alerts up to the high-water id; newer ones arrive via sync()
+        """
+        symbol = self.symbols.get(stock_id)
+        if symbol is None:
+            symbol = SymbolAlerts()
+            rows = self._rows(self._armed().filter(stock_id=stock_id, id__lte=self.high_water))
+            symbol.load(rows)
+            floor = self.high_water - settings.ALERTS_SYNC_LOOKBACK
+            self.seen.update(alert_id for alert_id, _, _ in rows if alert_id > floor)
+            self.symbols[stock_id] = symbol
+        return symbol
+
+    def sync(self, force=False):
+        """
+        Add alerts created since the last sync for the symbols already loaded,
+        including ones that committed late with an id below the high-water mark
+        """
+        if self.high_water is None:
+            self.high_water = PriceAlert.objects.aggregate(latest=Max('id'))['latest'] or 0
+            self.synced_at = time.monotonic()
+            return
+        if not force and time.monotonic() - self.synced_at < settings.ALERTS_SYNC_SECONDS:
+            return
+        self.synced_at = time.monotonic()
+        rows = (self._armed()
+                .filter(id__gt=self.high_water - settings.ALERTS_SYNC_LOOKBACK)
+                .order_by('id')
+                .values_list('id', 'stock_id', 'direction', 'threshold'))
+        for alert_id, stock_id, direction, threshold in rows:
+            self.high_water = max(self.high_water, alert_id)
+            if alert_id in self.seen:
+                continue
+            self.seen.add(alert_id)
+            symbol = self.symbols.get(stock_id)
+            if symbol is not None:
+                symbol.add(alert_id, direction, to_cents(threshold))
+        floor = self.high_water - settings.ALERTS_SYNC_LOOKBACK
+        self.seen = {alert_id for alert_id in self.seen if alert_id > floor}
+
+    def forget(self, stock_ids):
+        """
+        Drop symbols so their next tick reloads them from the database
+        """
+        with self.lock:
+            for stock_id in stock_ids:
+                self.symbols.pop(stock_id, None)
+
+    def cross(self, prices):
+        """
+        Alert ids reached by a {stock_id: price} update, as {stock_id: [ids]}
+        """
+        with self.lock:
+            self.sync()
+            fired = {}
+            for stock_id, price in prices.items():
+                ids = self._ensure(stock_id).cross(to_cents(price))
+                if ids:
+                    fired[stock_id] = ids
+            return fired
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = AlertIndex()
+        return _index
+
+def _reached(direction, threshold, price_cents):
+    if direction == PriceAlert.ABOVE:
+        return price_cents >= to_cents(threshold)
+    return price_cents <= to_cents(threshold)
+
+def claim(fired, prices):
+    """
+    Mark fired alerts as triggered, skipping any already fired or deleted,
+    or whose stored threshold the price doesn't reach (rescaled by a split
+    since this process loaded it). Returns (how many were claimed, stock ids
+    whose index entries were stale).
+    """
+    now = timezone.now()
+    claimed = 0
+    stale = set()
+    with transaction.atomic():
+        for stock_id, ids in fired.items():
+            price_cents = to_cents(prices[stock_id])
+            for start in range(0, len(ids), UPDATE_BATCH):
+                batch = ids[start:start + UPDATE_BATCH]
+                # skip_locked leaves rows another process is claiming to that process
+                armed = list(PriceAlert.objects
+                             .filter(id__in=batch, triggered_at__isnull=True)
+                             .select_for_update(skip_locked=True)
+                             .values_list('id', 'direction', 'threshold'))
+                due = [alert_id for alert_id, direction, threshold in armed
+                       if _reached(direction, threshold, price_cents)]
+                if len(due) < len(armed):
+                    stale.add(stock_id)
+                if due:
+                    claimed += PriceAlert.objects.filter(id__in=due).update(triggered_at=now,
+                                                                            triggered_price=from_cents(price_cents))
+    return claimed, stale
+
+def evaluate(prices, index=None):
+    """
+    Fire the alerts crossed by a {stock_id: price} update. Returns how many fired.
+    """
+    index = get_index() if index is None else index
+    fired = index.cross({stock_id: price for stock_id, price in prices.items() if price})
+    if not fired:
+        return 0
+    try:
+        claimed, stale = claim(fired, prices)
+    except Exception:
+        # The crossed ids are already out of the arrays; reload their symbols
+        # so the alerts the failed claim left armed can fire on a later tick
+        index.forget(fired)
+        raise
+    index.forget(stale)
+    return claimed
+
+def evaluate_safely(prices):
+    # Runs after a trade or price refresh has committed; never fail the caller
+    try:
+        evaluate(prices)
+    except Exception:
+        logger.exception("Price alert evaluation failed")
+
+def scale_thresholds(stock_id, split_from, split_to):
+    """
+    Rescale a symbol's armed alerts for a split, in the caller's transaction,
+    so the post-split price doesn't fire them. This process reloads the
+    symbol once the split commits; others catch up through claim().
+    """
+    alerts = list(PriceAlert.objects
+                  .select_for_update()
+                  .filter(stock_id=stock_id, triggered_at__isnull=True)
+                  .only('id', 'threshold'))
+    for alert in alerts:
+        alert.threshold = from_cents(to_cents(alert.threshold * split_from / split_to))
+    PriceAlert.objects.bulk_update(alerts, ['threshold'], batch_size=UPDATE_BATCH)
+    transaction.on_commit(partial(get_index().forget, [stock_id]))
+    return len(alerts)
+
+def track(alert):
+    """
+    Arm a newly created alert in this process's index right away
+    """
+    index = get_index()
+    with index.lock:
+        if index.high_water is not None and alert.stock_id in index.symbols:
+            index.sync(force=True)
@@ -0,0 +1,135 @@
+import math
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from alerts.engine import AlertIndex, SymbolAlerts, evaluate
+from alerts.models import PriceAlert
+from stocks.models import Stock
+
+class Rollback(Exception):
+    pass
+
+def synthetic_alerts(rng, count, prices):
+    """
+    (stock index, direction, threshold cents) spread 1-30% either side of each price
+    """
+    alerts = []
+    for _ in range(count):
+        symbol = rng.randrange(len(prices))
+        if rng.random() < 0.5:
+            alerts.append((symbol, PriceAlert.ABOVE, int(prices[symbol] * rng.uniform(1.01, 1.3))))
+        else:
+            alerts.append((symbol, PriceAlert.BELOW, int(prices[symbol] * rng.uniform(0.7, 0.99))))
+    return alerts
+
+def random_walk(rng, prices, ticks):
+    """
+    (stock index, price cents) ticks; each step moves one symbol by ~0.5%
+    """
+    prices = list(prices)
+    for _ in range(ticks):
+        symbol = rng.randrange(len(prices))
+        prices[symbol] = max(int(prices[symbol] * math.exp(rng.gauss(0, 0.005))), 1)
+        yield symbol, prices[symbol]
+
+class Command(BaseCommand):
+    help = "Time price alert evaluation against a large synthetic alert book; database work is rolled back"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alerts', type=int, default=1000000)
+        parser.add_argument('--symbols', type=int, default=2000)
+        parser.add_argument('--ticks', type=int, default=100000)
+        parser.add_argument('--db-alerts', type=int, default=20000,
+                            help="Alerts stored in the database and evaluated end to end, including claims")
+        parser.add_argument('--db-ticks', type=int, default=2000)
+
+    def percentiles(self, label, samples):
+        samples = sorted(samples)
+        pick = lambda pct: samples[min(int(len(samples) * pct), len(samples) - 1)] * 1e6
+        self.stdout.write(f"{label:<34} p50 {pick(0.5):>7.1f} us  p99 {pick(0.99):>8.1f} us  "
+                          f"max {samples[-1] * 1e6:>9.1f} us")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        prices = [rng.randint(500, 50000) for _ in range(options['symbols'])]
+        alerts = synthetic_alerts(rng, options['alerts'], prices)
+        ticks = list(random_walk(rng, prices, options['ticks']))
+
+        # In-memory index: build, then replay the ticks
+        rows = [[] for _ in prices]
+        for alert_id, (symbol, direction, threshold) in enumerate(alerts, start=1):
+            rows[symbol].append((alert_id, direction, threshold))
+        tracemalloc.start()
+        started = time.perf_counter()
+        index = []
+        for symbol_rows in rows:
+            symbol = SymbolAlerts()
+            symbol.load(symbol_rows)
+            index.append(symbol)
+        elapsed = time.perf_counter() - started
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.stdout.write(f"Indexed {len(alerts)} alerts on {len(prices)} symbols in {elapsed * 1000:.0f} ms "
+                          f"({memory / 2 ** 20:.1f} MiB)")
+
+        fired = 0
+        samples = []
+        for symbol, price in ticks:
+            started = time.perf_counter()
+            fired += len(index[symbol].cross(price))
+            samples.append(time.perf_counter() - started)
+        self.percentiles("sorted index, per tick", samples)
+        self.stdout.write(f"  {len(ticks) / sum(samples):,.0f} ticks/s, {fired} alerts fired")
+
+        # Baseline: check every armed alert of the ticking symbol
+        naive = [list(symbol_rows) for symbol_rows in rows]
+        naive_fired = 0
+        samples = []
+        for symbol, price in ticks:
+            started = time.perf_counter()
+            armed = naive[symbol]
+            hits = [row for row in armed
+                    if (row[2] <= price if row[1] == PriceAlert.ABOVE else row[2] >= price)]
+            if hits:
+                naive[symbol] = [row for row in armed
+                                 if not (row[2] <= price if row[1] == PriceAlert.ABOVE else row[2] >= price)]
+            naive_fired += len(hits)
+            samples.append(time.perf_counter() - started)
+        self.percentiles("scan every alert, per tick", samples)
+        self.stdout.write(f"  {len(ticks) / sum(samples):,.0f} ticks/s, {naive_fired} alerts fired")
+        if naive_fired != fired:
+            self.stdout.write(self.style.ERROR("Index and scan disagree on fired alerts"))
+
+        if not options['db_alerts']:
+            return
+        try:
+            with transaction.atomic():
+                user = User.objects.create(username='bench-price-alerts')
+                stocks = Stock.objects.bulk_create([
+                    Stock(symbol=f"BA{i:05d}", company_name=f"Bench {i}", last_price=Decimal(price).scaleb(-2))
+                    for i, price in enumerate(prices)
+                ])
+                PriceAlert.objects.bulk_create([
+                    PriceAlert(user=user, stock=stocks[symbol], direction=direction,
+                               threshold=Decimal(threshold).scaleb(-2))
+                    for symbol, direction, threshold in alerts[:options['db_alerts']]
+                ], batch_size=5000)
+
+                db_index = AlertIndex()
+                db_index.sync()
+                claimed = 0
+                samples = []
+                for symbol, price in ticks[:options['db_ticks']]:
+                    started = time.perf_counter()
+                    claimed += evaluate({stocks[symbol].id: Decimal(price).scaleb(-2)}, db_index)
+                    samples.append(time.perf_counter() - started)
+                self.percentiles("evaluate() with claims", samples)
+                self.stdout.write(f"  {claimed} alerts claimed from {options['db_alerts']} stored, "
+                                  f"{len(db_index.symbols)} symbols loaded")
+                raise Rollback
+        except Rollback:
+            pass
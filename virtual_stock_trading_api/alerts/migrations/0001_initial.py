@@ -0,0 +1,36 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('stocks', '0004_corporateaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceAlert',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('direction', models.CharField(choices=[('above', 'Price at or above'), ('below', 'Price at or below')], max_length=5)),
+                ('threshold', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('triggered_at', models.DateTimeField(blank=True, null=True)),
+                ('triggered_price', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to='stocks.stock')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('triggered_at__isnull', True)), fields=['stock', 'id'], name='pricealert_armed_idx'), models.Index(condition=models.Q(('notified_at__isnull', True), ('triggered_at__isnull', False)), fields=['id'], name='pricealert_unsent_idx')],
+            },
+        ),
+    ]
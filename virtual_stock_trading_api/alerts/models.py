@@ -0,0 +1,45 @@
+from django.db import models
+from django.contrib.auth.models import User
+from stocks.models import Stock
+
+# Price alert models
+class PriceAlert(models.Model):
+    """
+    One-shot alert that fires when a symbol's price reaches the threshold
+    from below ('above') or from above ('below'). Alerts are never edited;
+    users delete and recreate them.
+    """
+    ABOVE = 'above'
+    BELOW = 'below'
+    DIRECTIONS = [
+        (ABOVE, 'Price at or above'),
+        (BELOW, 'Price at or below'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='price_alerts')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='price_alerts')
+    direction = models.CharField(max_length=5, choices=DIRECTIONS)
+    threshold = models.DecimalField(max_digits=15, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    triggered_at = models.DateTimeField(null=True, blank=True)
+    triggered_price = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Loading a symbol's armed alerts into the evaluator
+            models.Index(fields=['stock', 'id'], condition=models.Q(triggered_at__isnull=True),
+                         name='pricealert_armed_idx'),
+            # The dispatcher scans fired alerts that haven't been sent
+            models.Index(fields=['id'], condition=models.Q(triggered_at__isnull=False, notified_at__isnull=True),
+                         name='pricealert_unsent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.stock.symbol} {self.direction} {self.threshold} ({self.user.username})"
+
+    @property
+    def is_active(self):
+        return self.triggered_at is None
@@ -0,0 +1,61 @@
+import json
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import PriceAlert
+
+# Delivering fired alerts
+#
+# Fired alerts double as their own outbox: triggered_at is set when a tick
+# crosses the threshold and notified_at once the notification is on the
+# ALERTS_STREAM Redis stream, where push and email gateways consume it like
+# the trade event stream. Each batch is one pipelined round trip, and a
+# batch is marked sent only after Redis accepted it, so delivery is
+# at-least-once.
+
+def publish_fired(client, stream=None, batch_size=None):
+    """
+    Send one batch of fired, unsent alerts. Returns how many were sent.
+    """
+    stream = stream or settings.ALERTS_STREAM
+    batch_size = batch_size or settings.ALERTS_BATCH_SIZE
+    with transaction.atomic():
+        alerts = list(PriceAlert.objects
+                      .filter(triggered_at__isnull=False, notified_at__isnull=True)
+                      .order_by('id')
+                      .select_for_update(skip_locked=True, of=('self',))
+                      .select_related('stock')[:batch_size])
+        if not alerts:
+            return 0
+
+        pipe = client.pipeline(transaction=False)
+        for alert in alerts:
+            pipe.xadd(stream, {
+                'alert_id': alert.id,
+                'user_id': alert.user_id,
+                'payload': json.dumps({
+                    'symbol': alert.stock.symbol,
+                    'direction': alert.direction,
+                    'threshold': str(alert.threshold),
+                    'price': str(alert.triggered_price),
+                    'triggered_at': alert.triggered_at.isoformat(),
+                }),
+            }, maxlen=settings.ALERTS_STREAM_MAXLEN, approximate=True)
+        pipe.execute()
+
+        PriceAlert.objects.filter(id__in=[alert.id for alert in alerts]).update(notified_at=timezone.now())
+    return len(alerts)
+
+def dispatch(client, max_batches=None):
+    """
+    Send fired alerts batch by batch until none are left (or max_batches)
+    """
+    sent = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        count = publish_fired(client)
+        if not count:
+            break
+        sent += count
+        batches += 1
+    return sent
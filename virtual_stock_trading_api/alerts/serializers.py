@@ -0,0 +1,42 @@
+from decimal import Decimal
+from django.conf import settings
+from rest_framework import serializers
+from stocks.models import Stock
+from .models import PriceAlert
+
+class PriceAlertSerializer(serializers.ModelSerializer):
+    symbol = serializers.CharField(source='stock.symbol', read_only=True)
+    stock_symbol = serializers.CharField(write_only=True, max_length=10)
+    current_price = serializers.DecimalField(source='stock.last_price', max_digits=15, decimal_places=2,
+                                             read_only=True)
+    direction = serializers.ChoiceField(choices=PriceAlert.DIRECTIONS, required=False)
+    threshold = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=Decimal('0.01'))
+
+    class Meta:
+        model = PriceAlert
+        fields = ['id', 'symbol', 'stock_symbol', 'direction', 'threshold', 'current_price', 'is_active',
+                  'created_at', 'triggered_at', 'triggered_price']
+        read_only_fields = ['id', 'created_at', 'triggered_at', 'triggered_price']
+
+    def validate(self, data):
+        try:
+            stock = Stock.objects.get(symbol=data.pop('stock_symbol').upper())
+        except Stock.DoesNotExist:
+            raise serializers.ValidationError({'stock_symbol': "Unknown symbol; look it up with stock search first"})
+        price = stock.last_price
+        threshold = data['threshold']
+        direction = data.get('direction')
+        if direction is None:
+            # "Notify me when it crosses X": the side of the current price decides
+            direction = PriceAlert.ABOVE if threshold > price else PriceAlert.BELOW
+        if price and ((direction == PriceAlert.ABOVE and price >= threshold)
+                      or (direction == PriceAlert.BELOW and price <= threshold)):
+            raise serializers.ValidationError(
+                {'threshold': f"{stock.symbol} is already {direction} {threshold} (last price {price})"}
+            )
+        user = self.context['request'].user
+        if PriceAlert.objects.filter(user=user, triggered_at__isnull=True).count() >= settings.ALERTS_MAX_PER_USER:
+            raise serializers.ValidationError(f"At most {settings.ALERTS_MAX_PER_USER} active alerts per user")
+        data['stock'] = stock
+        data['direction'] = direction
+        return data
@@ -0,0 +1,18 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from stocks.models import Stock
+from stocks.signals import prices_updated
+from .engine import evaluate_safely
+
+# Evaluate price alerts on every price change, once it has committed
+
+@receiver(post_save, sender=Stock)
+def evaluate_saved_stock(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        transaction.on_commit(partial(evaluate_safely, {instance.id: instance.last_price}))
+
+@receiver(prices_updated, sender=Stock)
+def evaluate_refreshed_stocks(sender, prices, **kwargs):
+    transaction.on_commit(partial(evaluate_safely, dict(prices)))
@@ -0,0 +1,12 @@
+from celery import shared_task
+from virtual_stock_trading_api.celery import app  # noqa: F401 (binds shared_task to the project app)
+from trading.outbox import get_client
+from .notifications import dispatch
+
+@shared_task
+def dispatch_price_alerts():
+    """
+    Send fired price alerts to the notification stream in batches
+    """
+    sent = dispatch(get_client())
+    return f"Sent {sent} price alerts"
@@ -0,0 +1,153 @@
+import json
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from stocks.models import Stock
+from .engine import AlertIndex, SymbolAlerts, evaluate, scale_thresholds
+from .models import PriceAlert
+from .notifications import dispatch
+
+# Alert evaluation tests
+
+class SymbolAlertsTests(SimpleTestCase):
+    """
+    Thresholds in cents; a tick fires the suffix of each side it reached
+    """
+    def test_cross(self):
+        alerts = SymbolAlerts()
+        alerts.load([(1, PriceAlert.ABOVE, 11000), (2, PriceAlert.ABOVE, 10500), (3, PriceAlert.BELOW, 9000)])
+        alerts.add(4, PriceAlert.ABOVE, 12000)
+        alerts.add(5, PriceAlert.BELOW, 9500)
+        self.assertEqual(alerts.cross(10000), [])
+        self.assertEqual(sorted(alerts.cross(11000)), [1, 2])
+        self.assertEqual(alerts.cross(11000), [])
+        self.assertEqual(alerts.cross(9500), [5])
+        self.assertEqual(len(alerts), 2)
+        self.assertEqual(sorted(alerts.cross(8000) + alerts.cross(13000)), [3, 4])
+        self.assertEqual(len(alerts), 0)
+
+@override_settings(ALERTS_SYNC_SECONDS=3600, ALERTS_SYNC_LOOKBACK=100)
+class AlertIndexSyncTests(TestCase):
+    """
+    Alerts created by other processes reach the index, late commits included
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='alerts')
+        self.stock = Stock.objects.create(symbol='ALRT', company_name='Alert Inc', last_price=Decimal('100.00'))
+        self.index = AlertIndex()
+        self.index.sync()
+        # Load the symbol without crossing anything
+        self.index.cross({self.stock.id: Decimal('100.00')})
+
+    def create_alert(self, threshold, **kwargs):
+        return PriceAlert.objects.create(user=self.user, stock=self.stock, direction=PriceAlert.ABOVE,
+                                         threshold=Decimal(threshold), **kwargs)
+
+    def test_late_commit_below_high_water(self):
+        newer = self.create_alert('110.00', id=self.index.high_water + 5)
+        self.index.sync(force=True)
+        self.assertEqual(self.index.high_water, newer.id)
+        self.assertEqual(len(self.index), 1)
+
+        # An id allocated earlier whose transaction committed after the sync
+        self.create_alert('105.00', id=newer.id - 3)
+        self.index.sync(force=True)
+        self.assertEqual(len(self.index), 2)
+
+        # Rescanning the window does not index an alert twice
+        self.index.sync(force=True)
+        self.assertEqual(len(self.index), 2)
+        fired = self.index.cross({self.stock.id: Decimal('120.00')})
+        self.assertEqual(sorted(fired[self.stock.id]), [newer.id - 3, newer.id])
+
+    def test_reloaded_symbol_is_not_duplicated(self):
+        alert = self.create_alert('110.00', id=self.index.high_water + 1)
+        self.index.sync(force=True)
+        self.index.forget([self.stock.id])
+        self.index.cross({self.stock.id: Decimal('100.00')})
+        self.index.sync(force=True)
+        self.assertEqual(len(self.index), 1)
+        self.assertEqual(self.index.cross({self.stock.id: Decimal('110.00')}), {self.stock.id: [alert.id]})
+
+class FakePipeline:
+    def __init__(self, sent):
+        self.sent = sent
+        self.calls = []
+
+    def xadd(self, stream, fields, **kwargs):
+        self.calls.append((stream, fields))
+
+    def execute(self):
+        self.sent.extend(self.calls)
+
+class FakeRedis:
+    def __init__(self):
+        self.sent = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.sent)
+
+@override_settings(ALERTS_SYNC_SECONDS=3600, ALERTS_STREAM='alerts', ALERTS_BATCH_SIZE=2, ALERTS_MAX_PER_USER=3)
+class AlertEvaluationTests(TestCase):
+    """
+    Creating alerts through the API, firing them once and delivering them
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='notify')
+        self.stock = Stock.objects.create(symbol='NTFY', company_name='Notify Inc', last_price=Decimal('100.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, threshold, **extra):
+        return self.client.post('/api/alerts/', {'stock_symbol': 'ntfy', 'threshold': threshold, **extra},
+                                format='json')
+
+    def index(self):
+        index = AlertIndex()
+        index.sync()
+        return index
+
+    def test_create_infers_the_direction(self):
+        self.assertEqual(self.create('120.00').data['direction'], PriceAlert.ABOVE)
+        self.assertEqual(self.create('80.00').data['direction'], PriceAlert.BELOW)
+        response = self.create('90.00', direction=PriceAlert.ABOVE)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('threshold', response.data)
+        self.create('70.00')
+        self.assertEqual(self.create('60.00').status_code, 400)
+
+    def test_each_alert_fires_once_across_processes(self):
+        for threshold in ('110.00', '120.00', '90.00'):
+            self.create(threshold)
+        first, second = self.index(), self.index()
+        self.assertEqual(evaluate({self.stock.id: Decimal('115.00')}, first), 1)
+        # Another process holding the same alert finds it already claimed
+        self.assertEqual(evaluate({self.stock.id: Decimal('115.00')}, second), 0)
+        fired = PriceAlert.objects.get(triggered_at__isnull=False)
+        self.assertEqual((fired.threshold, fired.triggered_price), (Decimal('110.00'), Decimal('115.00')))
+        self.assertEqual(evaluate({self.stock.id: Decimal('85.00')}, first), 1)
+
+        client = FakeRedis()
+        self.assertEqual(dispatch(client), 2)
+        self.assertEqual(dispatch(client), 0)
+        payloads = [json.loads(fields['payload']) for _, fields in client.sent]
+        self.assertEqual([(payload['symbol'], payload['price']) for payload in payloads],
+                         [('NTFY', '115.00'), ('NTFY', '85.00')])
+
+    def test_split_rescales_armed_thresholds(self):
+        alert_id = self.create('80.00').data['id']
+        index = self.index()
+        index.cross({self.stock.id: Decimal('100.00')})
+
+        # 2-for-1: the alert now waits for 40, so the post-split 50 must not fire
+        # it even though this index still holds the old threshold of 80
+        self.assertEqual(scale_thresholds(self.stock.id, 1, 2), 1)
+        self.assertEqual(PriceAlert.objects.get(id=alert_id).threshold, Decimal('40.00'))
+        self.assertEqual(evaluate({self.stock.id: Decimal('50.00')}, index), 0)
+        self.assertNotIn(self.stock.id, index.symbols)
+        self.assertIsNone(PriceAlert.objects.get(id=alert_id).triggered_at)
+
+        # The symbol reloads with the new threshold
+        self.assertEqual(evaluate({self.stock.id: Decimal('50.00')}, index), 0)
+        self.assertEqual(evaluate({self.stock.id: Decimal('39.00')}, index), 1)
@@ -0,0 +1,7 @@
+from rest_framework.routers import DefaultRouter
+from .views import PriceAlertViewSet
+
+router = DefaultRouter()
+router.register(r'', PriceAlertViewSet, basename='price-alert')
+
+urlpatterns = router.urls
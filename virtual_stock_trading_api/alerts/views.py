@@ -0,0 +1,26 @@
+from functools import partial
+from django.db import transaction
+from rest_framework import mixins, viewsets, permissions
+from .engine import track
+from .models import PriceAlert
+from .serializers import PriceAlertSerializer
+
+# Price alerts viewset
+
+class PriceAlertViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                        mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    A user's price alerts; pass ?active=true for armed ones only
+    """
+    serializer_class = PriceAlertSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        alerts = PriceAlert.objects.filter(user=self.request.user).select_related('stock')
+        if self.request.query_params.get('active') == 'true':
+            alerts = alerts.filter(triggered_at__isnull=True)
+        return alerts
+
+    def perform_create(self, serializer):
+        alert = serializer.save(user=self.request.user)
+        transaction.on_commit(partial(track, alert))
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import Competition, Standing
+
+@admin.register(Competition)
+class CompetitionAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'starts_at', 'ends_at', 'starting_cash', 'created_by']
+    list_filter = ['status']
+    search_fields = ['name']
+    readonly_fields = ['started_at', 'finished_at']
+
+@admin.register(Standing)
+class StandingAdmin(admin.ModelAdmin):
+    list_display = ['competition', 'rank', 'user', 'total_value', 'return_percentage']
+    list_select_related = ['competition', 'user']
+    list_filter = ['competition']
+    search_fields = ['user__username']
+    ordering = ['competition', 'rank']
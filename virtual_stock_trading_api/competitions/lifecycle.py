@@ -0,0 +1,165 @@
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import transaction
+from django.utils import timezone
+from portfolios.dashboard import invalidate_all as invalidate_dashboards
+from portfolios.models import Portfolio, Position, TaxLot, RealizedGain
+from portfolios.money import to_cents, from_cents, percentage
+from portfolios.sharding import current_database, for_each_shard, use_shard, users_by_shard
+from portfolios.valuation import stock_value_cents_expression
+from .models import Competition, Standing
+
+# Competition lifecycle
+#
+# Every entrant trades one portfolio tagged with the competition, so a
+# contest is a slice of the portfolio table selected by competition_id and
+# each step below is a handful of set-based statements over that slice,
+# however many entrants there are:
+#   enroll     one bulk insert of portfolios funded with the starting cash
+#   start      delete any holdings and reset every balance with one UPDATE
+#   finalize   value every entrant in one grouped query, rank in Python
+#              and freeze the result as Standing rows in one bulk insert
+# Trade views refuse contest portfolios outside the running window. With
+# sharding, each step runs once per shard over that shard's entrants.
+
+RETURN_PRECISION = Decimal('0.0001')
+
+def enroll(competition, users):
+    """
+    Create contest portfolios for `users`, skipping anyone already entered.
+    Returns the number of new entrants.
+    """
+    if competition.status == Competition.FINISHED:
+        raise ValueError(f"{competition.name} has finished")
+    user_ids = dict.fromkeys(getattr(user, 'pk', user) for user in users)
+    created = 0
+    for alias, shard_user_ids in users_by_shard(user_ids).items():
+        with use_shard(alias):
+            entered = set(Portfolio.objects
+                          .filter(competition=competition, user_id__in=shard_user_ids)
+                          .values_list('user_id', flat=True))
+            portfolios = [
+                Portfolio(user_id=user_id, competition=competition, name=competition.name[:100],
+                          description=f"Competition entry: {competition.name}",
+                          cash_balance=competition.starting_cash)
+                for user_id in shard_user_ids
+                if user_id not in entered
+            ]
+            # ignore_conflicts covers a concurrent join by the same user
+            Portfolio.objects.bulk_create(portfolios, batch_size=1000, ignore_conflicts=True)
+            created += len(portfolios)
+    if created:
+        invalidate_dashboards()
+    return created
+
+def start_competition(competition, now=None):
+    """
+    Reset every entrant to the starting cash with no holdings and open trading
+    """
+    from risk.exposure import rebuild_exposures
+
+    now = now or timezone.now()
+
+    def reset_entries():
+        entries = Portfolio.objects.filter(competition=competition)
+        with transaction.atomic(using=current_database()):
+            held = set(Position.objects.filter(portfolio__in=entries).values_list('stock_id', flat=True).distinct())
+            if held:
+                Position.objects.filter(portfolio__in=entries).delete()
+                TaxLot.objects.filter(portfolio__in=entries).delete()
+                RealizedGain.objects.filter(portfolio__in=entries).delete()
+            entries.update(cash_balance=competition.starting_cash, updated_at=now)
+        return held
+
+    with transaction.atomic():
+        competition = Competition.objects.select_for_update().get(pk=competition.pk)
+        if competition.status != Competition.SCHEDULED:
+            return competition
+        held = set().union(*for_each_shard(reset_entries))
+        if held:
+            rebuild_exposures(list(held))
+        competition.status = Competition.RUNNING
+        competition.started_at = now
+        competition.save(update_fields=['status', 'started_at'])
+    invalidate_dashboards()
+    return competition
+
+def valuations(competition):
+    """
+    (portfolio id, user id, username, cash cents, stock value cents) for
+    every entrant, valued in one grouped query per shard
+    """
+    def shard_rows():
+        return list(Portfolio.objects
+                    .filter(competition=competition)
+                    .values('id', 'user_id', 'user__username', 'cash_balance')
+                    .annotate(stock_cents=stock_value_cents_expression('positions__'))
+                    .values_list('id', 'user_id', 'user__username', 'cash_balance', 'stock_cents'))
+
+    return [(portfolio_id, user_id, username, to_cents(cash), stock_cents)
+            for rows in for_each_shard(shard_rows)
+            for portfolio_id, user_id, username, cash, stock_cents in rows]
+
+def rank(competition, rows=None):
+    """
+    Unsaved Standing rows, highest total value first. Equal totals share a
+    rank and the next distinct total skips past them (1, 1, 3).
+    """
+    rows = valuations(competition) if rows is None else rows
+    starting_cents = to_cents(competition.starting_cash)
+    rows = sorted(rows, key=lambda row: (-(row[3] + row[4]), row[0]))
+    standings = []
+    previous_total = None
+    position = 0
+    for index, (portfolio_id, user_id, username, cash_cents, stock_cents) in enumerate(rows, start=1):
+        total_cents = cash_cents + stock_cents
+        if total_cents != previous_total:
+            position = index
+            previous_total = total_cents
+        return_percentage = percentage(total_cents - starting_cents, starting_cents)
+        standing = Standing(
+            competition=competition, portfolio_id=portfolio_id, user_id=user_id, rank=position,
+            cash_balance=from_cents(cash_cents), stock_value=from_cents(stock_cents),
+            total_value=from_cents(total_cents),
+            return_percentage=return_percentage.quantize(RETURN_PRECISION, rounding=ROUND_HALF_UP)
+        )
+        standing.username = username
+        standings.append(standing)
+    return standings
+
+def finalize_competition(competition, now=None):
+    """
+    Close trading and freeze the final standings
+    """
+    with transaction.atomic():
+        competition = Competition.objects.select_for_update().get(pk=competition.pk)
+        if competition.status == Competition.FINISHED:
+            return competition
+        competition.status = Competition.FINISHED
+        competition.finished_at = now or timezone.now()
+        competition.save(update_fields=['status', 'finished_at'])
+        Standing.objects.filter(competition=competition).delete()
+        Standing.objects.bulk_create(rank(competition), batch_size=1000)
+    return competition
+
+def live_standings(competition):
+    """
+    Current ranking of a competition that hasn't finished, computed on demand
+    """
+    return rank(competition)
+
+def advance_competitions(now=None):
+    """
+    Start competitions whose window has opened and finalize those that have
+    ended. Returns (started, finished).
+    """
+    now = now or timezone.now()
+    started = finished = 0
+    due = Competition.objects.filter(status=Competition.SCHEDULED, starts_at__lte=now, ends_at__gt=now)
+    for competition in due:
+        start_competition(competition, now)
+        started += 1
+    ended = Competition.objects.exclude(status=Competition.FINISHED).filter(ends_at__lte=now)
+    for competition in ended:
+        finalize_competition(competition, now)
+        finished += 1
+    return started, finished
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from accounts.provisioning import bulk_provision
+from competitions.lifecycle import enroll
+from competitions.models import Competition
+
+class Command(BaseCommand):
+    help = "Enroll users in a competition in bulk, one contest portfolio each"
+
+    def add_arguments(self, parser):
+        parser.add_argument('competition_id', type=int)
+        parser.add_argument('--usernames', help="File with one username per line")
+        parser.add_argument('--all-users', action='store_true', help="Enroll every active user")
+        parser.add_argument('--create-missing', action='store_true',
+                            help="Provision accounts for usernames in the file that don't exist yet")
+
+    def handle(self, *args, **options):
+        try:
+            competition = Competition.objects.get(pk=options['competition_id'])
+        except Competition.DoesNotExist:
+            raise CommandError(f"Competition {options['competition_id']} does not exist")
+
+        if options['all_users']:
+            user_ids = User.objects.filter(is_active=True).values_list('id', flat=True).iterator(chunk_size=10000)
+        elif options['usernames']:
+            with open(options['usernames'], encoding='utf-8') as fh:
+                usernames = [line.strip() for line in fh if line.strip()]
+            if options['create_missing']:
+                created, _ = bulk_provision({'username': username} for username in usernames)
+                self.stdout.write(f"Provisioned {len(created)} new accounts")
+            user_ids = User.objects.filter(username__in=usernames).values_list('id', flat=True)
+        else:
+            raise CommandError("Pass --usernames FILE or --all-users")
+
+        try:
+            entered = enroll(competition, user_ids)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Enrolled {entered} users in {competition.name}"))
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:46
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('portfolios', '0005_transaction_corporate_action'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Competition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('starting_cash', models.DecimalField(decimal_places=2, default=Decimal('10000.00'), max_digits=15)),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('running', 'Running'), ('finished', 'Finished')], default='scheduled', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_competitions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-starts_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Standing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField()),
+                ('cash_balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('stock_value', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('total_value', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('return_percentage', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('competition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='competitions.competition')),
+                ('portfolio', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='standings', to='portfolios.portfolio')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['competition', 'rank'],
+                'indexes': [models.Index(fields=['competition', 'rank'], name='standing_rank_idx')],
+                'unique_together': {('competition', 'user')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='competition',
+            index=models.Index(fields=['status', 'starts_at'], name='competition_status_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.10 on 2026-10-19 16:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolios', '0007_positioncheckpoint'),
+        ('competitions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='standing',
+            name='portfolio',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='standings', to='portfolios.portfolio'),
+        ),
+    ]
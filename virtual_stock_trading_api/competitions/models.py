@@ -0,0 +1,72 @@
+from django.db import models
+from django.contrib.auth.models import User
+from django.utils import timezone
+from decimal import Decimal
+
+# Competition models
+class Competition(models.Model):
+    """
+    A time-boxed contest. Every participant trades one portfolio tagged with
+    the competition; those portfolios are kept apart from regular ones.
+    """
+    SCHEDULED = 'scheduled'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    STATUSES = [
+        (SCHEDULED, 'Scheduled'),
+        (RUNNING, 'Running'),
+        (FINISHED, 'Finished'),
+    ]
+
+    name = models.CharField(max_length=100)
+    description = models.TextField(blank=True)
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    starting_cash = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('10000.00'))
+    status = models.CharField(max_length=10, choices=STATUSES, default=SCHEDULED)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='created_competitions')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-starts_at']
+        indexes = [
+            models.Index(fields=['status', 'starts_at'], name='competition_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.starts_at:%Y-%m-%d} - {self.ends_at:%Y-%m-%d})"
+
+    def is_open(self, now=None):
+        """
+        Whether contest portfolios may trade right now
+        """
+        now = now or timezone.now()
+        return self.status == self.RUNNING and self.starts_at <= now < self.ends_at
+
+class Standing(models.Model):
+    """
+    Final rank of one participant, frozen when the competition finishes
+    """
+    competition = models.ForeignKey(Competition, on_delete=models.CASCADE, related_name='standings')
+    # No database constraint: with sharding the portfolio lives on another database
+    portfolio = models.ForeignKey('portfolios.Portfolio', on_delete=models.SET_NULL, null=True,
+                                  related_name='standings', db_constraint=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='standings')
+    rank = models.PositiveIntegerField()
+    cash_balance = models.DecimalField(max_digits=15, decimal_places=2)
+    stock_value = models.DecimalField(max_digits=15, decimal_places=2)
+    total_value = models.DecimalField(max_digits=15, decimal_places=2)
+    return_percentage = models.DecimalField(max_digits=12, decimal_places=4)
+
+    class Meta:
+        unique_together = ('competition', 'user')
+        ordering = ['competition', 'rank']
+        indexes = [
+            models.Index(fields=['competition', 'rank'], name='standing_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.competition.name}: #{self.rank} {self.user.username}"
@@ -0,0 +1,31 @@
+from rest_framework import serializers
+from .models import Competition, Standing
+
+class CompetitionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Competition
+        fields = ['id', 'name', 'description', 'starts_at', 'ends_at', 'starting_cash', 'status',
+                  'created_at', 'started_at', 'finished_at']
+        read_only_fields = ['id', 'status', 'created_at', 'started_at', 'finished_at']
+
+    def validate(self, data):
+        starts_at = data.get('starts_at', getattr(self.instance, 'starts_at', None))
+        ends_at = data.get('ends_at', getattr(self.instance, 'ends_at', None))
+        if starts_at and ends_at and ends_at <= starts_at:
+            raise serializers.ValidationError("ends_at must be after starts_at")
+        starting_cash = data.get('starting_cash')
+        if starting_cash is not None and starting_cash <= 0:
+            raise serializers.ValidationError("starting_cash must be positive")
+        if self.instance is not None and self.instance.status != Competition.SCHEDULED:
+            raise serializers.ValidationError("Only scheduled competitions can be changed")
+        return data
+
+class StandingSerializer(serializers.ModelSerializer):
+    # Annotated on frozen rows, set by lifecycle.rank() on live ones
+    username = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Standing
+        fields = ['rank', 'username', 'portfolio', 'cash_balance', 'stock_value', 'total_value',
+                  'return_percentage']
+        read_only_fields = fields
@@ -0,0 +1,11 @@
+from celery import shared_task
+from virtual_stock_trading_api.celery import app  # noqa: F401 (binds shared_task to the project app)
+from .lifecycle import advance_competitions as advance
+
+@shared_task
+def advance_competitions():
+    """
+    Start and finalize competitions on schedule
+    """
+    started, finished = advance()
+    return f"Started {started} and finished {finished} competitions"
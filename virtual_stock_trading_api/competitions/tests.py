@@ -0,0 +1,99 @@
+import datetime
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from portfolios.models import Portfolio, Position, TaxLot
+from stocks.models import Stock
+from .lifecycle import advance_competitions, enroll, finalize_competition, rank, start_competition
+from .models import Competition, Standing
+
+# Competition lifecycle tests
+
+class CompetitionTests(TestCase):
+    """
+    Enrollment, the trading window, ranking and the frozen standings
+    """
+    def setUp(self):
+        self.now = timezone.now()
+        self.competition = Competition.objects.create(
+            name='Spring Cup', starts_at=self.now - datetime.timedelta(hours=1),
+            ends_at=self.now + datetime.timedelta(days=7), starting_cash=Decimal('1000.00'))
+        self.users = [User.objects.create(username=f'entrant{i}') for i in range(3)]
+        self.stock = Stock.objects.create(symbol='CUP', company_name='Cup Inc', last_price=Decimal('10.00'))
+
+    def entry(self, user):
+        return Portfolio.objects.get(competition=self.competition, user=user)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def buy(self, user, quantity):
+        return self.client_for(user).post('/api/trading/buy/', {'portfolio_id': self.entry(user).id,
+                                                                'stock_symbol': 'CUP', 'quantity': quantity},
+                                          format='json')
+
+    def test_enroll_once_per_user(self):
+        self.assertEqual(enroll(self.competition, self.users), 3)
+        self.assertEqual(enroll(self.competition, [user.pk for user in self.users]), 0)
+        self.assertEqual(self.entry(self.users[0]).cash_balance, Decimal('1000.00'))
+
+        response = self.client_for(self.users[0]).post(f'/api/competitions/{self.competition.id}/join/')
+        self.assertEqual((response.status_code, response.data['portfolio_id']), (201, self.entry(self.users[0]).id))
+        # Contest portfolios stay out of the regular portfolio list
+        self.assertEqual(self.client_for(self.users[0]).get('/api/portfolios/').json(), [])
+
+        Competition.objects.filter(pk=self.competition.pk).update(status=Competition.FINISHED)
+        self.competition.refresh_from_db()
+        with self.assertRaises(ValueError):
+            enroll(self.competition, [User.objects.create(username='late')])
+
+    def test_start_resets_entries_and_opens_trading(self):
+        enroll(self.competition, self.users)
+        early = self.entry(self.users[0])
+        Position.objects.create(portfolio=early, stock=self.stock, quantity=5, average_buy_price=Decimal('10.00'))
+        TaxLot.objects.create(portfolio=early, stock=self.stock, quantity=5, cost_price=Decimal('10'))
+        Portfolio.objects.filter(pk=early.pk).update(cash_balance=Decimal('950.00'))
+        self.assertEqual(self.buy(self.users[1], 1).status_code, 403)
+
+        self.assertEqual(advance_competitions(self.now), (1, 0))
+        self.competition.refresh_from_db()
+        self.assertEqual(self.competition.status, Competition.RUNNING)
+        self.assertFalse(Position.objects.filter(portfolio=early).exists())
+        self.assertFalse(TaxLot.objects.filter(portfolio=early).exists())
+        self.assertEqual(self.entry(self.users[0]).cash_balance, Decimal('1000.00'))
+        self.assertEqual(self.buy(self.users[1], 1).status_code, 201)
+        # Starting again is a no-op
+        self.assertEqual(start_competition(self.competition).started_at, self.competition.started_at)
+
+    def test_rank_shares_places_on_ties(self):
+        rows = [(1, 1, 'a', 100000, 0), (2, 2, 'b', 90000, 10000), (3, 3, 'c', 50000, 0), (4, 4, 'd', 110000, 0)]
+        standings = rank(self.competition, rows)
+        self.assertEqual([(standing.username, standing.rank) for standing in standings],
+                         [('d', 1), ('a', 2), ('b', 2), ('c', 4)])
+        self.assertEqual([standing.return_percentage for standing in standings],
+                         [Decimal('10.0000'), Decimal('0.0000'), Decimal('0.0000'), Decimal('-50.0000')])
+
+    def test_finalize_freezes_standings(self):
+        enroll(self.competition, self.users)
+        start_competition(self.competition, self.now)
+        self.buy(self.users[2], 10)
+        Stock.objects.filter(pk=self.stock.pk).update(last_price=Decimal('15.00'))
+
+        live = self.client_for(self.users[0]).get(f'/api/competitions/{self.competition.id}/standings/').json()
+        self.assertEqual([(row['username'], row['rank']) for row in live],
+                         [('entrant2', 1), ('entrant0', 2), ('entrant1', 2)])
+        self.assertEqual(Decimal(live[0]['total_value']), Decimal('1050.00'))
+
+        self.assertEqual(advance_competitions(self.now + datetime.timedelta(days=8)), (0, 1))
+        self.assertEqual(Standing.objects.filter(competition=self.competition).count(), 3)
+        # Later price moves don't change a finished competition
+        Stock.objects.filter(pk=self.stock.pk).update(last_price=Decimal('1.00'))
+        frozen = self.client_for(self.users[0]).get(f'/api/competitions/{self.competition.id}/standings/').json()
+        self.assertEqual(frozen, live)
+        self.assertEqual(self.buy(self.users[2], 1).status_code, 403)
+        self.competition.refresh_from_db()
+        self.assertEqual(finalize_competition(self.competition).finished_at, self.competition.finished_at)
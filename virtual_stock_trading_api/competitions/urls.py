@@ -0,0 +1,7 @@
+from rest_framework.routers import DefaultRouter
+from .views import CompetitionViewSet
+
+router = DefaultRouter()
+router.register(r'', CompetitionViewSet, basename='competition')
+
+urlpatterns = router.urls
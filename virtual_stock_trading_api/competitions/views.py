@@ -0,0 +1,69 @@
+from django.db.models import F
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from portfolios.models import Portfolio
+from portfolios.sharding import ShardedViewMixin
+from .lifecycle import enroll, live_standings
+from .models import Competition, Standing
+from .serializers import CompetitionSerializer, StandingSerializer
+
+# Competitions viewset
+
+class IsAdminOrReadOnly(permissions.BasePermission):
+    def has_permission(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return bool(request.user and request.user.is_authenticated)
+        return bool(request.user and request.user.is_staff)
+
+class CompetitionViewSet(ShardedViewMixin, viewsets.ModelViewSet):
+    """
+    Competitions are managed by admins; any user can join and follow the standings
+    """
+    serializer_class = CompetitionSerializer
+    queryset = Competition.objects.all()
+
+    def get_permissions(self):
+        if self.action == 'join':
+            return [permissions.IsAuthenticated()]
+        return [IsAdminOrReadOnly()]
+
+    def get_queryset(self):
+        competitions = Competition.objects.all()
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            competitions = competitions.filter(status=status_filter)
+        return competitions
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+    @action(detail=True, methods=['post'])
+    def join(self, request, pk=None):
+        competition = self.get_object()
+        if competition.status == Competition.FINISHED:
+            return Response({"error": "This competition has finished"}, status=status.HTTP_400_BAD_REQUEST)
+        enroll(competition, [request.user])
+        portfolio = Portfolio.objects.get(competition=competition, user=request.user)
+        return Response({
+            "competition": competition.id,
+            "portfolio_id": portfolio.id,
+            "cash_balance": portfolio.cash_balance,
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def standings(self, request, pk=None):
+        competition = self.get_object()
+        if competition.status == Competition.FINISHED:
+            standings = (Standing.objects
+                         .filter(competition=competition)
+                         .annotate(username=F('user__username'))
+                         .order_by('rank', 'id'))
+        else:
+            standings = live_standings(competition)
+        page = self.paginate_queryset(standings)
+        if page is not None:
+            serializer = StandingSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = StandingSerializer(standings, many=True)
+        return Response(serializer.data)
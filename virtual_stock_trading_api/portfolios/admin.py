@@ -1,26 +1,199 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Portfolio, Position, Transaction, PortfolioSnapshot
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import QueryDict
+from django.utils.functional import cached_property
+from .models import (Portfolio, Position, Transaction, PortfolioSnapshot, LedgerEntry, LedgerArchive, TaxLot,
+                     RealizedGain, PositionCheckpoint)
+from .sharding import shards, use_shard
+
+# Changelists for the large tables (transactions, positions, snapshots and
+# the ledger) avoid work that grows with the table: related rows are joined
+# instead of fetched per row, portfolios and stocks are picked with an
+# autocomplete box instead of a dropdown of every row, and the unfiltered
+# row count comes from PostgreSQL's planner estimate. With sharding, each
+# portfolio changelist browses one shard at a time, picked in the sidebar.
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Use the table statistics instead of COUNT(*) for unfiltered changelists
+    of tables past ADMIN_ESTIMATED_COUNT_THRESHOLD rows
+    """
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            # reltuples is -1 until the table has been analyzed
+            if row and row[0] >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return row[0]
+        return super().count
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """
+    Filter on a foreign key with the admin's select2 autocomplete, which
+    searches the related model admin's search_fields as you type
+    """
+    template = 'admin/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.parameter_name = f"{self.field_name}__id__exact"
+        super().__init__(request, params, model, model_admin)
+        field = model._meta.get_field(self.field_name)
+        form_field = field.formfield(widget=AutocompleteSelect(field, model_admin.admin_site))
+        self.widget_id = f"autocomplete-filter-{self.field_name}"
+        self.rendered_widget = form_field.widget.render(
+            self.parameter_name, self.value(), attrs={'id': self.widget_id, 'style': 'width: 100%'}
+        )
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+class PortfolioFilter(AutocompleteFilter):
+    title = 'portfolio'
+    field_name = 'portfolio'
+
+class StockFilter(AutocompleteFilter):
+    title = 'stock'
+    field_name = 'stock'
+
+class ShardFilter(admin.SimpleListFilter):
+    """
+    Which shard the changelist reads; the first one unless another is picked
+    """
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in shards()]
+
+    def has_output(self):
+        return len(self.lookup_choices) > 1
+
+    def choices(self, changelist):
+        current = self.value() or (shards()[0] if shards() else None)
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': alias == current,
+                'query_string': changelist.get_query_string({self.parameter_name: alias}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        # ShardedAdmin already points the queryset at the chosen shard
+        return queryset
+
+class ShardedAdmin(admin.ModelAdmin):
+    def admin_shard(self, request):
+        alias = request.GET.get('shard')
+        if alias is None:
+            # Change and delete pages carry the changelist's filters along
+            alias = QueryDict(request.GET.get('_changelist_filters', '')).get('shard')
+        return alias if alias in shards() else shards()[0]
+
+    def get_list_filter(self, request):
+        return [ShardFilter, *super().get_list_filter(request)]
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.using(self.admin_shard(request)) if shards() else queryset
+
+    def changelist_view(self, request, extra_context=None):
+        with use_shard(self.admin_shard(request) if shards() else None):
+            return super().changelist_view(request, extra_context)
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        with use_shard(self.admin_shard(request) if shards() else None):
+            return super().changeform_view(request, object_id, form_url, extra_context)
+
+    def delete_view(self, request, object_id, extra_context=None):
+        with use_shard(self.admin_shard(request) if shards() else None):
+            return super().delete_view(request, object_id, extra_context)
+
+class LargeTableAdmin(ShardedAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        # select2 assets for the autocomplete filters
+        widget = AutocompleteSelect(self.model._meta.get_field('portfolio'), self.admin_site)
+        return super().media + widget.media
 
 @admin.register(Portfolio)
-class PortfolioAdmin(admin.ModelAdmin):
-    list_display = ['name', 'user', 'cash_balance', 'created_at']
+class PortfolioAdmin(ShardedAdmin):
+    list_display = ['name', 'user', 'cash_balance', 'cost_basis_method', 'created_at']
     search_fields = ['name', 'user__username']
-    list_filter = ['created_at']
+    list_filter = ['created_at', 'cost_basis_method']
+    # Autocomplete results are paginated, so they need a stable order
+    ordering = ['name', 'id']
 
 @admin.register(Position)
-class PositionAdmin(admin.ModelAdmin):
+class PositionAdmin(LargeTableAdmin):
     list_display = ['portfolio', 'stock', 'quantity', 'average_buy_price']
+    list_select_related = ['portfolio__user', 'stock']
     search_fields = ['portfolio__name', 'stock__symbol']
-    list_filter = ['portfolio']
+    list_filter = [PortfolioFilter, StockFilter]
+    autocomplete_fields = ['portfolio', 'stock']
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(LargeTableAdmin):
     list_display = ['portfolio', 'stock', 'transaction_type', 'quantity', 'price', 'timestamp']
+    list_select_related = ['portfolio__user', 'stock']
     search_fields = ['portfolio__name', 'stock__symbol']
-    list_filter = ['transaction_type', 'timestamp', 'portfolio']
+    list_filter = ['transaction_type', 'timestamp', PortfolioFilter, StockFilter]
+    autocomplete_fields = ['portfolio', 'stock']
 
 @admin.register(PortfolioSnapshot)
-class PortfolioSnapshotAdmin(admin.ModelAdmin):
-    list_display = ['portfolio', 'date', 'cash_balance', 'stock_value', 'total_value']
+class PortfolioSnapshotAdmin(LargeTableAdmin):
+    list_display = ['portfolio', 'timestamp', 'resolution', 'cash_balance', 'stock_value', 'total_value']
+    list_select_related = ['portfolio__user']
+    search_fields = ['portfolio__name']
+    list_filter = ['resolution', 'date', PortfolioFilter]
+    autocomplete_fields = ['portfolio']
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(LargeTableAdmin):
+    list_display = ['portfolio', 'stock', 'transaction_type', 'quantity', 'price', 'timestamp']
+    list_select_related = ['portfolio__user', 'stock']
+    search_fields = ['portfolio__name', 'stock__symbol']
+    list_filter = ['side', 'period', PortfolioFilter, StockFilter]
+    autocomplete_fields = ['portfolio', 'stock']
+
+@admin.register(LedgerArchive)
+class LedgerArchiveAdmin(admin.ModelAdmin):
+    list_display = ['period', 'row_count', 'path', 'created_at']
+    readonly_fields = ['period', 'row_count', 'path', 'portfolio_counts', 'created_at']
+
+@admin.register(PositionCheckpoint)
+class PositionCheckpointAdmin(LargeTableAdmin):
+    list_display = ['portfolio', 'as_of', 'cash_balance', 'created_at']
+    list_select_related = ['portfolio__user']
     search_fields = ['portfolio__name']
-    list_filter = ['date', 'portfolio']
+    list_filter = [PortfolioFilter]
+    autocomplete_fields = ['portfolio']
+
+@admin.register(TaxLot)
+class TaxLotAdmin(ShardedAdmin):
+    list_display = ['portfolio', 'stock', 'quantity', 'cost_price', 'opened_at']
+    search_fields = ['portfolio__name', 'stock__symbol']
+
+@admin.register(RealizedGain)
+class RealizedGainAdmin(ShardedAdmin):
+    list_display = ['portfolio', 'stock', 'amount', 'updated_at']
+    search_fields = ['portfolio__name', 'stock__symbol']
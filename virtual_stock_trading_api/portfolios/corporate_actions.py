@@ -0,0 +1,257 @@
+from decimal import Decimal, ROUND_HALF_UP
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DecimalField, Exists, F, Min, OuterRef, Value, When
+from django.utils import timezone
+from stocks.models import Stock, CorporateAction
+from .dashboard import invalidate_all as invalidate_dashboards
+from .lots import COST_PRECISION, CENTS
+from .models import Portfolio, Position, TaxLot, Transaction
+from .money import to_cents, from_cents
+from .sharding import current_database, shards, use_shard
+
+# Applying corporate actions to holders
+#
+# An action is applied to one chunk of holders per transaction, in portfolio
+# id order. Each chunk adjusts positions, lots and cash with a few batched
+# statements, writes one audit Transaction per holder and moves the action's
+# cursor, all in the same commit. A crash therefore loses at most the chunk
+# in flight, and a rerun resumes after the cursor; the unique audit row per
+# (action, portfolio) guarantees no holder is adjusted twice. Trades in the
+# symbol are refused while an action is processing, checked again under the
+# action's row lock inside the trade's transaction (lock_actions). With
+# sharding, a chunk is cut where the next holder in id order lives on
+# another shard.
+#
+# Splits scale positions and lots by split_to / split_from (and armed price
+# alert thresholds by the inverse) and pay cash in lieu of fractional shares
+# at the reference price. Dividends credit quantity * cash_per_share, rounded
+# half up to the cent.
+
+UPDATE_BATCH = 500
+
+def _cash_updates(credits):
+    """
+    Add cents to cash balances; one relative UPDATE per batch
+    """
+    portfolio_ids = list(credits)
+    for start in range(0, len(portfolio_ids), UPDATE_BATCH):
+        batch = portfolio_ids[start:start + UPDATE_BATCH]
+        amount = Case(*[When(id=portfolio_id, then=Value(from_cents(credits[portfolio_id])))
+                        for portfolio_id in batch],
+                      output_field=DecimalField(max_digits=15, decimal_places=2))
+        Portfolio.objects.filter(id__in=batch).update(cash_balance=F('cash_balance') + amount)
+
+def _split_lots(action, portfolio_ids):
+    """
+    Scale the open lots of the chunk's holders. Each lot rounds down; the
+    shares lost to rounding go back to the holder's oldest lot.
+    """
+    lots = list(TaxLot.objects
+                .select_for_update()
+                .filter(stock_id=action.stock_id, portfolio_id__in=portfolio_ids)
+                .order_by('portfolio_id', 'opened_at', 'id'))
+    ratio = Decimal(action.split_from) / Decimal(action.split_to)
+    by_portfolio = {}
+    for lot in lots:
+        by_portfolio.setdefault(lot.portfolio_id, []).append(lot)
+
+    changed, emptied = [], []
+    for holder_lots in by_portfolio.values():
+        target = sum(lot.quantity for lot in holder_lots) * action.split_to // action.split_from
+        for lot in holder_lots:
+            lot.quantity = lot.quantity * action.split_to // action.split_from
+            lot.cost_price = (lot.cost_price * ratio).quantize(COST_PRECISION, rounding=ROUND_HALF_UP)
+        holder_lots[0].quantity += target - sum(lot.quantity for lot in holder_lots)
+        for lot in holder_lots:
+            (changed if lot.quantity else emptied).append(lot)
+    TaxLot.objects.bulk_update(changed, ['quantity', 'cost_price'], batch_size=UPDATE_BATCH)
+    TaxLot.objects.filter(id__in=[lot.id for lot in emptied]).delete()
+
+def _apply_split(action, positions, audit):
+    reference_cents = to_cents(action.reference_price)
+    ratio = Decimal(action.split_from) / Decimal(action.split_to)
+    credits = {}
+    changed, closed = [], []
+    for position in positions:
+        shares, fraction = divmod(position.quantity * action.split_to, action.split_from)
+        # Cash in lieu: fraction / split_from shares at reference * split_from / split_to
+        cash, remainder = divmod(fraction * reference_cents, action.split_to)
+        if remainder * 2 >= action.split_to:
+            cash += 1
+        if cash:
+            credits[position.portfolio_id] = cash
+        audit.append(Transaction(portfolio_id=position.portfolio_id, stock_id=action.stock_id,
+                                 transaction_type=Transaction.SPLIT,
+                                 quantity=abs(shares - position.quantity), price=Decimal('0.00'),
+                                 corporate_action=action, cash_amount=from_cents(cash)))
+        position.quantity = shares
+        position.average_buy_price = (position.average_buy_price * ratio).quantize(CENTS, rounding=ROUND_HALF_UP)
+        (changed if shares else closed).append(position)
+
+    Position.objects.bulk_update(changed, ['quantity', 'average_buy_price'], batch_size=UPDATE_BATCH)
+    Position.objects.filter(id__in=[position.id for position in closed]).delete()
+    _split_lots(action, [position.portfolio_id for position in positions])
+    return credits
+
+def _apply_dividend(action, positions, audit):
+    # Amount per share in hundredths of a cent, as stored
+    per_share = int(action.cash_per_share.scaleb(4))
+    credits = {}
+    for position in positions:
+        cash, remainder = divmod(position.quantity * per_share, 100)
+        if remainder * 2 >= 100:
+            cash += 1
+        credits[position.portfolio_id] = cash
+        audit.append(Transaction(portfolio_id=position.portfolio_id, stock_id=action.stock_id,
+                                 transaction_type=Transaction.DIVIDEND, quantity=position.quantity,
+                                 price=action.cash_per_share.quantize(CENTS, rounding=ROUND_HALF_UP),
+                                 corporate_action=action, cash_amount=from_cents(cash)))
+    return credits
+
+def _finish(action):
+    from alerts.engine import scale_thresholds
+    from risk.exposure import rebuild_exposures
+
+    if action.kind == CorporateAction.SPLIT:
+        # Before the price change, whose post_save evaluates the symbol's alerts
+        scale_thresholds(action.stock_id, action.split_from, action.split_to)
+        stock = Stock.objects.get(pk=action.stock_id)
+        stock.last_price = from_cents(to_cents(
+            action.reference_price * action.split_from / action.split_to
+        ))
+        stock.save()
+        rebuild_exposures([action.stock_id])
+    action.status = CorporateAction.APPLIED
+    action.applied_at = timezone.now()
+    action.save(update_fields=['status', 'applied_at'])
+
+def _pending_holders(action):
+    """
+    Positions in the action's symbol after the cursor whose holder has no
+    audit row yet. The audit check matters with shards, where a chunk's
+    shard can commit while the cursor update on the default database fails.
+    """
+    adjusted = Transaction.objects.filter(corporate_action_id=action.pk, portfolio_id=OuterRef('portfolio_id'))
+    return (Position.objects
+            .filter(stock_id=action.stock_id, portfolio_id__gt=action.cursor)
+            .exclude(Exists(adjusted)))
+
+def _next_shard(action):
+    """
+    The shard holding the next pending holder in portfolio id order, and
+    the first holder id on any other shard (where this chunk must stop)
+    """
+    if not shards():
+        return current_database(), None
+    firsts = []
+    for alias in shards():
+        with use_shard(alias):
+            first = _pending_holders(action).aggregate(first=Min('portfolio_id'))['first']
+        if first is not None:
+            firsts.append((first, alias))
+    if not firsts:
+        return None, None
+    firsts.sort()
+    return firsts[0][1], firsts[1][0] if len(firsts) > 1 else None
+
+def apply_chunk(action_id, chunk_size):
+    """
+    Apply an action to the next chunk of holders in one transaction. A
+    symbol with fewer holders than chunk_size is done in a single commit.
+    Returns (holders adjusted, whether the action is now applied).
+    """
+    with transaction.atomic():
+        # The row lock keeps two workers from processing the same action
+        action = CorporateAction.objects.select_for_update().get(pk=action_id)
+        if action.status == CorporateAction.APPLIED:
+            return 0, True
+        if action.status == CorporateAction.PENDING:
+            action.status = CorporateAction.PROCESSING
+            action.started_at = timezone.now()
+            action.reference_price = Stock.objects.values_list('last_price', flat=True).get(pk=action.stock_id)
+            action.save(update_fields=['status', 'started_at', 'reference_price'])
+
+        # With shards a chunk stays on one shard, so it commits as a unit there
+        alias, boundary = _next_shard(action)
+        positions = []
+        if alias is not None:
+            with use_shard(alias), transaction.atomic(using=alias):
+                pending = _pending_holders(action)
+                if boundary is not None:
+                    pending = pending.filter(portfolio_id__lt=boundary)
+                positions = list(pending
+                                 .select_for_update()
+                                 .only('id', 'portfolio_id', 'quantity', 'average_buy_price')
+                                 .order_by('portfolio_id')[:chunk_size])
+                if positions:
+                    audit = []
+                    if action.kind == CorporateAction.SPLIT:
+                        credits = _apply_split(action, positions, audit)
+                    else:
+                        credits = _apply_dividend(action, positions, audit)
+                    _cash_updates(credits)
+                    Transaction.objects.bulk_create(audit, batch_size=1000)
+
+        if positions:
+            action.cursor = positions[-1].portfolio_id
+            action.holders_processed += len(positions)
+            action.save(update_fields=['cursor', 'holders_processed'])
+
+        finished = boundary is None and len(positions) < chunk_size
+        if finished:
+            _finish(action)
+        return len(positions), finished
+
+def apply_action(action, chunk_size=None, log=None):
+    """
+    Apply (or resume) one action for all holders. Returns holders adjusted.
+    """
+    chunk_size = chunk_size or settings.CORPORATE_ACTION_CHUNK_SIZE
+    total = 0
+    finished = False
+    while not finished:
+        adjusted, finished = apply_chunk(action.pk, chunk_size)
+        total += adjusted
+        if log and adjusted:
+            log(f"{action}: {total} holders adjusted")
+    invalidate_dashboards()
+    return total
+
+def apply_due_actions(as_of=None, stock=None, chunk_size=None, log=None):
+    """
+    Apply every unapplied action with an ex-date on or before `as_of`, in
+    ex-date order so actions on the same symbol compound correctly.
+    Returns (actions applied, holders adjusted).
+    """
+    as_of = as_of or timezone.localdate()
+    actions = (CorporateAction.objects
+               .exclude(status=CorporateAction.APPLIED)
+               .filter(ex_date__lte=as_of)
+               .select_related('stock')
+               .order_by('ex_date', 'id'))
+    if stock is not None:
+        actions = actions.filter(stock=stock)
+    applied = 0
+    holders = 0
+    for action in actions:
+        holders += apply_action(action, chunk_size, log)
+        applied += 1
+    return applied, holders
+
+def action_in_progress(stock):
+    return CorporateAction.objects.filter(stock=stock, status=CorporateAction.PROCESSING).exists()
+
+def lock_actions(stock):
+    """
+    Lock the symbol's unapplied actions until the caller's transaction ends
+    and report whether one is being applied. apply_chunk holds the same row
+    lock for a whole chunk, so a trade either waits for the chunk to commit
+    or the chunk waits for the trade.
+    """
+    statuses = (CorporateAction.objects
+                .select_for_update()
+                .filter(stock=stock)
+                .exclude(status=CorporateAction.APPLIED)
+                .values_list('status', flat=True))
+    return CorporateAction.PROCESSING in list(statuses)
@@ -0,0 +1,115 @@
+import datetime
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, DecimalField, ExpressionWrapper
+from django.utils import timezone
+from accounts.serializers import UserSerializer
+from .models import Portfolio, Position, PortfolioSnapshot
+from .ledger import recent_transactions
+from .serializers import TransactionSerializer
+
+# Per-user dashboard summary
+#
+# Built from a fixed handful of set-based queries regardless of how many
+# portfolios or positions the user has, then cached per user. Trades and
+# snapshot saves drop the user's entry; bulk snapshot writes bump a global
+# generation so every cached dashboard is dropped at once.
+
+GENERATION_KEY = 'dashboard:generation'
+
+def cache_key(user_id):
+    generation = cache.get_or_set(GENERATION_KEY, 1, timeout=None)
+    return f"dashboard:{user_id}:{generation}"
+
+def invalidate_user(user_id):
+    cache.delete(cache_key(user_id))
+
+def invalidate_all():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 2, timeout=None)
+
+def get_dashboard(user):
+    key = cache_key(user.id)
+    data = cache.get(key)
+    if data is None:
+        data = build_dashboard(user)
+        cache.set(key, data, timeout=settings.DASHBOARD_CACHE_TTL)
+    return data
+
+def build_dashboard(user):
+    portfolios = list(Portfolio.objects
+                      .filter(user=user)
+                      .values('id', 'name', 'cash_balance', 'cost_basis_method')
+                      .order_by('id'))
+    portfolio_ids = [portfolio['id'] for portfolio in portfolios]
+
+    value = ExpressionWrapper(F('quantity') * F('stock__last_price'),
+                              output_field=DecimalField(max_digits=20, decimal_places=2))
+    positions = (Position.objects
+                 .filter(portfolio_id__in=portfolio_ids)
+                 .annotate(value=value)
+                 .values('portfolio_id', 'stock__symbol', 'quantity', 'average_buy_price',
+                         'stock__last_price', 'value')
+                 .order_by('portfolio_id', '-value'))
+
+    stock_values = defaultdict(lambda: 0)
+    position_counts = defaultdict(int)
+    top_positions = defaultdict(list)
+    for row in positions:
+        portfolio_id = row['portfolio_id']
+        stock_values[portfolio_id] += row['value']
+        position_counts[portfolio_id] += 1
+        if len(top_positions[portfolio_id]) < settings.DASHBOARD_TOP_POSITIONS:
+            top_positions[portfolio_id].append({
+                'symbol': row['stock__symbol'],
+                'quantity': row['quantity'],
+                'current_price': row['stock__last_price'],
+                'current_value': row['value'],
+                'profit_loss': row['value'] - row['average_buy_price'] * row['quantity'],
+            })
+
+    transactions = defaultdict(list)
+    for txn in recent_transactions(portfolio_ids, settings.DASHBOARD_RECENT_TRANSACTIONS):
+        transactions[txn.portfolio_id].append(txn)
+
+    since = timezone.now() - datetime.timedelta(days=settings.DASHBOARD_SPARKLINE_DAYS)
+    sparkline_points = defaultdict(dict)
+    for portfolio_id, timestamp, total_value in (PortfolioSnapshot.objects
+                                                 .filter(portfolio_id__in=portfolio_ids, timestamp__gte=since)
+                                                 .values_list('portfolio_id', 'timestamp', 'total_value')
+                                                 .order_by('timestamp')):
+        # Last value of each day
+        sparkline_points[portfolio_id][timestamp.date()] = total_value
+
+    summaries = []
+    for portfolio in portfolios:
+        portfolio_id = portfolio['id']
+        stock_value = stock_values[portfolio_id]
+        summaries.append({
+            **portfolio,
+            'positions_count': position_counts[portfolio_id],
+            'total_stock_value': stock_value,
+            'total_value': portfolio['cash_balance'] + stock_value,
+            'top_positions': top_positions[portfolio_id],
+            'recent_transactions': TransactionSerializer(transactions[portfolio_id], many=True).data,
+            'sparkline': [
+                {'date': date, 'total_value': total_value}
+                for date, total_value in sparkline_points[portfolio_id].items()
+            ],
+        })
+
+    cash = sum((summary['cash_balance'] for summary in summaries), 0)
+    stock_value = sum((summary['total_stock_value'] for summary in summaries), 0)
+    return {
+        'user': UserSerializer(user).data,
+        'totals': {
+            'cash_balance': cash,
+            'total_stock_value': stock_value,
+            'total_value': cash + stock_value,
+        },
+        'portfolios': summaries,
+        'generated_at': timezone.now(),
+    }
@@ -0,0 +1,363 @@
+import datetime
+from bisect import bisect_right
+from collections import defaultdict
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from stocks.models import Stock, PriceBar
+from .ledger import PARTITIONED_MODE, ledger_mode, read_archived_entries
+from .models import (Portfolio, Position, Transaction, LedgerEntry, LedgerArchive, PortfolioSnapshot,
+                     PositionCheckpoint, ledger_period)
+from .money import to_cents, from_cents
+from .sharding import for_each_shard
+
+# Historical holdings
+#
+# Every ledger row is turned into an event (timestamp, stock id, quantity
+# delta, cash delta in cents): buys add shares and spend cash, sells do the
+# opposite, dividends add cash, and splits add or remove the audited share
+# difference plus any cash in lieu. Since events are plain deltas, a state
+# can be replayed forwards (apply) or backwards (undo) from any known state.
+#
+# Known states are PositionCheckpoint rows and the live Position table.
+# holdings_at() starts from whichever checkpoint is nearest in time and
+# replays only the events between it and the requested moment. Past
+# holdings are valued at the latest daily close on or before that day.
+#
+# Cash changes that leave no ledger row (manual balance edits, competition
+# resets) are not replayed, so states across them keep today's cash basis.
+
+def _trade_events(rows):
+    events = []
+    for timestamp, stock_id, transaction_type, quantity, price_cents in rows:
+        if transaction_type == Transaction.BUY:
+            events.append((timestamp, stock_id, quantity, -price_cents * quantity))
+        else:
+            events.append((timestamp, stock_id, -quantity, price_cents * quantity))
+    return events
+
+def events_between(portfolio_id, after=None, until=None):
+    """
+    Events with after < timestamp <= until, oldest first, from wherever the
+    ledger keeps them (Transaction, LedgerEntry and archived periods)
+    """
+    window = Q(portfolio_id=portfolio_id)
+    if after is not None:
+        window &= Q(timestamp__gt=after)
+    if until is not None:
+        window &= Q(timestamp__lte=until)
+
+    transactions = Transaction.objects.filter(window)
+    partitioned = ledger_mode() == PARTITIONED_MODE
+    if partitioned:
+        # Trades live in the compact ledger; only corporate action rows stay here
+        transactions = transactions.exclude(transaction_type__in=LedgerEntry.SIDE_CODES)
+    rows = transactions.values_list('timestamp', 'stock_id', 'transaction_type', 'quantity', 'price',
+                                    'cash_amount', 'corporate_action__split_to',
+                                    'corporate_action__split_from')
+
+    events = []
+    trades = []
+    for timestamp, stock_id, transaction_type, quantity, price, cash, split_to, split_from in rows:
+        if transaction_type == Transaction.DIVIDEND:
+            events.append((timestamp, stock_id, 0, to_cents(cash or 0)))
+        elif transaction_type == Transaction.SPLIT:
+            sign = 1 if split_to >= split_from else -1
+            events.append((timestamp, stock_id, sign * quantity, to_cents(cash or 0)))
+        else:
+            trades.append((timestamp, stock_id, transaction_type, quantity, to_cents(price)))
+
+    if partitioned:
+        side_names = LedgerEntry.SIDE_NAMES
+        trades.extend((timestamp, stock_id, side_names[side], quantity, price_cents)
+                      for timestamp, stock_id, side, quantity, price_cents in (LedgerEntry.objects
+                          .filter(window)
+                          .values_list('timestamp', 'stock_id', 'side', 'quantity', 'price_cents')))
+        archives = LedgerArchive.objects.all()
+        if after is not None:
+            archives = archives.filter(period__gte=ledger_period(after))
+        if until is not None:
+            archives = archives.filter(period__lte=ledger_period(until))
+        for archive in archives:
+            if not archive.portfolio_counts.get(str(portfolio_id)):
+                continue
+            trades.extend(
+                (entry.timestamp, entry.stock_id, entry.transaction_type, entry.quantity, entry.price_cents)
+                for entry in read_archived_entries(archive, portfolio_id)
+                if (after is None or entry.timestamp > after) and (until is None or entry.timestamp <= until)
+            )
+
+    events.extend(_trade_events(trades))
+    events.sort(key=lambda event: event[0])
+    return events
+
+class HoldingsState:
+    """
+    Cash (cents) and {stock id: quantity} of one portfolio at `as_of`
+    """
+    __slots__ = ('as_of', 'cash_cents', 'holdings', 'source', 'events_replayed')
+
+    def __init__(self, as_of, cash_cents, holdings, source):
+        self.as_of = as_of
+        self.cash_cents = cash_cents
+        self.holdings = defaultdict(int, holdings)
+        self.source = source
+        self.events_replayed = 0
+
+    def apply(self, event):
+        _, stock_id, quantity, cash = event
+        self.holdings[stock_id] += quantity
+        self.cash_cents += cash
+        self.events_replayed += 1
+
+    def undo(self, event):
+        _, stock_id, quantity, cash = event
+        self.holdings[stock_id] -= quantity
+        self.cash_cents -= cash
+        self.events_replayed += 1
+
+    def positions(self):
+        return {stock_id: quantity for stock_id, quantity in self.holdings.items() if quantity}
+
+def live_states(portfolio_ids):
+    """
+    Current states from the Position table, one query per table
+    """
+    now = timezone.now()
+    states = {
+        portfolio_id: HoldingsState(now, to_cents(cash), {}, 'live')
+        for portfolio_id, cash in Portfolio.objects.filter(id__in=portfolio_ids).values_list('id', 'cash_balance')
+    }
+    for portfolio_id, stock_id, quantity in (Position.objects
+                                             .filter(portfolio_id__in=portfolio_ids)
+                                             .values_list('portfolio_id', 'stock_id', 'quantity')):
+        states[portfolio_id].holdings[stock_id] = quantity
+    return states
+
+def checkpoint_state(checkpoint):
+    return HoldingsState(checkpoint.as_of, to_cents(checkpoint.cash_balance),
+                         {int(stock_id): quantity for stock_id, quantity in checkpoint.holdings.items()},
+                         'checkpoint')
+
+def nearest_state(portfolio_id, at):
+    """
+    The known state closest in time to `at`: the checkpoints either side of
+    it, or the live positions
+    """
+    checkpoints = PositionCheckpoint.objects.filter(portfolio_id=portfolio_id)
+    before = checkpoints.filter(as_of__lte=at).order_by('-as_of').first()
+    after = checkpoints.filter(as_of__gt=at).order_by('as_of').first()
+    candidates = [checkpoint_state(checkpoint) for checkpoint in (before, after) if checkpoint is not None]
+    if after is None:
+        candidates.append(live_states([portfolio_id])[portfolio_id])
+    return min(candidates, key=lambda state: abs((state.as_of - at).total_seconds()))
+
+def holdings_at(portfolio_id, at):
+    """
+    Rebuild a portfolio's holdings and cash as of `at`
+    """
+    state = nearest_state(portfolio_id, at)
+    if state.as_of <= at:
+        for event in events_between(portfolio_id, state.as_of, at):
+            state.apply(event)
+    else:
+        for event in reversed(events_between(portfolio_id, at, state.as_of)):
+            state.undo(event)
+    state.as_of = at
+    return state
+
+class PriceHistory:
+    """
+    Daily closes for a set of stocks over a date range; price_cents() gives
+    the latest close on or before a day, within HISTORY_PRICE_LOOKBACK_DAYS
+    """
+    def __init__(self, stock_ids, start, end):
+        self.lookback = datetime.timedelta(days=settings.HISTORY_PRICE_LOOKBACK_DAYS)
+        self.dates = defaultdict(list)
+        self.closes = defaultdict(list)
+        bars = (PriceBar.objects
+                .filter(stock_id__in=stock_ids, date__gte=start - self.lookback, date__lte=end)
+                .order_by('stock_id', 'date')
+                .values_list('stock_id', 'date', 'close'))
+        for stock_id, day, close in bars:
+            self.dates[stock_id].append(day)
+            self.closes[stock_id].append(to_cents(close))
+        # Today's value uses the live price when no bar has been stored yet
+        self.today = timezone.localdate()
+        self.last_prices = {}
+        if end >= self.today:
+            self.last_prices = {stock_id: to_cents(price) for stock_id, price in
+                                Stock.objects.filter(id__in=stock_ids).values_list('id', 'last_price')}
+
+    def price_cents(self, stock_id, day):
+        if day >= self.today and self.last_prices.get(stock_id):
+            return self.last_prices[stock_id]
+        dates = self.dates.get(stock_id)
+        if dates:
+            index = bisect_right(dates, day) - 1
+            if index >= 0 and day - dates[index] <= self.lookback:
+                return self.closes[stock_id][index]
+        return None
+
+def value_state(state, prices, day):
+    """
+    (stock value cents, [(stock id, quantity, price cents or None)]) for a state
+    """
+    total = 0
+    lines = []
+    for stock_id, quantity in sorted(state.positions().items()):
+        price = prices.price_cents(stock_id, day)
+        if price is not None:
+            total += price * quantity
+        lines.append((stock_id, quantity, price))
+    return total, lines
+
+def reconstruct(portfolio, at):
+    """
+    Holdings and valuation of a portfolio as of `at`, for the API
+    """
+    state = holdings_at(portfolio.id, at)
+    day = timezone.localtime(at).date()
+    positions = state.positions()
+    prices = PriceHistory(list(positions), day, day)
+    stock_value, lines = value_state(state, prices, day)
+    symbols = dict(Stock.objects.filter(id__in=positions).values_list('id', 'symbol'))
+    return {
+        'as_of': at,
+        'cash_balance': from_cents(state.cash_cents),
+        'stock_value': from_cents(stock_value),
+        'total_value': from_cents(state.cash_cents + stock_value),
+        'positions': [
+            {
+                'symbol': symbols.get(stock_id),
+                'quantity': quantity,
+                'price': None if price is None else from_cents(price),
+                'value': None if price is None else from_cents(price * quantity),
+            }
+            for stock_id, quantity, price in lines
+        ],
+        'unpriced': sorted(symbols.get(stock_id) for stock_id, _, price in lines if price is None),
+        'replayed_from': state.source,
+        'events_replayed': state.events_replayed,
+    }
+
+def day_end(day):
+    """
+    Last moment of a local calendar day
+    """
+    start = timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+    return start - datetime.timedelta(microseconds=1)
+
+def daily_states(portfolio_id, days):
+    """
+    End-of-day states for `days` from one backward sweep over the ledger,
+    starting at the first checkpoint after the last day (or the live state)
+    """
+    days = sorted(days, reverse=True)
+    if not days:
+        return {}
+    latest_end = day_end(days[0])
+    checkpoint = (PositionCheckpoint.objects
+                  .filter(portfolio_id=portfolio_id, as_of__gte=latest_end)
+                  .order_by('as_of').first())
+    state = checkpoint_state(checkpoint) if checkpoint else live_states([portfolio_id])[portfolio_id]
+
+    states = {}
+    pending = [(day, day_end(day)) for day in days]
+    for event in reversed(events_between(portfolio_id, day_end(days[-1]), state.as_of)):
+        # Every event after a day's end has been undone; record that day
+        while pending and pending[0][1] >= event[0]:
+            day, _ = pending.pop(0)
+            states[day] = (state.cash_cents, state.positions())
+        state.undo(event)
+    for day, _ in pending:
+        states[day] = (state.cash_cents, state.positions())
+    return states
+
+def backfill_snapshots(start, end, portfolio_ids=None, log=None):
+    """
+    Write DAILY snapshots for the days in [start, end] a portfolio has no
+    snapshot for, valued at each day's close. Returns snapshots written.
+    """
+    return sum(for_each_shard(_backfill_shard, start, end, portfolio_ids, log))
+
+def _backfill_shard(start, end, portfolio_ids, log):
+    portfolios = Portfolio.objects.filter(created_at__date__lte=end)
+    if portfolio_ids is not None:
+        portfolios = portfolios.filter(id__in=portfolio_ids)
+    days = [start + datetime.timedelta(days=offset) for offset in range((end - start).days + 1)]
+    written = 0
+    for portfolio_id, created_at in portfolios.values_list('id', 'created_at').order_by('id'):
+        first_day = max(start, timezone.localtime(created_at).date())
+        covered = set(PortfolioSnapshot.objects
+                      .filter(portfolio_id=portfolio_id, date__gte=first_day, date__lte=end)
+                      .values_list('date', flat=True))
+        missing = [day for day in days if day >= first_day and day not in covered]
+        if not missing:
+            continue
+        states = daily_states(portfolio_id, missing)
+        stock_ids = {stock_id for _, positions in states.values() for stock_id in positions}
+        prices = PriceHistory(stock_ids, min(missing), max(missing))
+        snapshots = []
+        for day, (cash_cents, positions) in states.items():
+            stock_value = sum((prices.price_cents(stock_id, day) or 0) * quantity
+                              for stock_id, quantity in positions.items())
+            timestamp = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+            snapshots.append(PortfolioSnapshot(
+                portfolio_id=portfolio_id, timestamp=timestamp, date=day, resolution=PortfolioSnapshot.DAILY,
+                cash_balance=from_cents(cash_cents), stock_value=from_cents(stock_value),
+                total_value=from_cents(cash_cents + stock_value)
+            ))
+        PortfolioSnapshot.objects.bulk_create(snapshots, batch_size=1000, ignore_conflicts=True)
+        written += len(snapshots)
+        if log:
+            log(f"Portfolio {portfolio_id}: backfilled {len(snapshots)} days")
+    return written
+
+def _checkpoint(portfolio_id, as_of, state):
+    return PositionCheckpoint(
+        portfolio_id=portfolio_id, as_of=as_of, cash_balance=from_cents(state.cash_cents),
+        holdings={str(stock_id): quantity for stock_id, quantity in state.positions().items()}
+    )
+
+def checkpoint_portfolios(as_of=None, batch_size=1000):
+    """
+    Checkpoint every portfolio's live state, a batch of portfolios at a time
+    """
+    return sum(for_each_shard(_checkpoint_shard, as_of, batch_size))
+
+def _checkpoint_shard(as_of, batch_size):
+    from .snapshots import portfolio_id_ranges
+
+    written = 0
+    for first_id, last_id in portfolio_id_ranges(batch_size):
+        ids = list(Portfolio.objects.filter(id__gte=first_id, id__lte=last_id).values_list('id', flat=True))
+        states = live_states(ids)
+        PositionCheckpoint.objects.bulk_create([
+            _checkpoint(portfolio_id, as_of or state.as_of, state) for portfolio_id, state in states.items()
+        ], ignore_conflicts=True)
+        written += len(states)
+    return written
+
+def build_checkpoints(portfolio_id, every=None):
+    """
+    Walk a portfolio's ledger back from its live state and checkpoint the
+    state every `every` events, so no reconstruction replays more than that.
+    Returns the number of checkpoints written.
+    """
+    every = every or settings.HISTORY_CHECKPOINT_EVERY
+    state = live_states([portfolio_id])[portfolio_id]
+    checkpoints = [_checkpoint(portfolio_id, state.as_of, state)]
+    events = events_between(portfolio_id, None, state.as_of)
+    since = 0
+    for position in range(len(events) - 1, 0, -1):
+        state.undo(events[position])
+        since += 1
+        previous = events[position - 1][0]
+        # A checkpoint must sit between two distinct timestamps, or replaying
+        # from it would skip events that share its timestamp
+        if since >= every and previous < events[position][0]:
+            checkpoints.append(_checkpoint(portfolio_id, previous, state))
+            since = 0
+    PositionCheckpoint.objects.bulk_create(checkpoints, ignore_conflicts=True)
+    return len(checkpoints)
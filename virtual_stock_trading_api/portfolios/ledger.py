@@ -0,0 +1,322 @@
+import gzip
+import heapq
+import json
+import os
+from bisect import bisect_left
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from stocks.models import Stock
+from .models import Transaction, LedgerEntry, LedgerArchive, ledger_period
+from .money import to_cents
+
+# Transaction ledger storage
+#
+# In 'table' mode every trade is a row in Transaction. In 'partitioned' mode
+# trades go to LedgerEntry (smallint side, integer cents, monthly period key)
+# and cold periods can be archived to gzip files, which stay readable through
+# portfolio_transactions(). Corporate action audit rows (splits, dividends)
+# always stay in Transaction and are merged into partitioned reads by time.
+
+TABLE_MODE = 'table'
+PARTITIONED_MODE = 'partitioned'
+
+def ledger_mode():
+    return getattr(settings, 'TRANSACTION_LEDGER_MODE', TABLE_MODE)
+
+def record_transaction(portfolio, stock, transaction_type, quantity, price):
+    """
+    Append a trade to the ledger using the configured storage mode
+    """
+    if ledger_mode() == PARTITIONED_MODE:
+        return LedgerEntry.objects.create(
+            portfolio=portfolio,
+            stock=stock,
+            side=LedgerEntry.SIDE_CODES[transaction_type],
+            quantity=quantity,
+            price_cents=to_cents(price)
+        )
+    return Transaction.objects.create(
+        portfolio=portfolio,
+        stock=stock,
+        transaction_type=transaction_type,
+        quantity=quantity,
+        price=price
+    )
+
+class LedgerReader:
+    """
+    Newest-first sequence over a portfolio's hot ledger rows followed by
+    its archived rows, with the corporate action audit rows from Transaction
+    merged in by time. Supports len() and slicing so it can be paginated.
+    """
+    def __init__(self, portfolio):
+        self.portfolio = portfolio
+        self.hot = (LedgerEntry.objects
+                    .filter(portfolio=portfolio)
+                    .select_related('stock')
+                    .order_by('-timestamp', '-id'))
+
+        # Audit rows are few per portfolio; file each one under its archived
+        # period if there is one, otherwise merge it with the hot rows
+        archives = list(LedgerArchive.objects.order_by('-period'))
+        archived_periods = {archive.period for archive in archives}
+        self.audit = []
+        self.archived_audit = {}
+        for row in audit_transactions().filter(portfolio=portfolio).order_by('-timestamp', '-id'):
+            period = ledger_period(row.timestamp)
+            if period in archived_periods:
+                self.archived_audit.setdefault(period, []).append(row)
+            else:
+                self.audit.append(row)
+
+        key = str(portfolio.id)
+        self.archives = []
+        for archive in archives:
+            count = archive.portfolio_counts.get(key, 0) + len(self.archived_audit.get(archive.period, ()))
+            if count:
+                self.archives.append((archive, count))
+        self._hot_count = None
+        self._audit_positions = None
+
+    def hot_count(self):
+        if self._hot_count is None:
+            self._hot_count = self.hot.count() + len(self.audit)
+        return self._hot_count
+
+    def audit_positions(self):
+        """
+        Index of each hot audit row in the merged sequence: its own index plus
+        the ledger rows newer than it (an audit row goes first on a tie)
+        """
+        if self._audit_positions is None:
+            newer = {}
+            if self.audit:
+                newer = self.hot.order_by().aggregate(**{
+                    f'newer_{i}': Count('id', filter=Q(timestamp__gt=row.timestamp))
+                    for i, row in enumerate(self.audit)
+                })
+            self._audit_positions = [i + newer[f'newer_{i}'] for i in range(len(self.audit))]
+        return self._audit_positions
+
+    def count(self):
+        return self.hot_count() + sum(count for _, count in self.archives)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[0:len(self)])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            items = self[index:index + 1]
+            if not items:
+                raise IndexError(index)
+            return items[0]
+        start, stop, _ = index.indices(len(self))
+        if start >= stop:
+            return []
+
+        hot_count = self.hot_count()
+        results = []
+        if start < hot_count:
+            # Positions not taken by audit rows are ledger rows, in order
+            end = min(stop, hot_count)
+            positions = self.audit_positions()
+            first, last = bisect_left(positions, start), bisect_left(positions, end)
+            entries = iter(self.hot[start - first:end - last])
+            audit = dict(zip(positions[first:last], self.audit[first:last]))
+            results = [audit[position] if position in audit else next(entries)
+                       for position in range(start, end)]
+
+        # Walk archives until the requested window is filled
+        offset = hot_count
+        for archive, count in self.archives:
+            if offset >= stop:
+                break
+            if offset + count > start:
+                entries = []
+                if archive.portfolio_counts.get(str(self.portfolio.id)):
+                    entries = read_archived_entries(archive, self.portfolio.id)
+                # Audit rows go first on a tie, as in the hot section
+                rows = list(heapq.merge(
+                    self.archived_audit.get(archive.period, []),
+                    entries,
+                    key=lambda row: row.timestamp, reverse=True
+                ))
+                results.extend(rows[max(start - offset, 0):stop - offset])
+            offset += count
+        return results
+
+def audit_transactions():
+    """
+    Transaction rows that are not trades (split and dividend audit rows)
+    """
+    return Transaction.objects.exclude(transaction_type__in=LedgerEntry.SIDE_CODES).select_related('stock')
+
+def portfolio_transactions(portfolio):
+    """
+    Newest-first transactions for a portfolio, regardless of storage mode
+    """
+    if ledger_mode() == PARTITIONED_MODE:
+        return LedgerReader(portfolio)
+    return Transaction.objects.filter(portfolio=portfolio).select_related('stock').order_by('-timestamp')
+
+def recent_transactions(portfolio_ids, limit):
+    """
+    The newest `limit` hot ledger rows of each portfolio in one windowed query
+    (two in partitioned mode, where the audit rows are merged in)
+    """
+    rank = Window(RowNumber(), partition_by=[F('portfolio_id')], order_by=[F('timestamp').desc(), F('id').desc()])
+    if ledger_mode() != PARTITIONED_MODE:
+        return list(Transaction.objects
+                    .filter(portfolio_id__in=portfolio_ids)
+                    .select_related('stock')
+                    .annotate(rank=rank)
+                    .filter(rank__lte=limit)
+                    .order_by('portfolio_id', 'rank'))
+
+    newest = {}
+    for queryset in (audit_transactions(), LedgerEntry.objects.select_related('stock')):
+        for row in (queryset
+                    .filter(portfolio_id__in=portfolio_ids)
+                    .annotate(rank=rank)
+                    .filter(rank__lte=limit)
+                    .order_by('portfolio_id', 'rank')):
+            newest.setdefault(row.portfolio_id, []).append(row)
+    results = []
+    for portfolio_id in sorted(newest):
+        # Stable sort: audit rows stay ahead of ledger rows on a tie
+        rows = sorted(newest[portfolio_id], key=lambda row: row.timestamp, reverse=True)
+        results.extend(rows[:limit])
+    return results
+
+def archive_path(period):
+    archive_dir = getattr(settings, 'LEDGER_ARCHIVE_DIR')
+    return os.path.join(archive_dir, f"ledger-{period}.jsonl.gz")
+
+def archive_period(period):
+    """
+    Move one month of ledger rows into a gzip file and delete them from the table
+    """
+    if LedgerArchive.objects.filter(period=period).exists():
+        raise ValueError(f"Ledger period {period} is already archived")
+
+    # Archive (and later delete) only rows that exist now; a row written for
+    # the period while the file is being dumped stays in the table
+    bounds = LedgerEntry.objects.filter(period=period).aggregate(
+        max_id=Max('id'), last_source_id=Max('source_transaction_id')
+    )
+    max_id = bounds['max_id']
+    if max_id is None:
+        raise ValueError(f"Ledger period {period} has no rows to archive")
+    entries = (LedgerEntry.objects
+               .filter(period=period, id__lte=max_id)
+               .select_related('stock')
+               .order_by('portfolio_id', '-timestamp', '-id'))
+    path = archive_path(period)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    portfolio_counts = {}
+    row_count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as fh:
+        for entry in entries.iterator(chunk_size=5000):
+            fh.write(json.dumps([
+                entry.id, entry.portfolio_id, entry.stock_id, entry.stock.symbol,
+                entry.side, entry.quantity, entry.price_cents, entry.timestamp.isoformat()
+            ]) + '\n')
+            key = str(entry.portfolio_id)
+            portfolio_counts[key] = portfolio_counts.get(key, 0) + 1
+            row_count += 1
+
+    with transaction.atomic():
+        archive = LedgerArchive.objects.create(
+            period=period,
+            path=path,
+            row_count=row_count,
+            portfolio_counts=portfolio_counts,
+            last_source_id=bounds['last_source_id']
+        )
+        LedgerEntry.objects.filter(period=period, id__lte=max_id).delete()
+    return archive
+
+def read_archived_entries(archive, portfolio_id):
+    """
+    Rebuild unsaved LedgerEntry objects for one portfolio from an archive file
+    """
+    entries = []
+    with gzip.open(archive.path, 'rt', encoding='utf-8') as fh:
+        for line in fh:
+            row = json.loads(line)
+            if row[1] != portfolio_id:
+                if entries:
+                    # Rows are grouped by portfolio
+                    break
+                continue
+            entry_id, _, stock_id, symbol, side, quantity, price_cents, timestamp = row
+            entries.append(LedgerEntry(
+                id=entry_id,
+                portfolio_id=portfolio_id,
+                stock=Stock(id=stock_id, symbol=symbol),
+                period=archive.period,
+                side=side,
+                quantity=quantity,
+                price_cents=price_cents,
+                timestamp=parse_datetime(timestamp)
+            ))
+    return entries
+
+def cold_periods(hot_months):
+    """
+    Periods with live rows that are older than the hot window
+    """
+    now = timezone.now()
+    months = now.year * 12 + now.month - 1 - hot_months
+    cutoff = (months // 12) * 100 + months % 12 + 1
+    return list(LedgerEntry.objects
+                .filter(period__lte=cutoff)
+                .values_list('period', flat=True)
+                .distinct()
+                .order_by('period'))
+
+def import_transactions(batch_size=5000):
+    """
+    Copy Transaction rows into the compact ledger, skipping ones already imported.
+    Corporate action audit rows stay in Transaction; the ledger holds trades only.
+    """
+    # Resume after the newest Transaction already copied, hot or archived; trades
+    # written to the ledger directly carry no source id and don't move the cursor
+    last = max(
+        LedgerEntry.objects.aggregate(last=Max('source_transaction_id'))['last'] or 0,
+        LedgerArchive.objects.aggregate(last=Max('last_source_id'))['last'] or 0,
+    )
+    rows = (Transaction.objects
+            .filter(transaction_type__in=LedgerEntry.SIDE_CODES, id__gt=last)
+            .order_by('id'))
+
+    imported = 0
+    batch = []
+    for txn in rows.iterator(chunk_size=batch_size):
+        batch.append(LedgerEntry(
+            portfolio_id=txn.portfolio_id,
+            stock_id=txn.stock_id,
+            period=ledger_period(txn.timestamp),
+            side=LedgerEntry.SIDE_CODES[txn.transaction_type],
+            quantity=txn.quantity,
+            price_cents=to_cents(txn.price),
+            timestamp=txn.timestamp,
+            source_transaction_id=txn.id
+        ))
+        if len(batch) >= batch_size:
+            # A concurrent import may have copied some of these already
+            LedgerEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            imported += len(batch)
+            batch = []
+    if batch:
+        LedgerEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        imported += len(batch)
+    return imported
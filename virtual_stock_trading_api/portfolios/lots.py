@@ -0,0 +1,158 @@
+from decimal import Decimal, ROUND_HALF_UP
+from django.db.models import F, Sum, DecimalField, ExpressionWrapper
+from .models import Portfolio, TaxLot, RealizedGain
+
+# Incremental cost-basis tracking
+#
+# Each fill touches only the open lots of one position, so realized and
+# unrealized P&L never need a replay of the transaction history.
+
+COST_PRECISION = Decimal('0.0001')
+CENTS = Decimal('0.01')
+
+def _open_lots(portfolio, stock):
+    return list(TaxLot.objects
+                .select_for_update()
+                .filter(portfolio=portfolio, stock=stock)
+                .order_by('opened_at', 'id'))
+
+def _reconcile(lots, portfolio, stock, held_before, fallback_price):
+    """
+    Seed a lot for shares bought before lot tracking existed
+    """
+    untracked = held_before - sum(lot.quantity for lot in lots)
+    if untracked > 0:
+        seed = TaxLot.objects.create(
+            portfolio=portfolio,
+            stock=stock,
+            quantity=untracked,
+            cost_price=fallback_price,
+            opened_at=lots[0].opened_at if lots else portfolio.created_at
+        )
+        lots.insert(0, seed)
+    return lots
+
+def _merge(lots):
+    """
+    Collapse lots into a single average-cost lot
+    """
+    if len(lots) <= 1:
+        return lots
+    quantity = sum(lot.quantity for lot in lots)
+    cost = sum(lot.cost_basis for lot in lots)
+    merged = lots[0]
+    merged.quantity = quantity
+    merged.cost_price = (cost / quantity).quantize(COST_PRECISION, rounding=ROUND_HALF_UP)
+    merged.save()
+    TaxLot.objects.filter(id__in=[lot.id for lot in lots[1:]]).delete()
+    return [merged]
+
+def average_cost(lots):
+    quantity = sum(lot.quantity for lot in lots)
+    if quantity == 0:
+        return Decimal('0.00')
+    cost = sum(lot.cost_basis for lot in lots)
+    return (cost / quantity).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+def apply_buy(portfolio, stock, quantity, price, held_before=0, fallback_price=None):
+    """
+    Open (or, for average cost, grow) a lot for a buy fill.
+    Must be called inside the trade's atomic block.
+    Returns the average cost of the open lots after the fill.
+    """
+    lots = _reconcile(_open_lots(portfolio, stock), portfolio, stock,
+                      held_before, fallback_price or price)
+
+    if portfolio.cost_basis_method == Portfolio.AVERAGE and lots:
+        lot = _merge(lots)[0]
+        total = lot.quantity + quantity
+        lot.cost_price = (
+            (lot.cost_basis + price * quantity) / total
+        ).quantize(COST_PRECISION, rounding=ROUND_HALF_UP)
+        lot.quantity = total
+        lot.save()
+        return average_cost([lot])
+
+    lots.append(TaxLot.objects.create(
+        portfolio=portfolio,
+        stock=stock,
+        quantity=quantity,
+        cost_price=price
+    ))
+    return average_cost(lots)
+
+def apply_sell(portfolio, stock, quantity, price, held_before, fallback_price):
+    """
+    Close lots for a sell fill using the portfolio's cost basis method.
+    Must be called inside the trade's atomic block.
+    Returns (realized profit/loss, average cost of the remaining lots).
+    """
+    lots = _reconcile(_open_lots(portfolio, stock), portfolio, stock,
+                      held_before, fallback_price)
+
+    if portfolio.cost_basis_method == Portfolio.AVERAGE:
+        lots = _merge(lots)
+    elif portfolio.cost_basis_method == Portfolio.LIFO:
+        lots.reverse()
+
+    realized = Decimal('0')
+    remaining = quantity
+    closed = []
+    for lot in lots:
+        if remaining == 0:
+            break
+        taken = min(lot.quantity, remaining)
+        realized += (price - lot.cost_price) * taken
+        remaining -= taken
+        lot.quantity -= taken
+        if lot.quantity == 0:
+            closed.append(lot.id)
+        else:
+            lot.save()
+
+    if closed:
+        TaxLot.objects.filter(id__in=closed).delete()
+
+    realized = realized.quantize(CENTS, rounding=ROUND_HALF_UP)
+    gain, created = RealizedGain.objects.get_or_create(
+        portfolio=portfolio,
+        stock=stock,
+        defaults={'amount': realized}
+    )
+    if not created:
+        RealizedGain.objects.filter(id=gain.id).update(amount=F('amount') + realized)
+
+    return realized, average_cost([lot for lot in lots if lot.quantity > 0])
+
+def unrealized_by_stock(portfolio):
+    """
+    Unrealized profit/loss per stock computed from open lots in one query
+    """
+    cost = ExpressionWrapper(F('quantity') * F('cost_price'),
+                             output_field=DecimalField(max_digits=20, decimal_places=4))
+    rows = (TaxLot.objects
+            .filter(portfolio=portfolio)
+            .values('stock_id', 'stock__symbol', 'stock__last_price')
+            .annotate(quantity_total=Sum('quantity'), cost_total=Sum(cost))
+            .order_by('stock__symbol'))
+
+    results = []
+    for row in rows:
+        market_value = row['stock__last_price'] * row['quantity_total']
+        results.append({
+            'symbol': row['stock__symbol'],
+            'quantity': row['quantity_total'],
+            'cost_basis': row['cost_total'].quantize(CENTS, rounding=ROUND_HALF_UP),
+            'market_value': market_value,
+            'unrealized': (market_value - row['cost_total']).quantize(CENTS, rounding=ROUND_HALF_UP),
+        })
+    return results
+
+def realized_by_stock(portfolio):
+    return [
+        {'symbol': symbol, 'realized': amount}
+        for symbol, amount in (RealizedGain.objects
+                               .filter(portfolio=portfolio)
+                               .values_list('stock__symbol', 'amount')
+                               .order_by('stock__symbol'))
+    ]
@@ -0,0 +1,30 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand, CommandError
+from portfolios.corporate_actions import apply_due_actions
+from stocks.models import Stock
+
+class Command(BaseCommand):
+    help = "Apply due splits and dividends to every holder; safe to rerun and resumes interrupted actions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbol', default=None)
+        parser.add_argument('--as-of', default=None, help="Apply actions with an ex-date up to this date (YYYY-MM-DD)")
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        stock = None
+        if options['symbol']:
+            try:
+                stock = Stock.objects.get(symbol=options['symbol'].upper())
+            except Stock.DoesNotExist:
+                raise CommandError(f"Unknown symbol {options['symbol']}")
+        as_of = datetime.date.fromisoformat(options['as_of']) if options['as_of'] else None
+
+        started = time.perf_counter()
+        applied, holders = apply_due_actions(as_of=as_of, stock=stock, chunk_size=options['chunk_size'],
+                                             log=self.stdout.write)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Applied {applied} actions to {holders} holders in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from portfolios.ledger import archive_period, cold_periods
+from portfolios.sharding import shards
+
+class Command(BaseCommand):
+    help = "Archive cold ledger periods into compressed files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', type=int, action='append',
+                            help="Period to archive as YYYYMM (repeatable)")
+        parser.add_argument('--hot-months', type=int, default=settings.LEDGER_HOT_MONTHS,
+                            help="Months kept in the database when no period is given")
+
+    def handle(self, *args, **options):
+        if shards():
+            # Archives are keyed by period alone, so one file can't cover several shards yet
+            raise CommandError("Ledger archiving is not supported with PORTFOLIO_SHARD_URLS set")
+        periods = options['period'] or cold_periods(options['hot_months'])
+        if not periods:
+            self.stdout.write("No cold ledger periods to archive")
+            return
+
+        for period in periods:
+            try:
+                archive = archive_period(period)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {archive.row_count} rows for {period} to {archive.path}"
+            ))
@@ -0,0 +1,28 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from portfolios.history import backfill_snapshots
+
+class Command(BaseCommand):
+    help = "Rebuild missing daily portfolio snapshots from the ledger and stored closes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, help="First day to fill (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Last day to fill (YYYY-MM-DD), default yesterday")
+        parser.add_argument('--portfolio', type=int, action='append',
+                            help="Portfolio id to fill (repeatable), default every portfolio")
+
+    def handle(self, *args, **options):
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        start = parse_date(options['start'])
+        end = parse_date(options['end']) if options['end'] else yesterday
+        if start is None or end is None:
+            raise CommandError("Dates must be YYYY-MM-DD")
+        end = min(end, yesterday)
+        if start > end:
+            raise CommandError("Nothing to fill: start is after end (or today)")
+
+        written = backfill_snapshots(start, end, options['portfolio'],
+                                     log=self.stdout.write if options['verbosity'] > 1 else None)
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {written} daily snapshots from {start} to {end}"))
@@ -0,0 +1,112 @@
+import random
+import time
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from portfolios.models import Portfolio, Position
+from portfolios.serializers import PortfolioDetailSerializer, PortfolioSerializer
+from portfolios.valuation import with_positions, with_valuation
+from stocks.models import Stock
+
+# The Decimal(str(x)) arithmetic the models used before the cents layer;
+# portfolios/tests.py checks the cents results against the same formulas
+def legacy_current_value(price, quantity):
+    return Decimal(str(price)) * Decimal(str(quantity))
+
+def legacy_profit_loss(price, average_buy_price, quantity):
+    return legacy_current_value(price, quantity) - Decimal(str(average_buy_price)) * Decimal(str(quantity))
+
+def legacy_profit_loss_percentage(price, average_buy_price, quantity):
+    cost_basis = Decimal(str(average_buy_price)) * Decimal(str(quantity))
+    if cost_basis == 0:
+        return Decimal('0')
+    return (legacy_profit_loss(price, average_buy_price, quantity) / cost_basis) * 100
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = "Time portfolio valuation with Decimal and integer cents arithmetic; everything is rolled back"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--positions', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def best(self, label, fn, count):
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        self.stdout.write(f"{label:<34} {best * 1000:>9.1f} ms  {count / best:>12.0f} positions/s")
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        count = options['positions']
+        rng = random.Random(0)
+        try:
+            with transaction.atomic():
+                user = User.objects.create(username='bench_valuation')
+                portfolio = Portfolio.objects.create(user=user, name='Benchmark')
+                stocks = Stock.objects.bulk_create([
+                    Stock(symbol=f"BV{i:06d}", company_name=f"Bench {i}",
+                          last_price=Decimal(rng.randint(100, 10 ** 6)).scaleb(-2))
+                    for i in range(count)
+                ])
+                Position.objects.bulk_create([
+                    Position(portfolio=portfolio, stock=stock, quantity=rng.randint(1, 5000),
+                             average_buy_price=Decimal(rng.randint(100, 10 ** 6)).scaleb(-2))
+                    for stock in stocks
+                ], batch_size=1000)
+                positions = list(Position.objects.filter(portfolio=portfolio).select_related('stock'))
+
+                def decimal_loop():
+                    for position in positions:
+                        price, average, quantity = position.stock.last_price, position.average_buy_price, position.quantity
+                        legacy_current_value(price, quantity)
+                        legacy_profit_loss(price, average, quantity)
+                        legacy_profit_loss_percentage(price, average, quantity)
+
+                def cents_loop():
+                    for position in positions:
+                        # Start cold on every run
+                        position.__dict__.pop('_valuation', None)
+                        position.current_value
+                        position.profit_loss
+                        position.profit_loss_percentage
+
+                def decimal_total():
+                    sum(legacy_current_value(position.stock.last_price, position.quantity) for position in positions)
+
+                def cents_total():
+                    for position in positions:
+                        position.__dict__.pop('_valuation', None)
+                    sum(position.current_value_cents for position in positions)
+
+                def sql_total():
+                    with_valuation(Portfolio.objects.filter(id=portfolio.id)).get().total_stock_value
+
+                def list_payload():
+                    PortfolioSerializer(with_valuation(Portfolio.objects.filter(id=portfolio.id)), many=True).data
+
+                def detail_payload_unprefetched():
+                    # One stock query per position, as the viewset did before
+                    PortfolioDetailSerializer(Portfolio.objects.get(id=portfolio.id)).data
+
+                def detail_payload():
+                    PortfolioDetailSerializer(with_positions(Portfolio.objects.filter(id=portfolio.id)).get()).data
+
+                self.stdout.write(f"{count} positions, best of {self.repeat}")
+                self.best("per-position Decimal(str())", decimal_loop, count)
+                self.best("per-position integer cents", cents_loop, count)
+                self.best("total, Decimal(str()) loop", decimal_total, count)
+                self.best("total, integer cents loop", cents_total, count)
+                self.best("total, SQL aggregate", sql_total, count)
+                self.best("portfolio list payload", list_payload, count)
+                self.best("detail payload, lazy positions", detail_payload_unprefetched, count)
+                self.best("detail payload, prefetched", detail_payload, count)
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from portfolios.history import build_checkpoints
+from portfolios.models import Portfolio
+from portfolios.sharding import shard_aliases, use_shard
+
+class Command(BaseCommand):
+    help = "Checkpoint portfolio holdings through their ledger history to bound reconstruction replays"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--portfolio', type=int, action='append',
+                            help="Portfolio id to checkpoint (repeatable), default every portfolio")
+        parser.add_argument('--every', type=int, default=settings.HISTORY_CHECKPOINT_EVERY,
+                            help="Ledger events between checkpoints")
+
+    def handle(self, *args, **options):
+        total = 0
+        for alias in shard_aliases():
+            with use_shard(alias):
+                portfolios = Portfolio.objects.order_by('id')
+                if options['portfolio']:
+                    portfolios = portfolios.filter(id__in=options['portfolio'])
+                for portfolio_id in list(portfolios.values_list('id', flat=True)):
+                    total += build_checkpoints(portfolio_id, options['every'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {total} checkpoints"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from portfolios.ledger import import_transactions
+from portfolios.sharding import for_each_shard
+
+class Command(BaseCommand):
+    help = "Copy Transaction rows into the compact partitioned ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        imported = sum(for_each_shard(import_transactions, batch_size=options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} transactions into the ledger"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from portfolios.sharding import reserve_id_range, shards, sync_reference_data
+
+class Command(BaseCommand):
+    help = "Reserve each shard's id range and copy the reference tables to it; run after migrating the shards"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shard', action='append', help="Shard alias to prepare (repeatable), default all")
+
+    def handle(self, *args, **options):
+        if not shards():
+            raise CommandError("Set PORTFOLIO_SHARD_URLS to configure shards")
+        aliases = options['shard'] or shards()
+        unknown = sorted(set(aliases) - set(shards()))
+        if unknown:
+            raise CommandError(f"Unknown shards: {', '.join(unknown)}")
+
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        for alias in aliases:
+            start = reserve_id_range(alias)
+            copied = sync_reference_data(alias, log=log)
+            self.stdout.write(self.style.SUCCESS(
+                f"{alias}: ids from {start + 1}, {copied} reference rows mirrored"
+            ))
@@ -0,0 +1,41 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.core.management.base import BaseCommand, CommandError
+from portfolios.dashboard import invalidate_user
+from portfolios.models import Portfolio
+from portfolios.sharding import misplaced_users, move_user, shards
+from risk.exposure import rebuild_exposures
+
+class Command(BaseCommand):
+    help = ("Move users whose portfolio data sits on a shard other than the one their id hashes to, "
+            "e.g. after adding shards or when first sharding data held on the default database")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would move without moving it")
+        parser.add_argument('--limit', type=int, help="Move at most this many users")
+
+    def handle(self, *args, **options):
+        if not shards():
+            raise CommandError("Set PORTFOLIO_SHARD_URLS to configure shards")
+
+        # The default database counts as a source until its portfolios are moved out
+        moves = []
+        for source in [DEFAULT_DB_ALIAS, *shards()]:
+            portfolios = Portfolio.objects.using(source).count()
+            misplaced = misplaced_users(source)
+            self.stdout.write(f"{source}: {portfolios} portfolios, {len(misplaced)} users to move")
+            moves.extend((user_id, source, target) for user_id, target in sorted(misplaced.items()))
+        if options['limit'] is not None:
+            moves = moves[:options['limit']]
+        if options['dry_run'] or not moves:
+            self.stdout.write(f"{len(moves)} users to move")
+            return
+
+        rows = 0
+        for user_id, source, target in moves:
+            rows += move_user(user_id, source, target)
+            invalidate_user(user_id)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"User {user_id}: {source} -> {target}")
+        # Exposures are aggregated per shard, so the moved holdings count on their new shard
+        rebuild_exposures()
+        self.stdout.write(self.style.SUCCESS(f"Moved {len(moves)} users ({rows} rows)"))
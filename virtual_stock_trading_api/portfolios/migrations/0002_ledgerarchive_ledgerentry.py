@@ -0,0 +1,46 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0001_initial'),
+        ('portfolios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.PositiveIntegerField(unique=True)),
+                ('path', models.CharField(max_length=500)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('portfolio_counts', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-period'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.PositiveIntegerField()),
+                ('side', models.PositiveSmallIntegerField(choices=[(1, 'Buy'), (2, 'Sell')])),
+                ('quantity', models.PositiveIntegerField()),
+                ('price_cents', models.IntegerField()),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='portfolios.portfolio')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='stocks.stock')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'portfolio', 'timestamp'], name='ledger_period_portfolio_idx'), models.Index(fields=['portfolio', 'timestamp'], name='ledger_portfolio_ts_idx')],
+            },
+        ),
+    ]
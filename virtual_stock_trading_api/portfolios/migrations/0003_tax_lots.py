@@ -0,0 +1,49 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:13
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0001_initial'),
+        ('portfolios', '0002_ledgerarchive_ledgerentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='portfolio',
+            name='cost_basis_method',
+            field=models.CharField(choices=[('FIFO', 'First in, first out'), ('LIFO', 'Last in, first out'), ('AVG', 'Average cost')], default='FIFO', max_length=4),
+        ),
+        migrations.CreateModel(
+            name='TaxLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('cost_price', models.DecimalField(decimal_places=4, max_digits=15)),
+                ('opened_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='portfolios.portfolio')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='stocks.stock')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['portfolio', 'stock', 'opened_at'], name='taxlot_position_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RealizedGain',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='realized_gains', to='portfolios.portfolio')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='realized_gains', to='stocks.stock')),
+            ],
+            options={
+                'unique_together': {('portfolio', 'stock')},
+            },
+        ),
+    ]
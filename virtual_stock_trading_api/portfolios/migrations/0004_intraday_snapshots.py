@@ -0,0 +1,54 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:16
+
+from django.db import migrations, models
+import datetime
+import django.utils.timezone
+
+
+def backfill_daily_snapshots(apps, schema_editor):
+    """
+    Existing snapshots were one per day; pin them to midnight UTC as daily points
+    """
+    PortfolioSnapshot = apps.get_model('portfolios', 'PortfolioSnapshot')
+    for snapshot in PortfolioSnapshot.objects.all().iterator():
+        snapshot.timestamp = datetime.datetime.combine(snapshot.date, datetime.time.min, tzinfo=datetime.timezone.utc)
+        snapshot.resolution = '1d'
+        snapshot.save(update_fields=['timestamp', 'resolution'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolios', '0003_tax_lots'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='portfoliosnapshot',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='portfoliosnapshot',
+            name='resolution',
+            field=models.CharField(choices=[('raw', 'Intraday'), ('1h', 'Hourly'), ('1d', 'Daily')], default='raw', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='portfoliosnapshot',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='portfoliosnapshot',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.RunPython(backfill_daily_snapshots, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='portfoliosnapshot',
+            unique_together={('portfolio', 'resolution', 'timestamp')},
+        ),
+        migrations.AddIndex(
+            model_name='portfoliosnapshot',
+            index=models.Index(fields=['resolution', 'timestamp'], name='snapshot_resolution_ts_idx'),
+        ),
+    ]
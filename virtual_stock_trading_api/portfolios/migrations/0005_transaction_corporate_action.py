@@ -0,0 +1,34 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0004_corporateaction'),
+        ('portfolios', '0004_intraday_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='cash_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='corporate_action',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transactions', to='stocks.corporateaction'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_type',
+            field=models.CharField(choices=[('BUY', 'Buy'), ('SELL', 'Sell'), ('SPLT', 'Split'), ('DIV', 'Dividend')], max_length=4),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('corporate_action__isnull', False)), fields=('corporate_action', 'portfolio'), name='transaction_one_per_action'),
+        ),
+    ]
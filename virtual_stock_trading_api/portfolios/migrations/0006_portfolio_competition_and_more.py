@@ -0,0 +1,28 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('competitions', '0001_initial'),
+        ('portfolios', '0005_transaction_corporate_action'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='portfolio',
+            name='competition',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='portfolios', to='competitions.competition'),
+        ),
+        migrations.AddIndex(
+            model_name='portfolio',
+            index=models.Index(condition=models.Q(('competition__isnull', True)), fields=['user'], name='portfolio_regular_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='portfolio',
+            constraint=models.UniqueConstraint(condition=models.Q(('competition__isnull', False)), fields=('competition', 'user'), name='portfolio_one_per_competition'),
+        ),
+    ]
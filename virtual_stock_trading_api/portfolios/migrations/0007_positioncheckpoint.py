@@ -0,0 +1,28 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolios', '0006_portfolio_competition_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PositionCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField()),
+                ('cash_balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('holdings', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='portfolios.portfolio')),
+            ],
+            options={
+                'unique_together': {('portfolio', 'as_of')},
+            },
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.10 on 2026-10-19 16:15
+
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+import gzip
+import json
+import os
+
+
+def match_sources(Transaction, alias, rows):
+    """
+    Transaction ids for (portfolio, stock, quantity, timestamp) keys of ledger
+    rows copied by earlier imports, which kept the Transaction's timestamp
+    """
+    keys = set(rows)
+    if not keys:
+        return {}
+    matches = (Transaction.objects.using(alias)
+               .filter(transaction_type__in=['BUY', 'SELL'], timestamp__in={key[3] for key in keys})
+               .order_by('id')
+               .values_list('id', 'portfolio_id', 'stock_id', 'quantity', 'timestamp'))
+    sources = {}
+    for source_id, *key in matches:
+        if tuple(key) in keys:
+            sources.setdefault(tuple(key), source_id)
+    return sources
+
+
+def backfill_import_sources(apps, schema_editor):
+    """
+    Rows imported before source ids were tracked: link hot rows to their
+    Transaction and record the newest Transaction each archive covers
+    """
+    alias = schema_editor.connection.alias
+    Transaction = apps.get_model('portfolios', 'Transaction')
+    LedgerEntry = apps.get_model('portfolios', 'LedgerEntry')
+    LedgerArchive = apps.get_model('portfolios', 'LedgerArchive')
+
+    def link(batch):
+        sources = match_sources(Transaction, alias, [tuple(row[1:]) for row in batch])
+        for entry_id, *key in batch:
+            source_id = sources.pop(tuple(key), None)
+            if source_id is not None:
+                LedgerEntry.objects.using(alias).filter(id=entry_id).update(source_transaction_id=source_id)
+
+    entries = (LedgerEntry.objects.using(alias)
+               .values_list('id', 'portfolio_id', 'stock_id', 'quantity', 'timestamp')
+               .order_by('id'))
+    batch = []
+    for row in entries.iterator(chunk_size=1000):
+        batch.append(row)
+        if len(batch) == 1000:
+            link(batch)
+            batch = []
+    link(batch)
+
+    for archive in LedgerArchive.objects.using(alias).all():
+        if not os.path.exists(archive.path):
+            continue
+        rows = []
+        with gzip.open(archive.path, 'rt', encoding='utf-8') as fh:
+            for line in fh:
+                _, portfolio_id, stock_id, _, _, quantity, _, timestamp = json.loads(line)
+                rows.append((portfolio_id, stock_id, quantity, parse_datetime(timestamp)))
+        sources = match_sources(Transaction, alias, rows)
+        if sources:
+            archive.last_source_id = max(sources.values())
+            archive.save(update_fields=['last_source_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolios', '0007_positioncheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ledgerarchive',
+            name='last_source_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='source_transaction_id',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_import_sources, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+from django.db.models import Min, Sum
+
+
+def seed_tax_lots(apps, schema_editor):
+    """
+    Positions opened before lot tracking have no lots until their next fill;
+    give their untracked shares one lot at the position's average price
+    """
+    alias = schema_editor.connection.alias
+    Position = apps.get_model('portfolios', 'Position')
+    TaxLot = apps.get_model('portfolios', 'TaxLot')
+
+    tracked = {
+        (row['portfolio_id'], row['stock_id']): row
+        for row in (TaxLot.objects.using(alias)
+                    .values('portfolio_id', 'stock_id')
+                    .annotate(quantity=Sum('quantity'), opened_at=Min('opened_at')))
+    }
+    positions = (Position.objects.using(alias)
+                 .filter(quantity__gt=0)
+                 .select_related('portfolio')
+                 .order_by('id'))
+    lots = []
+    for position in positions.iterator(chunk_size=1000):
+        lot = tracked.get((position.portfolio_id, position.stock_id))
+        untracked = position.quantity - (lot['quantity'] if lot else 0)
+        if untracked <= 0:
+            continue
+        lots.append(TaxLot(
+            portfolio_id=position.portfolio_id,
+            stock_id=position.stock_id,
+            quantity=untracked,
+            cost_price=position.average_buy_price,
+            opened_at=lot['opened_at'] if lot else position.portfolio.created_at
+        ))
+        if len(lots) == 1000:
+            TaxLot.objects.using(alias).bulk_create(lots)
+            lots = []
+    TaxLot.objects.using(alias).bulk_create(lots)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolios', '0008_ledger_import_source'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_tax_lots, migrations.RunPython.noop),
+    ]
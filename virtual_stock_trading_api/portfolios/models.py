@@ -1,22 +1,64 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from decimal import Decimal
-from stocks.models import Stock
+from stocks.models import Stock, CorporateAction
+from .money import to_cents, from_cents, amount_cents, percentage
 
 class Portfolio(models.Model):
+    FIFO = 'FIFO'
+    LIFO = 'LIFO'
+    AVERAGE = 'AVG'
+    COST_BASIS_METHODS = [
+        (FIFO, 'First in, first out'),
+        (LIFO, 'Last in, first out'),
+        (AVERAGE, 'Average cost'),
+    ]
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='portfolios')
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
     cash_balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('10000.00'))
+    cost_basis_method = models.CharField(max_length=4, choices=COST_BASIS_METHODS, default=FIFO)
+    # Set on contest portfolios; regular portfolios have none
+    competition = models.ForeignKey('competitions.Competition', on_delete=models.CASCADE, null=True, blank=True,
+                                    related_name='portfolios')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Regular and contest portfolios are indexed separately, so a contest
+        # with thousands of entrants doesn't grow the index regular lookups use
+        indexes = [
+            models.Index(fields=['user'], condition=models.Q(competition__isnull=True),
+                         name='portfolio_regular_user_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['competition', 'user'], condition=models.Q(competition__isnull=False),
+                                    name='portfolio_one_per_competition'),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.user.username})"
     
+    @property
+    def stock_value_cents(self):
+        # Set by valuation.with_valuation(); otherwise use prefetched
+        # positions or a single aggregate query
+        cents = self.__dict__.get('annotated_stock_value_cents')
+        if cents is not None:
+            return cents
+        if 'positions' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum(position.current_value_cents for position in self.positions.all())
+        value = self.positions.aggregate(
+            value=models.Sum(models.F('quantity') * models.F('stock__last_price'),
+                             output_field=models.DecimalField(max_digits=20, decimal_places=2))
+        )['value']
+        return to_cents(value) if value is not None else 0
+    
     @property
     def total_stock_value(self):
-        return sum(position.current_value for position in self.positions.all())
+        return from_cents(self.stock_value_cents)
     
     @property
     def total_value(self):
@@ -34,29 +76,50 @@ class Position(models.Model):
     def __str__(self):
         return f"{self.portfolio.name} - {self.stock.symbol} ({self.quantity})"
     
+    def _valuation_cents(self):
+        """
+        (market value, cost basis) in cents, recomputed only when an input changes
+        """
+        price = self.stock.last_price
+        key = (price, self.average_buy_price, self.quantity)
+        cached = self.__dict__.get('_valuation')
+        if cached is None or cached[0] != key:
+            cached = (key, amount_cents(price, self.quantity), amount_cents(self.average_buy_price, self.quantity))
+            self.__dict__['_valuation'] = cached
+        return cached[1], cached[2]
+    
+    @property
+    def current_value_cents(self):
+        return self._valuation_cents()[0]
+    
+    @property
+    def cost_basis_cents(self):
+        return self._valuation_cents()[1]
+    
     @property
     def current_value(self):
-        return Decimal(str(self.stock.last_price)) * Decimal(str(self.quantity))
+        return from_cents(self.current_value_cents)
     
     @property
     def profit_loss(self):
-        current_total = self.current_value
-        cost_basis = Decimal(str(self.average_buy_price)) * Decimal(str(self.quantity))
-        return current_total - cost_basis
+        value, cost_basis = self._valuation_cents()
+        return from_cents(value - cost_basis)
     
     @property
     def profit_loss_percentage(self):
-        cost_basis = Decimal(str(self.average_buy_price)) * Decimal(str(self.quantity))
-        if cost_basis == 0:
-            return Decimal('0')
-        return (self.profit_loss / cost_basis) * 100
+        value, cost_basis = self._valuation_cents()
+        return percentage(value - cost_basis, cost_basis)
 
 class Transaction(models.Model):
     BUY = 'BUY'
     SELL = 'SELL'
+    SPLIT = 'SPLT'
+    DIVIDEND = 'DIV'
     TRANSACTION_TYPES = [
         (BUY, 'Buy'),
         (SELL, 'Sell'),
+        (SPLIT, 'Split'),
+        (DIVIDEND, 'Dividend'),
     ]
     
     portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name='transactions')
@@ -65,23 +128,188 @@ class Transaction(models.Model):
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=15, decimal_places=2)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Set on the audit rows of corporate actions: the action, and the cash
+    # credited (dividend, or cash in lieu of fractional shares)
+    corporate_action = models.ForeignKey(CorporateAction, on_delete=models.PROTECT, null=True, blank=True,
+                                         related_name='transactions')
+    cash_amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            # A holder is adjusted at most once per action
+            models.UniqueConstraint(fields=['corporate_action', 'portfolio'],
+                                    condition=models.Q(corporate_action__isnull=False),
+                                    name='transaction_one_per_action'),
+        ]
+    
+    def __str__(self):
+        return f"{self.transaction_type} {self.quantity} {self.stock.symbol} at ${self.price}"
+    
+    @property
+    def total_amount(self):
+        if self.cash_amount is not None:
+            return self.cash_amount
+        return from_cents(amount_cents(self.price, self.quantity))
+
+class TaxLot(models.Model):
+    """
+    An open lot of shares bought at a single cost price
+    """
+    portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name='lots')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='lots')
+    quantity = models.PositiveIntegerField()
+    cost_price = models.DecimalField(max_digits=15, decimal_places=4)
+    opened_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['portfolio', 'stock', 'opened_at'], name='taxlot_position_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.portfolio.name} - {self.stock.symbol} lot ({self.quantity} @ {self.cost_price})"
+    
+    @property
+    def cost_basis(self):
+        return self.cost_price * self.quantity
+
+class RealizedGain(models.Model):
+    """
+    Running realized profit/loss per portfolio and stock
+    """
+    portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name='realized_gains')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='realized_gains')
+    amount = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('portfolio', 'stock')
+    
+    def __str__(self):
+        return f"{self.portfolio.name} - {self.stock.symbol} realized {self.amount}"
+
+def ledger_period(timestamp):
+    """
+    Monthly partition key (YYYYMM) for a ledger timestamp
+    """
+    return timestamp.year * 100 + timestamp.month
+
+class LedgerEntry(models.Model):
+    """
+    Compact, month-partitioned storage for the transaction ledger.
+    Reads expose the same attributes as Transaction so serializers
+    and the admin can use either interchangeably.
+    """
+    SIDE_BUY = 1
+    SIDE_SELL = 2
+    SIDES = [
+        (SIDE_BUY, 'Buy'),
+        (SIDE_SELL, 'Sell'),
+    ]
+    SIDE_CODES = {
+        Transaction.BUY: SIDE_BUY,
+        Transaction.SELL: SIDE_SELL,
+    }
+    SIDE_NAMES = {code: name for name, code in SIDE_CODES.items()}
+    
+    portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name='ledger_entries')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='ledger_entries')
+    period = models.PositiveIntegerField()
+    side = models.PositiveSmallIntegerField(choices=SIDES)
+    quantity = models.PositiveIntegerField()
+    price_cents = models.IntegerField()
+    timestamp = models.DateTimeField(default=timezone.now)
+    # Transaction the row was imported from; empty for trades written to the ledger directly
+    source_transaction_id = models.BigIntegerField(null=True, blank=True, unique=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['period', 'portfolio', 'timestamp'], name='ledger_period_portfolio_idx'),
+            models.Index(fields=['portfolio', 'timestamp'], name='ledger_portfolio_ts_idx'),
+        ]
     
     def __str__(self):
         return f"{self.transaction_type} {self.quantity} {self.stock.symbol} at ${self.price}"
     
+    def save(self, *args, **kwargs):
+        self.period = ledger_period(self.timestamp)
+        super().save(*args, **kwargs)
+    
+    @property
+    def transaction_type(self):
+        return self.SIDE_NAMES[self.side]
+    
+    @property
+    def price(self):
+        return from_cents(self.price_cents)
+    
     @property
     def total_amount(self):
-        return Decimal(str(self.price)) * Decimal(str(self.quantity))
+        return from_cents(self.price_cents * self.quantity)
+
+class LedgerArchive(models.Model):
+    """
+    A cold ledger period moved out of the database into a compressed file
+    """
+    period = models.PositiveIntegerField(unique=True)
+    path = models.CharField(max_length=500)
+    row_count = models.PositiveIntegerField(default=0)
+    portfolio_counts = models.JSONField(default=dict)
+    # Highest Transaction id among the archived rows, so imports don't repeat them
+    last_source_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-period']
+    
+    def __str__(self):
+        return f"Ledger archive {self.period} ({self.row_count} rows)"
 
 class PortfolioSnapshot(models.Model):
+    RAW = 'raw'
+    HOURLY = '1h'
+    DAILY = '1d'
+    RESOLUTIONS = [
+        (RAW, 'Intraday'),
+        (HOURLY, 'Hourly'),
+        (DAILY, 'Daily'),
+    ]
+    
     portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name='snapshots')
-    date = models.DateField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+    date = models.DateField()
+    resolution = models.CharField(max_length=3, choices=RESOLUTIONS, default=RAW)
     cash_balance = models.DecimalField(max_digits=15, decimal_places=2)
     stock_value = models.DecimalField(max_digits=15, decimal_places=2)
     total_value = models.DecimalField(max_digits=15, decimal_places=2)
     
     class Meta:
-        unique_together = ('portfolio', 'date')
+        unique_together = ('portfolio', 'resolution', 'timestamp')
+        indexes = [
+            models.Index(fields=['resolution', 'timestamp'], name='snapshot_resolution_ts_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.portfolio.name} snapshot at {self.timestamp}"
+    
+    def save(self, *args, **kwargs):
+        self.date = self.timestamp.date()
+        super().save(*args, **kwargs)
+
+class PositionCheckpoint(models.Model):
+    """
+    Holdings and cash of a portfolio at one moment. Past states are rebuilt
+    by replaying the ledger from the nearest checkpoint.
+    """
+    portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name='checkpoints')
+    as_of = models.DateTimeField()
+    cash_balance = models.DecimalField(max_digits=15, decimal_places=2)
+    # {stock id: quantity} for every open position
+    holdings = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('portfolio', 'as_of')
     
     def __str__(self):
-        return f"{self.portfolio.name} snapshot on {self.date}"
+        return f"{self.portfolio.name} checkpoint at {self.as_of}"
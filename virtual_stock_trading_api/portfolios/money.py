@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+# Fixed-point money
+#
+# Amounts are carried as integer cents. Prices and balances are stored with
+# two decimal places, so converting them is exact; anything finer (lot cost
+# prices, computed averages) is rounded half up to the cent on the way in.
+# Products of a cent price and a whole share quantity are exact integers, and
+# Decimal is only built again when a value leaves the layer.
+
+def to_cents(amount):
+    """
+    Convert an amount to integer cents, rounding half up
+    """
+    if isinstance(amount, int):
+        return amount * 100
+    if not isinstance(amount, Decimal):
+        # str() keeps floats at their shortest repr instead of the binary expansion
+        amount = Decimal(str(amount))
+    numerator, denominator = amount.as_integer_ratio()
+    if 100 % denominator == 0:
+        # Two decimal places or fewer: exact
+        return numerator * (100 // denominator)
+    cents, remainder = divmod(abs(numerator) * 100, denominator)
+    if remainder * 2 >= denominator:
+        cents += 1
+    return cents if numerator >= 0 else -cents
+
+def from_cents(cents):
+    """
+    Decimal with two places for an integer number of cents
+    """
+    return Decimal(cents).scaleb(-2)
+
+def amount_cents(price, quantity):
+    """
+    Cents for `quantity` units at `price`
+    """
+    return to_cents(price) * quantity
+
+def percentage(part_cents, whole_cents):
+    """
+    part / whole as a percentage; 0 when whole is 0
+    """
+    if not whole_cents:
+        return Decimal('0')
+    return Decimal(part_cents * 100) / whole_cents
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Portfolio, Position, Transaction, PortfolioSnapshot
+from .models import Portfolio, Position, Transaction, PortfolioSnapshot, TaxLot
 from stocks.serializers import StockSerializer
 
 class PositionSerializer(serializers.ModelSerializer):
@@ -29,11 +29,19 @@ class TransactionSerializer(serializers.ModelSerializer):
                   'quantity', 'price', 'timestamp', 'total_amount']
         read_only_fields = ['id', 'timestamp', 'total_amount']
 
+class TaxLotSerializer(serializers.ModelSerializer):
+    stock_symbol = serializers.CharField(source='stock.symbol', read_only=True)
+    
+    class Meta:
+        model = TaxLot
+        fields = ['id', 'stock_symbol', 'quantity', 'cost_price', 'opened_at']
+        read_only_fields = fields
+
 class PortfolioSnapshotSerializer(serializers.ModelSerializer):
     class Meta:
         model = PortfolioSnapshot
-        fields = ['id', 'date', 'cash_balance', 'stock_value', 'total_value']
-        read_only_fields = ['id', 'date']
+        fields = ['id', 'date', 'timestamp', 'resolution', 'cash_balance', 'stock_value', 'total_value']
+        read_only_fields = ['id', 'date', 'timestamp', 'resolution']
 
 class PortfolioSerializer(serializers.ModelSerializer):
     positions_count = serializers.SerializerMethodField()
@@ -42,12 +50,29 @@ class PortfolioSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Portfolio
-        fields = ['id', 'name', 'description', 'cash_balance', 
-                  'positions_count', 'total_stock_value', 'total_value', 
+        fields = ['id', 'name', 'description', 'cash_balance', 'cost_basis_method',
+                  'competition', 'positions_count', 'total_stock_value', 'total_value', 
                   'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'competition', 'created_at', 'updated_at']
+    
+    def validate_cash_balance(self, value):
+        # Contest balances are set by the competition, not by the entrant
+        if self.instance is not None and self.instance.competition_id and value != self.instance.cash_balance:
+            raise serializers.ValidationError("The cash balance of a competition portfolio cannot be changed")
+        return value
+    
+    def validate_cost_basis_method(self, value):
+        # Open lots were matched under the current method; switching would mix the two
+        if self.instance is not None and value != self.instance.cost_basis_method and self.instance.lots.exists():
+            raise serializers.ValidationError("The cost basis method cannot be changed once the portfolio has tax lots")
+        return value
     
     def get_positions_count(self, obj):
+        count = getattr(obj, 'annotated_positions_count', None)
+        if count is not None:
+            return count
+        if 'positions' in getattr(obj, '_prefetched_objects_cache', {}):
+            return len(obj.positions.all())
         return obj.positions.count()
 
 class PortfolioDetailSerializer(PortfolioSerializer):
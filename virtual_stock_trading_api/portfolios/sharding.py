@@ -0,0 +1,312 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+# Sharding portfolio data by user
+#
+# With PORTFOLIO_SHARD_URLS set, every portfolio of a user, and everything
+# hanging off it (positions, lots, gains, the ledger, snapshots,
+# checkpoints and trade outbox events), lives on one shard database, so a
+# trade commits on a single database. The risk exposures it updates are kept
+# per shard as well, each shard aggregating its own holders, and reports add
+# the shards up. The shard is picked by a jump
+# consistent hash of the user id. Growing the shard count moves only the
+# users whose hash changed; `manage.py rebalance_shards` copies them over.
+#
+# Sharded queries are routed to the shard that is active in the current
+# context: views enter their user's shard once the request is
+# authenticated (ShardedViewMixin) and jobs that cover every user run once
+# per shard (for_each_shard). Rows loaded from a shard write back to it.
+#
+# Portfolio queries join users, stocks, corporate actions and competitions,
+# so those reference tables are mirrored to every shard: written on the
+# default database and copied on save (see signals), in bulk after bulk
+# inserts, and in full by `manage.py prepare_shards`. Each shard hands out
+# ids from its own SHARD_ID_SPAN range, so ids stay unique across shards
+# and survive a move. Without shards everything stays on the default
+# database and none of this applies.
+
+SHARDED_MODELS = [
+    # Parents first; moves copy in this order and delete in reverse
+    'portfolios.Portfolio',
+    'portfolios.Position',
+    'portfolios.Transaction',
+    'portfolios.TaxLot',
+    'portfolios.RealizedGain',
+    'portfolios.LedgerEntry',
+    'portfolios.PortfolioSnapshot',
+    'portfolios.PositionCheckpoint',
+    # Trade events commit with the trade; the relay drains every shard
+    'trading.OutboxEvent',
+]
+# Per-shard aggregates: routed like the sharded models, but not tied to a
+# user, so moves leave them alone (rebuild them afterwards)
+SHARD_LOCAL_MODELS = [
+    'risk.SymbolExposure',
+]
+REFERENCE_MODELS = [
+    'auth.User',
+    'stocks.Stock',
+    'stocks.CorporateAction',
+    'competitions.Competition',
+]
+MIRROR_BATCH = 1000
+
+_active = ContextVar('portfolio_shard', default=None)
+
+def shards():
+    return settings.PORTFOLIO_SHARDS
+
+def shard_aliases():
+    """
+    Databases holding portfolio data: the shards, or just the default database
+    """
+    return list(shards()) or [DEFAULT_DB_ALIAS]
+
+def jump_hash(key, buckets):
+    """
+    Jump consistent hash (Lamping & Veach): growing from n to n + 1 buckets
+    moves only 1 / (n + 1) of the keys
+    """
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+def shard_for_user(user):
+    aliases = shards()
+    if not aliases:
+        return DEFAULT_DB_ALIAS
+    return aliases[jump_hash(int(getattr(user, 'pk', user)), len(aliases))]
+
+def users_by_shard(user_ids):
+    """
+    {alias: [user ids]} for a batch of users
+    """
+    grouped = defaultdict(list)
+    for user_id in user_ids:
+        grouped[shard_for_user(user_id)].append(user_id)
+    return grouped
+
+def active_shard():
+    return _active.get()
+
+def current_database():
+    """
+    Alias sharded queries run against right now; pass it to transaction.atomic()
+    """
+    return _active.get() or DEFAULT_DB_ALIAS
+
+@contextmanager
+def use_shard(alias):
+    token = _active.set(alias)
+    try:
+        yield alias
+    finally:
+        _active.reset(token)
+
+def for_each_shard(function, *args, **kwargs):
+    """
+    Run `function` once per shard with that shard active; returns the results
+    """
+    results = []
+    for alias in shard_aliases():
+        with use_shard(alias):
+            results.append(function(*args, **kwargs))
+    return results
+
+def find_portfolio(portfolio_id):
+    """
+    Look a portfolio up by id alone, on whichever shard holds it
+    """
+    Portfolio = apps.get_model('portfolios.Portfolio')
+    for alias in shard_aliases():
+        portfolio = Portfolio.objects.using(alias).filter(id=portfolio_id).first()
+        if portfolio is not None:
+            return portfolio
+    return None
+
+def _instance_shard(instance):
+    label = instance._meta.label
+    if (label in SHARDED_MODELS or label in SHARD_LOCAL_MODELS) and instance._state.db:
+        return instance._state.db
+    if label == 'auth.User' and instance.pk is not None:
+        return shard_for_user(instance.pk)
+    if label == 'portfolios.Portfolio' and instance.user_id is not None:
+        return shard_for_user(instance.user_id)
+    portfolio = instance._state.fields_cache.get('portfolio')
+    if portfolio is not None:
+        return _instance_shard(portfolio)
+    return None
+
+class ShardRouter:
+    """
+    Route sharded models to the shard of the instance involved, or else the
+    active shard; reference models are always written to the default database
+    """
+    def _route(self, model, hints):
+        if not shards():
+            return None
+        if model._meta.label in REFERENCE_MODELS:
+            return DEFAULT_DB_ALIAS
+        if model._meta.label not in SHARDED_MODELS and model._meta.label not in SHARD_LOCAL_MODELS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None:
+            alias = _instance_shard(instance)
+            if alias is not None:
+                return alias
+        return _active.get()
+
+    def db_for_read(self, model, **hints):
+        if shards() and model._meta.label in REFERENCE_MODELS:
+            # Mirrors on the shard serve reads made through a sharded row
+            return None
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Sharded rows point at the reference mirrors on their own shard
+        return True if shards() else None
+
+class ShardedViewMixin:
+    """
+    Serve the request from the authenticated user's shard
+    """
+    def dispatch(self, request, *args, **kwargs):
+        with use_shard(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            _active.set(shard_for_user(request.user.pk))
+
+def sharded_models():
+    return [apps.get_model(label) for label in SHARDED_MODELS]
+
+def reference_models():
+    return [apps.get_model(label) for label in REFERENCE_MODELS]
+
+def _copies(model, instances):
+    fields = model._meta.concrete_fields
+    return [model(**{field.attname: getattr(instance, field.attname) for field in fields})
+            for instance in instances]
+
+def mirror(model, instances, aliases=None):
+    """
+    Upsert reference rows from the default database into every shard
+    """
+    aliases = shards() if aliases is None else aliases
+    if not aliases:
+        return 0
+    instances = list(instances)
+    if not instances:
+        return 0
+    update_fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+    for alias in aliases:
+        # Copies, so the caller's instances keep pointing at the default database
+        model.objects.using(alias).bulk_create(
+            _copies(model, instances), batch_size=MIRROR_BATCH, update_conflicts=True,
+            unique_fields=[model._meta.pk.name], update_fields=update_fields
+        )
+    return len(instances)
+
+def unmirror(model, pks):
+    """
+    Delete reference rows from every shard, cascading to the sharded rows
+    that point at them as the default database would
+    """
+    for alias in shards():
+        model.objects.using(alias).filter(pk__in=pks).delete()
+
+def sync_reference_data(alias, log=None):
+    """
+    Copy every reference table to a shard. Returns rows copied.
+    """
+    total = 0
+    for model in reference_models():
+        rows = model.objects.using(DEFAULT_DB_ALIAS).order_by('pk')
+        batch = []
+        for instance in rows.iterator(chunk_size=MIRROR_BATCH):
+            batch.append(instance)
+            if len(batch) == MIRROR_BATCH:
+                total += mirror(model, batch, [alias])
+                batch = []
+        total += mirror(model, batch, [alias])
+        if log:
+            log(f"{alias}: {model._meta.label} mirrored")
+    return total
+
+def reserve_id_range(alias):
+    """
+    Start the sharded tables' id sequences at this shard's range:
+    (index + 1) * SHARD_ID_SPAN, leaving the first range to the default database
+    """
+    start = (list(shards()).index(alias) + 1) * settings.SHARD_ID_SPAN
+    connection = connections[alias]
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        for model in sharded_models():
+            table = model._meta.db_table
+            if connection.vendor == 'sqlite':
+                cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s", [start, table])
+                if not cursor.rowcount:
+                    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, start])
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    f"GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {connection.ops.quote_name(table)})))",
+                    [table, start]
+                )
+            else:
+                raise ValueError(f"Cannot reserve id ranges on {connection.vendor}")
+    return start
+
+def misplaced_users(alias):
+    """
+    {user id: target shard} for users with portfolios on `alias` that hash elsewhere
+    """
+    Portfolio = apps.get_model('portfolios.Portfolio')
+    user_ids = Portfolio.objects.using(alias).values_list('user_id', flat=True).distinct()
+    placements = {user_id: shard_for_user(user_id) for user_id in user_ids}
+    return {user_id: target for user_id, target in placements.items() if target != alias}
+
+def move_user(user_id, source, target):
+    """
+    Copy a user's portfolio data from `source` to `target`, keeping ids,
+    then delete it from `source`. Returns rows moved.
+    """
+    models = sharded_models()
+    portfolio_ids = list(models[0].objects.using(source).filter(user_id=user_id).values_list('id', flat=True))
+
+    def rows(model, alias):
+        if model is models[0]:
+            return model.objects.using(alias).filter(user_id=user_id)
+        return model.objects.using(alias).filter(portfolio_id__in=portfolio_ids)
+
+    moved = 0
+    # The target commits first: a failure in between leaves a copy on both
+    # shards, and rerunning the move skips the rows already copied
+    with transaction.atomic(using=source), transaction.atomic(using=target):
+        for model in models:
+            batch = []
+            for instance in rows(model, source).order_by('pk').iterator(chunk_size=MIRROR_BATCH):
+                batch.append(instance)
+                if len(batch) == MIRROR_BATCH:
+                    model.objects.using(target).bulk_create(batch, ignore_conflicts=True)
+                    moved += len(batch)
+                    batch = []
+            model.objects.using(target).bulk_create(batch, ignore_conflicts=True)
+            moved += len(batch)
+        for model in reversed(models):
+            # A raw delete fires no signals: the rows still exist on the target
+            rows(model, source)._raw_delete(source)
+    return moved
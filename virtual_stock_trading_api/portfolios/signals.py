@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from competitions.models import Competition
+from stocks.models import Stock, CorporateAction
+from stocks.signals import prices_updated
+from .models import Portfolio, Position, Transaction, LedgerEntry, PortfolioSnapshot
+from .dashboard import invalidate_user
+from .sharding import mirror, shards, unmirror
+
+# Drop the owner's cached dashboard whenever their portfolio data changes
+
+@receiver([post_save, post_delete], sender=Portfolio)
+def invalidate_portfolio_dashboard(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+@receiver([post_save, post_delete], sender=Position)
+@receiver([post_save, post_delete], sender=Transaction)
+@receiver([post_save, post_delete], sender=LedgerEntry)
+@receiver([post_save, post_delete], sender=PortfolioSnapshot)
+def invalidate_trade_dashboard(sender, instance, **kwargs):
+    if sender.portfolio.is_cached(instance):
+        user_id = instance.portfolio.user_id
+    else:
+        user_id = (Portfolio.objects.using(instance._state.db)
+                   .filter(id=instance.portfolio_id).values_list('user_id', flat=True).first())
+    if user_id is not None:
+        invalidate_user(user_id)
+
+# Keep the reference table mirrors on every shard in step with the default database
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Stock)
+@receiver(post_save, sender=CorporateAction)
+@receiver(post_save, sender=Competition)
+def mirror_saved_reference(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS and shards():
+        mirror(sender, [instance])
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Stock)
+@receiver(post_delete, sender=CorporateAction)
+@receiver(post_delete, sender=Competition)
+def unmirror_deleted_reference(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS and shards():
+        unmirror(sender, [instance.pk])
+
+@receiver(prices_updated, sender=Stock)
+def mirror_refreshed_prices(sender, prices, **kwargs):
+    if shards():
+        mirror(Stock, Stock.objects.filter(id__in=list(prices)))
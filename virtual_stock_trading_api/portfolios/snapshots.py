@@ -0,0 +1,184 @@
+import datetime
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum, DecimalField, ExpressionWrapper
+from django.utils import timezone
+from .models import Portfolio, Position, PortfolioSnapshot
+from .dashboard import invalidate_all as invalidate_dashboards
+from .sharding import current_database, for_each_shard
+
+# Portfolio snapshots
+#
+# Intraday points are captured for every portfolio on a fixed interval and
+# rolled up as they age: raw -> hourly -> daily. A rollup keeps the last
+# point of each bucket, so the series stays a true end-of-period valuation.
+
+def truncate(timestamp, resolution):
+    """
+    Start of the bucket a timestamp falls in
+    """
+    if resolution == PortfolioSnapshot.HOURLY:
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if resolution == PortfolioSnapshot.DAILY:
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    interval = settings.SNAPSHOT_INTERVAL_MINUTES
+    return timestamp.replace(minute=timestamp.minute - timestamp.minute % interval,
+                             second=0, microsecond=0)
+
+def stock_values(portfolio_ids=None, id_range=None):
+    """
+    Market value of every portfolio's positions in one aggregate query,
+    optionally limited to some ids or an inclusive (first, last) id range
+    """
+    value = ExpressionWrapper(F('quantity') * F('stock__last_price'),
+                              output_field=DecimalField(max_digits=20, decimal_places=2))
+    positions = Position.objects.all()
+    if portfolio_ids is not None:
+        positions = positions.filter(portfolio_id__in=portfolio_ids)
+    if id_range is not None:
+        positions = positions.filter(portfolio_id__gte=id_range[0], portfolio_id__lte=id_range[1])
+    return dict(positions
+                .values('portfolio_id')
+                .annotate(value=Sum(value))
+                .values_list('portfolio_id', 'value'))
+
+def build_snapshot(portfolio_id, cash_balance, stock_value, timestamp, resolution=PortfolioSnapshot.RAW):
+    stock_value = (stock_value or Decimal('0')).quantize(Decimal('0.01'))
+    return PortfolioSnapshot(
+        portfolio_id=portfolio_id,
+        timestamp=timestamp,
+        date=timestamp.date(),
+        resolution=resolution,
+        cash_balance=cash_balance,
+        stock_value=stock_value,
+        total_value=cash_balance + stock_value
+    )
+
+def capture_portfolio_snapshot(portfolio):
+    """
+    Snapshot a single portfolio right now
+    """
+    snapshot = build_snapshot(
+        portfolio.id,
+        portfolio.cash_balance,
+        stock_values([portfolio.id]).get(portfolio.id),
+        timezone.now()
+    )
+    snapshot.save()
+    return snapshot
+
+def portfolio_id_ranges(batch_size):
+    """
+    Inclusive (first id, last id) ranges of at most batch_size portfolios
+    """
+    ids = Portfolio.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=10000)
+    first = last = None
+    count = 0
+    for portfolio_id in ids:
+        if first is None:
+            first = portfolio_id
+        last = portfolio_id
+        count += 1
+        if count == batch_size:
+            yield first, last
+            first, count = None, 0
+    if first is not None:
+        yield first, last
+
+def capture_snapshot_range(first_id, last_id, timestamp):
+    """
+    Snapshot the portfolios with ids in [first_id, last_id] at `timestamp`:
+    one aggregate query and one bulk insert. Existing points are kept, so a
+    retried range is a no-op.
+    """
+    values = stock_values(id_range=(first_id, last_id))
+    snapshots = [
+        build_snapshot(portfolio_id, cash_balance, values.get(portfolio_id), timestamp)
+        for portfolio_id, cash_balance in (Portfolio.objects
+                                           .filter(id__range=(first_id, last_id))
+                                           .values_list('id', 'cash_balance'))
+    ]
+    PortfolioSnapshot.objects.bulk_create(snapshots, batch_size=1000, ignore_conflicts=True)
+    return len(snapshots)
+
+def capture_snapshots(batch_size=1000):
+    """
+    Snapshot every portfolio at the current interval boundary, in this
+    process. Re-running within the same interval is a no-op.
+    """
+    timestamp = truncate(timezone.now(), PortfolioSnapshot.RAW)
+    created = sum(for_each_shard(lambda: sum(capture_snapshot_range(first_id, last_id, timestamp)
+                                             for first_id, last_id in portfolio_id_ranges(batch_size))))
+    # bulk_create skips post_save, so drop every cached dashboard at once
+    invalidate_dashboards()
+    return created
+
+def rollup(source, target, older_than, batch_size=1000):
+    """
+    Replace source-resolution points older than the cutoff with one
+    target-resolution point per portfolio and bucket
+    """
+    # Only roll up whole buckets so a later run never splits one
+    cutoff = truncate(timezone.now() - older_than, target)
+    points = (PortfolioSnapshot.objects
+              .filter(resolution=source, timestamp__lt=cutoff)
+              .order_by('portfolio_id', 'timestamp'))
+
+    latest = {}
+    for point in points.iterator(chunk_size=batch_size):
+        latest[(point.portfolio_id, truncate(point.timestamp, target))] = point
+
+    rolled = [
+        build_snapshot(point.portfolio_id, point.cash_balance, point.stock_value, bucket, target)
+        for (_, bucket), point in latest.items()
+    ]
+    with transaction.atomic(using=current_database()):
+        PortfolioSnapshot.objects.bulk_create(rolled, batch_size=batch_size, ignore_conflicts=True)
+        PortfolioSnapshot.objects.filter(resolution=source, timestamp__lt=cutoff).delete()
+    if rolled:
+        invalidate_dashboards()
+    return len(rolled)
+
+def downsample_snapshots():
+    """
+    Apply the retention policy on every shard: raw -> hourly -> daily
+    """
+    hourly = sum(for_each_shard(rollup, PortfolioSnapshot.RAW, PortfolioSnapshot.HOURLY,
+                                datetime.timedelta(hours=settings.SNAPSHOT_RAW_RETENTION_HOURS)))
+    daily = sum(for_each_shard(rollup, PortfolioSnapshot.HOURLY, PortfolioSnapshot.DAILY,
+                               datetime.timedelta(days=settings.SNAPSHOT_HOURLY_RETENTION_DAYS)))
+    return hourly, daily
+
+def resolution_for_range(start, end):
+    """
+    Coarsest resolution that still gives a useful number of points for the range
+    """
+    span = end - start
+    if span <= datetime.timedelta(hours=settings.SNAPSHOT_RAW_RETENTION_HOURS):
+        return PortfolioSnapshot.RAW
+    if span <= datetime.timedelta(days=settings.SNAPSHOT_HOURLY_RETENTION_DAYS):
+        return PortfolioSnapshot.HOURLY
+    return PortfolioSnapshot.DAILY
+
+def snapshot_series(portfolio, start=None, end=None, resolution=None):
+    """
+    Newest-first points for a range at one resolution. Points stored at a
+    finer resolution (recent data not yet rolled up) are bucketed on the fly.
+    """
+    points = PortfolioSnapshot.objects.filter(portfolio=portfolio)
+    if start:
+        points = points.filter(timestamp__gte=start)
+    if end:
+        points = points.filter(timestamp__lte=end)
+    if resolution is None:
+        first = start or points.order_by('timestamp').values_list('timestamp', flat=True).first()
+        resolution = resolution_for_range(first, end or timezone.now()) if first else PortfolioSnapshot.DAILY
+
+    if resolution == PortfolioSnapshot.RAW:
+        return resolution, list(points.order_by('-timestamp'))
+
+    latest = {}
+    for point in points.order_by('timestamp'):
+        latest[truncate(point.timestamp, resolution)] = point
+    return resolution, [latest[bucket] for bucket in sorted(latest, reverse=True)]
@@ -1,37 +1,107 @@
-from celery import shared_task
-from django.db import transaction
-from .models import Portfolio, PortfolioSnapshot
+import datetime
+import logging
+from celery import group, shared_task
+from django.conf import settings
+from django.db import OperationalError
+from django.utils import timezone
+from virtual_stock_trading_api.celery import app  # noqa: F401 (binds shared_task to the project app)
+from .dashboard import invalidate_all as invalidate_dashboards
+from .models import PortfolioSnapshot
+from .snapshots import (capture_portfolio_snapshot, capture_snapshot_range, downsample_snapshots,
+                        portfolio_id_ranges, truncate)
+from .corporate_actions import apply_due_actions
+from .history import checkpoint_portfolios
+from .sharding import find_portfolio, shard_aliases, use_shard
+
+logger = logging.getLogger(__name__)
+
+def fan_out_snapshots():
+    """
+    Split a snapshot of every portfolio into one task per SNAPSHOT_FANOUT_BATCH
+    portfolios of a shard, so the sweep spreads over every worker on the
+    snapshots queue
+    """
+    timestamp = truncate(timezone.now(), PortfolioSnapshot.RAW).isoformat()
+    batches = []
+    for alias in shard_aliases():
+        with use_shard(alias):
+            batches.extend(capture_snapshot_batch.s(first_id, last_id, timestamp, alias)
+                           for first_id, last_id in portfolio_id_ranges(settings.SNAPSHOT_FANOUT_BATCH))
+    if batches:
+        group(batches).apply_async()
+    return {'timestamp': timestamp, 'batches': len(batches)}
+
+@shared_task(acks_late=True, autoretry_for=(OperationalError,), retry_backoff=True, max_retries=3)
+def capture_snapshot_batch(first_id, last_id, timestamp, shard=None):
+    """
+    Snapshot one id range of portfolios on a shard; safe to run twice
+    """
+    with use_shard(shard):
+        created = capture_snapshot_range(first_id, last_id, datetime.datetime.fromisoformat(timestamp))
+    # bulk_create skips post_save, so drop every cached dashboard at once
+    invalidate_dashboards()
+    return {'first_id': first_id, 'last_id': last_id, 'created': created}
 
 @shared_task
 def create_daily_portfolio_snapshots():
     """
-    Create snapshots for all portfolios
+    End-of-day snapshot of every portfolio, fanned out in batches
+    """
+    return fan_out_snapshots()
+
+@shared_task
+def capture_intraday_snapshots():
+    """
+    Scheduled intraday snapshot of every portfolio, fanned out in batches
     """
-    portfolios = Portfolio.objects.all()
-    for portfolio in portfolios:
-        create_portfolio_snapshot(portfolio.id)
-    return f"Created snapshots for {len(portfolios)} portfolios"
+    return fan_out_snapshots()
 
 @shared_task
+def downsample_portfolio_snapshots():
+    """
+    Roll aged intraday points into hourly and then daily points
+    """
+    hourly, daily = downsample_snapshots()
+    return {'hourly': hourly, 'daily': daily}
+
+@shared_task(acks_late=True, autoretry_for=(OperationalError,), retry_backoff=True, max_retries=3)
+def checkpoint_positions():
+    """
+    Checkpoint every portfolio's holdings, so reconstructing a past state
+    replays at most a day of ledger events
+    """
+    return {'checkpoints': checkpoint_portfolios()}
+
+@shared_task
+def apply_corporate_actions():
+    """
+    Ingest the corporate action feed, if there is one, and apply everything
+    that has gone ex
+    """
+    from stocks.corporate_actions import build_provider, ingest
+    provider = build_provider()
+    ingested = 0
+    if provider.available():
+        ingested, _ = ingest(provider)
+    else:
+        # No feed dropped yet; events ingested by hand are still applied
+        logger.info("No corporate action feed at %s; skipping ingestion", provider.path)
+    applied, holders = apply_due_actions()
+    return {'ingested': ingested, 'applied': applied, 'holders': holders}
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=3)
 def create_portfolio_snapshot(portfolio_id):
     """
     Create a snapshot for a specific portfolio
     """
-    try:
-        portfolio = Portfolio.objects.get(id=portfolio_id)
-        stock_value = portfolio.total_stock_value
-        total_value = portfolio.total_value
-        
-        with transaction.atomic():
-            PortfolioSnapshot.objects.create(
-                portfolio=portfolio,
-                cash_balance=portfolio.cash_balance,
-                stock_value=stock_value,
-                total_value=total_value
-            )
-        
-        return f"Created snapshot for portfolio {portfolio.name}"
-    except Portfolio.DoesNotExist:
-        return f"Portfolio with ID {portfolio_id} not found"
-    except Exception as e:
-        return f"Error creating snapshot: {str(e)}"
\ No newline at end of file
+    portfolio = find_portfolio(portfolio_id)
+    if portfolio is None:
+        return {'portfolio_id': portfolio_id, 'created': False}
+    with use_shard(portfolio._state.db):
+        snapshot = capture_portfolio_snapshot(portfolio)
+    return {
+        'portfolio_id': portfolio_id,
+        'created': True,
+        'snapshot_id': snapshot.id,
+        'total_value': str(snapshot.total_value),
+    }
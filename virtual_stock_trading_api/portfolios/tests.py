@@ -1,3 +1,671 @@
-from django.test import TestCase
+import datetime
+import os
+import random
+import tempfile
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from risk.models import SymbolExposure
+from stocks.corporate_actions import FileProvider, ingest, parse_event
+from stocks.models import CorporateAction, Stock
+from trading import execution
+from trading.models import OutboxEvent
+from .corporate_actions import apply_action, apply_chunk, apply_due_actions
+from .dashboard import build_dashboard
+from .ledger import LedgerReader, archive_period, import_transactions, recent_transactions, record_transaction
+from .lots import apply_buy, apply_sell
+from .models import (LedgerArchive, LedgerEntry, Portfolio, PortfolioSnapshot, Position, TaxLot, Transaction,
+                     ledger_period)
+from .money import to_cents, from_cents, amount_cents, percentage
+from .sharding import jump_hash, move_user, reserve_id_range, shard_for_user, use_shard
+from .snapshots import (build_snapshot, capture_snapshots, downsample_snapshots, resolution_for_range,
+                        snapshot_series, truncate)
+from .tasks import apply_corporate_actions
+from .valuation import with_valuation
 
-# Create your tests here.
+# The Decimal(str(x)) arithmetic the models used before the cents layer
+def legacy_current_value(price, quantity):
+    return Decimal(str(price)) * Decimal(str(quantity))
+
+def legacy_profit_loss(price, average_buy_price, quantity):
+    return legacy_current_value(price, quantity) - Decimal(str(average_buy_price)) * Decimal(str(quantity))
+
+def legacy_profit_loss_percentage(price, average_buy_price, quantity):
+    cost_basis = Decimal(str(average_buy_price)) * Decimal(str(quantity))
+    if cost_basis == 0:
+        return Decimal('0')
+    return (legacy_profit_loss(price, average_buy_price, quantity) / cost_basis) * 100
+
+def as_served(value):
+    # What the API returns: two places, as the serializers' DecimalField renders it
+    return Decimal(value).quantize(Decimal('0.01'))
+
+class MoneyTests(SimpleTestCase):
+    def test_to_cents_is_exact_for_two_places(self):
+        self.assertEqual(to_cents(Decimal('123.45')), 12345)
+        self.assertEqual(to_cents(Decimal('-0.01')), -1)
+        self.assertEqual(to_cents(Decimal('0')), 0)
+        self.assertEqual(to_cents(7), 700)
+        self.assertEqual(to_cents(0.1), 10)
+        self.assertEqual(to_cents('19.9'), 1990)
+
+    def test_to_cents_rounds_half_cents_up(self):
+        self.assertEqual(to_cents(Decimal('0.005')), 1)
+        self.assertEqual(to_cents(Decimal('0.0049')), 0)
+        self.assertEqual(to_cents(Decimal('1.2345')), 123)
+        self.assertEqual(to_cents(Decimal('1.2350')), 124)
+        self.assertEqual(to_cents(Decimal('-0.005')), -1)
+        self.assertEqual(to_cents(Decimal('-1.2349')), -123)
+
+    def test_from_cents(self):
+        self.assertEqual(from_cents(12345), Decimal('123.45'))
+        self.assertEqual(from_cents(-5), Decimal('-0.05'))
+        self.assertEqual(str(from_cents(0)), '0.00')
+
+    def test_amount_and_percentage(self):
+        self.assertEqual(amount_cents(Decimal('10.01'), 3), 3003)
+        self.assertEqual(percentage(-250, 1000), Decimal('-25'))
+        self.assertEqual(percentage(100, 0), Decimal('0'))
+
+class ValuationParityTests(TestCase):
+    """
+    Cents valuation against the previous Decimal results
+    """
+    def assert_position_parity(self, position):
+        price, average, quantity = position.stock.last_price, position.average_buy_price, position.quantity
+        label = f"{quantity} @ {average} priced {price}"
+        self.assertEqual(position.current_value, legacy_current_value(price, quantity), label)
+        self.assertEqual(position.profit_loss, legacy_profit_loss(price, average, quantity), label)
+        self.assertEqual(as_served(position.profit_loss_percentage),
+                         as_served(legacy_profit_loss_percentage(price, average, quantity)), label)
+
+    def test_edge_cases(self):
+        cases = [
+            # price, average buy price, quantity
+            ('0.00', '0.00', 10),         # zero cost basis
+            ('12.34', '0.00', 5),         # zero cost basis with a value
+            ('0.00', '50.00', 3),         # total loss
+            ('99.99', '100.01', 7),       # small loss
+            ('100.01', '99.99', 7),       # small gain
+            ('7.99', '8.00', 1),          # -0.125%: a half in the third place
+            ('0.03', '0.02', 1),          # +50% exactly
+            ('1.00', '3.00', 1),          # -66.666...%
+            ('250.00', '250.00', 0),      # empty position
+            ('99999.99', '0.01', 100000),
+        ]
+        for price, average, quantity in cases:
+            position = Position(stock=Stock(last_price=Decimal(price)), quantity=quantity,
+                                average_buy_price=Decimal(average))
+            self.assert_position_parity(position)
+
+    def test_random_cases(self):
+        rng = random.Random(0)
+        for _ in range(20000):
+            position = Position(stock=Stock(last_price=Decimal(rng.randint(0, 10 ** 7)).scaleb(-2)),
+                                quantity=rng.randint(0, 100000),
+                                average_buy_price=Decimal(rng.randint(0, 10 ** 7)).scaleb(-2))
+            self.assert_position_parity(position)
+
+    def test_stored_rows(self):
+        rng = random.Random(1)
+        user = User.objects.create(username='parity')
+        stocks = [Stock.objects.create(symbol=f'P{i}', company_name=f'P{i}',
+                                       last_price=Decimal(rng.randint(0, 10 ** 6)).scaleb(-2))
+                  for i in range(20)]
+        portfolios = [Portfolio.objects.create(user=user, name=f'p{i}') for i in range(4)]
+        for portfolio in portfolios[1:]:
+            for stock in rng.sample(stocks, 8):
+                quantity = rng.randint(1, 5000)
+                price = Decimal(rng.randint(1, 10 ** 6)).scaleb(-2)
+                Position.objects.create(portfolio=portfolio, stock=stock, quantity=quantity, average_buy_price=price)
+                Transaction.objects.create(portfolio=portfolio, stock=stock, transaction_type=Transaction.BUY,
+                                           quantity=quantity, price=price)
+
+        for position in Position.objects.select_related('stock'):
+            self.assert_position_parity(position)
+        for txn in Transaction.objects.all():
+            self.assertEqual(txn.total_amount, legacy_current_value(txn.price, txn.quantity))
+
+        legacy_totals = {}
+        for position in Position.objects.select_related('stock'):
+            legacy_totals[position.portfolio_id] = (legacy_totals.get(position.portfolio_id, Decimal('0'))
+                                                    + legacy_current_value(position.stock.last_price,
+                                                                           position.quantity))
+        for portfolio in with_valuation():
+            expected = as_served(legacy_totals.get(portfolio.id, 0))
+            self.assertEqual(portfolio.total_stock_value, expected)
+            # Without the annotation the model sums in a query of its own
+            self.assertEqual(Portfolio.objects.get(id=portfolio.id).total_stock_value, expected)
+
+@override_settings(PORTFOLIO_SHARDS=['shard0', 'shard1'], EXECUTION_MODEL='instant')
+class ShardingTests(TestCase):
+    """
+    Routing, id ranges and moves across two shards
+    """
+    databases = {'default', 'shard0', 'shard1'}
+
+    def setUp(self):
+        self.starts = {alias: reserve_id_range(alias) for alias in ('shard0', 'shard1')}
+        self.stock = Stock.objects.create(symbol='SHRD', company_name='Shard Inc', last_price=Decimal('10.00'))
+        # Enough users that both shards get some
+        self.users = [User.objects.create(username=f'shard{i}') for i in range(8)]
+
+    def user_on(self, alias):
+        return next(user for user in self.users if shard_for_user(user) == alias)
+
+    def create_portfolio(self, user, name='Main'):
+        # Manager writes go to the active shard, as in the views
+        with use_shard(shard_for_user(user)):
+            return Portfolio.objects.create(user=user, name=name)
+
+    def test_jump_hash(self):
+        for key in range(1000):
+            self.assertEqual(jump_hash(key, 1), 0)
+            two, three = jump_hash(key, 2), jump_hash(key, 3)
+            self.assertIn(two, (0, 1))
+            # Growing the bucket count only moves keys into the new bucket
+            self.assertIn(three, (two, 2))
+
+    def test_user_placement(self):
+        self.assertEqual({shard_for_user(user) for user in self.users}, {'shard0', 'shard1'})
+        for user in self.users:
+            alias = shard_for_user(user)
+            self.assertEqual(alias, f'shard{jump_hash(user.id, 2)}')
+            self.assertEqual(shard_for_user(user.id), alias)
+            # Users are mirrored to every shard; their portfolios live on one
+            self.assertTrue(User.objects.using('shard0').filter(id=user.id).exists())
+            self.assertTrue(User.objects.using('shard1').filter(id=user.id).exists())
+            portfolio = self.create_portfolio(user)
+            self.assertEqual(portfolio._state.db, alias)
+            for other in ('default', 'shard0', 'shard1'):
+                self.assertEqual(Portfolio.objects.using(other).filter(id=portfolio.id).exists(), other == alias)
+
+    def test_id_range_reservation(self):
+        self.assertEqual(self.starts, {'shard0': settings.SHARD_ID_SPAN, 'shard1': 2 * settings.SHARD_ID_SPAN})
+        for alias, start in self.starts.items():
+            portfolio = self.create_portfolio(self.user_on(alias))
+            self.assertGreater(portfolio.id, start)
+            self.assertLess(portfolio.id, start + settings.SHARD_ID_SPAN)
+            # Reserving again never hands out an id twice
+            reserve_id_range(alias)
+            self.assertGreater(self.create_portfolio(self.user_on(alias), 'Next').id, portfolio.id)
+
+    def test_trade_routed_to_user_shard(self):
+        user = self.user_on('shard1')
+        portfolio = self.create_portfolio(user)
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch.object(execution, '_model', None):
+            response = client.post('/api/trading/buy/', {'portfolio_id': portfolio.id, 'stock_symbol': 'SHRD',
+                                                         'quantity': 3}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        for model in (Position, Transaction, TaxLot, OutboxEvent):
+            rows = model.objects.using('shard1').filter(portfolio_id=portfolio.id)
+            self.assertEqual(rows.count(), 1, model.__name__)
+            self.assertGreater(rows.get().id, self.starts['shard1'])
+            self.assertFalse(model.objects.using('shard0').filter(portfolio_id=portfolio.id).exists())
+            self.assertFalse(model.objects.using('default').filter(portfolio_id=portfolio.id).exists())
+        portfolio.refresh_from_db()
+        self.assertEqual(portfolio.cash_balance, Decimal('10000.00') - Decimal('30.00'))
+        # The exposure commits with the trade, on the same shard
+        exposure = SymbolExposure.objects.using('shard1').get(stock_id=self.stock.id)
+        self.assertEqual((exposure.quantity, exposure.holders), (3, 1))
+        self.assertFalse(SymbolExposure.objects.using('shard0').exists())
+        self.assertFalse(SymbolExposure.objects.using('default').exists())
+
+    def test_move_user(self):
+        user = self.user_on('shard0')
+        portfolio = self.create_portfolio(user)
+        with use_shard('shard0'):
+            position = Position.objects.create(portfolio=portfolio, stock=self.stock, quantity=4,
+                                               average_buy_price=Decimal('10.00'))
+            txn = Transaction.objects.create(portfolio=portfolio, stock=self.stock, transaction_type=Transaction.BUY,
+                                             quantity=4, price=Decimal('10.00'))
+
+        self.assertEqual(move_user(user.id, 'shard0', 'shard1'), 3)
+        for model, pk in ((Portfolio, portfolio.id), (Position, position.id), (Transaction, txn.id)):
+            self.assertTrue(model.objects.using('shard1').filter(id=pk).exists(), model.__name__)
+            self.assertFalse(model.objects.using('shard0').filter(id=pk).exists(), model.__name__)
+        moved = Position.objects.using('shard1').get(id=position.id)
+        self.assertEqual((moved.portfolio_id, moved.quantity), (portfolio.id, 4))
+        # Only the user's rows move; the mirrors stay on both shards
+        self.assertTrue(User.objects.using('shard0').filter(id=user.id).exists())
+        self.assertTrue(Stock.objects.using('shard0').filter(id=self.stock.id).exists())
+
+
+@override_settings(TRANSACTION_LEDGER_MODE='partitioned')
+class PartitionedLedgerTests(TestCase):
+    """
+    Partitioned reads merge the corporate action audit rows kept in Transaction
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='ledger')
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Ledger')
+        self.stock = Stock.objects.create(symbol='LDGR', company_name='Ledger Inc', last_price=Decimal('10.00'))
+        start = timezone.make_aware(datetime.datetime(2024, 1, 1))
+        self.expected = []
+        # A trade every two days over three months, a dividend every ninth day
+        for day in range(90):
+            timestamp = start + datetime.timedelta(days=day)
+            if day % 9 == 4:
+                row = Transaction.objects.create(portfolio=self.portfolio, stock=self.stock,
+                                                 transaction_type=Transaction.DIVIDEND, quantity=day,
+                                                 price=Decimal('0.10'), cash_amount=Decimal('1.00'))
+                Transaction.objects.filter(id=row.id).update(timestamp=timestamp)
+                self.expected.append(('DIV', day))
+            if day % 2 == 0:
+                LedgerEntry.objects.create(portfolio=self.portfolio, stock=self.stock, side=LedgerEntry.SIDE_BUY,
+                                           quantity=day, price_cents=1000, timestamp=timestamp)
+                self.expected.append(('BUY', day))
+        # Newest first; on the shared days the audit row comes first
+        self.expected.sort(key=lambda row: (-row[1], row[0] != 'DIV'))
+
+    def read(self, rows):
+        return [(row.transaction_type, row.quantity) for row in rows]
+
+    def assert_slices(self):
+        reader = LedgerReader(self.portfolio)
+        self.assertEqual(len(reader), len(self.expected))
+        self.assertEqual(self.read(reader), self.expected)
+        for start, stop in [(0, 1), (0, 10), (3, 17), (20, 45), (44, 46), (50, 200)]:
+            self.assertEqual(self.read(reader[start:stop]), self.expected[start:stop], (start, stop))
+
+    def test_reader_merges_audit_rows(self):
+        self.assert_slices()
+
+    def test_reader_merges_audit_rows_into_archives(self):
+        with tempfile.TemporaryDirectory() as archive_dir, override_settings(LEDGER_ARCHIVE_DIR=archive_dir):
+            archive_period(202401)
+            self.assertFalse(LedgerEntry.objects.filter(period=202401).exists())
+            self.assert_slices()
+
+    def test_recent_transactions_include_audit_rows(self):
+        rows = recent_transactions([self.portfolio.id], 5)
+        self.assertEqual(self.read(rows), self.expected[:5])
+        self.assertIn(('DIV', 85), self.read(rows))
+
+class LedgerStorageTests(TestCase):
+    """
+    Writing, importing and archiving trades in the two ledger modes
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='storage')
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Storage')
+        self.stock = Stock.objects.create(symbol='STOR', company_name='Storage Inc', last_price=Decimal('12.34'))
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.enterContext(override_settings(LEDGER_ARCHIVE_DIR=archive_dir.name))
+
+    def trade(self, transaction_type, quantity, timestamp):
+        row = Transaction.objects.create(portfolio=self.portfolio, stock=self.stock, transaction_type=transaction_type,
+                                         quantity=quantity, price=Decimal('12.34'))
+        Transaction.objects.filter(id=row.id).update(timestamp=timestamp)
+        return row
+
+    def test_record_transaction_per_mode(self):
+        row = record_transaction(self.portfolio, self.stock, Transaction.BUY, 3, Decimal('12.34'))
+        self.assertIsInstance(row, Transaction)
+        with override_settings(TRANSACTION_LEDGER_MODE='partitioned'):
+            entry = record_transaction(self.portfolio, self.stock, Transaction.SELL, 2, Decimal('12.34'))
+        self.assertIsInstance(entry, LedgerEntry)
+        self.assertEqual((entry.side, entry.price_cents, entry.period),
+                         (LedgerEntry.SIDE_SELL, 1234, ledger_period(entry.timestamp)))
+        self.assertEqual((entry.transaction_type, entry.price, entry.total_amount),
+                         ('SELL', Decimal('12.34'), Decimal('24.68')))
+
+    def test_import_copies_trades_once(self):
+        march = timezone.make_aware(datetime.datetime(2024, 3, 5))
+        buy = self.trade(Transaction.BUY, 10, march)
+        self.trade(Transaction.SELL, 4, march + datetime.timedelta(days=1))
+        self.trade(Transaction.DIVIDEND, 6, march + datetime.timedelta(days=2))
+        self.assertEqual(import_transactions(batch_size=1), 2)
+        self.assertEqual(import_transactions(), 0)
+        entry = LedgerEntry.objects.get(source_transaction_id=buy.id)
+        self.assertEqual((entry.period, entry.side, entry.quantity, entry.timestamp),
+                         (202403, LedgerEntry.SIDE_BUY, 10, march))
+
+        # Archived rows still move the cursor
+        archive = archive_period(202403)
+        self.assertEqual((archive.row_count, archive.portfolio_counts), (2, {str(self.portfolio.id): 2}))
+        self.assertEqual(import_transactions(), 0)
+        self.trade(Transaction.BUY, 1, march + datetime.timedelta(days=40))
+        self.assertEqual(import_transactions(), 1)
+
+    def test_archive_period(self):
+        with override_settings(TRANSACTION_LEDGER_MODE='partitioned'):
+            for day in range(3):
+                LedgerEntry.objects.create(portfolio=self.portfolio, stock=self.stock, side=LedgerEntry.SIDE_BUY,
+                                           quantity=day + 1, price_cents=1234,
+                                           timestamp=timezone.make_aware(datetime.datetime(2024, 1, day + 1)))
+            archive = archive_period(202401)
+            self.assertFalse(LedgerEntry.objects.exists())
+            self.assertEqual(LedgerArchive.objects.get().row_count, 3)
+            with self.assertRaises(ValueError):
+                archive_period(202401)
+            with self.assertRaises(ValueError):
+                archive_period(202402)
+
+            # Archived rows are still served, newest first, with their symbol
+            client = APIClient()
+            client.force_authenticate(self.user)
+            response = client.get(f'/api/portfolios/{self.portfolio.id}/transactions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['quantity'], row['stock_symbol'], row['transaction_type']) for row in response.data],
+                         [(3, 'STOR', 'BUY'), (2, 'STOR', 'BUY'), (1, 'STOR', 'BUY')])
+        self.assertTrue(os.path.exists(archive.path))
+
+class CostBasisMethodTests(TestCase):
+    """
+    The cost basis method is fixed once the portfolio holds lots
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='basis')
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Basis')
+        self.stock = Stock.objects.create(symbol='BSIS', company_name='Basis Inc', last_price=Decimal('10.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def patch(self, method):
+        return self.client.patch(f'/api/portfolios/{self.portfolio.id}/', {'cost_basis_method': method},
+                                 format='json')
+
+    def test_change_without_lots(self):
+        response = self.patch('LIFO')
+        self.assertEqual(response.status_code, 200)
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.cost_basis_method, 'LIFO')
+
+    def test_change_with_lots_is_rejected(self):
+        TaxLot.objects.create(portfolio=self.portfolio, stock=self.stock, quantity=5, cost_price=Decimal('10'))
+        response = self.patch('LIFO')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cost_basis_method', response.data)
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.cost_basis_method, 'FIFO')
+        # Sending the current method back is fine
+        self.assertEqual(self.patch('FIFO').status_code, 200)
+
+class TaxLotTests(TestCase):
+    """
+    Buy 10 @ 10 and 10 @ 20, then sell 15 @ 30 under each method
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='lots')
+        self.stock = Stock.objects.create(symbol='LOTS', company_name='Lots Inc', last_price=Decimal('25.00'))
+
+    def trade(self, method):
+        portfolio = Portfolio.objects.create(user=self.user, name=method, cost_basis_method=method)
+        apply_buy(portfolio, self.stock, 10, Decimal('10.00'))
+        self.assertEqual(apply_buy(portfolio, self.stock, 10, Decimal('20.00'), held_before=10), Decimal('15.00'))
+        realized, average = apply_sell(portfolio, self.stock, 15, Decimal('30.00'), 20, Decimal('15.00'))
+        lots = [(lot.quantity, lot.cost_price) for lot in TaxLot.objects.filter(portfolio=portfolio)]
+        return portfolio, realized, average, lots
+
+    def test_fifo(self):
+        _, realized, average, lots = self.trade(Portfolio.FIFO)
+        self.assertEqual((realized, average, lots), (Decimal('250.00'), Decimal('20.00'), [(5, Decimal('20'))]))
+
+    def test_lifo(self):
+        _, realized, average, lots = self.trade(Portfolio.LIFO)
+        self.assertEqual((realized, average, lots), (Decimal('200.00'), Decimal('10.00'), [(5, Decimal('10'))]))
+
+    def test_average(self):
+        _, realized, average, lots = self.trade(Portfolio.AVERAGE)
+        self.assertEqual((realized, average, lots), (Decimal('225.00'), Decimal('15.00'), [(5, Decimal('15'))]))
+
+    def test_untracked_shares_are_seeded(self):
+        portfolio = Portfolio.objects.create(user=self.user, name='Legacy')
+        # 5 shares held from before lot tracking, at an average of 8
+        realized, average = apply_sell(portfolio, self.stock, 3, Decimal('10.00'), 5, Decimal('8.00'))
+        self.assertEqual((realized, average), (Decimal('6.00'), Decimal('8.00')))
+        self.assertEqual(TaxLot.objects.get(portfolio=portfolio).quantity, 2)
+
+    def test_pnl_endpoint(self):
+        portfolio, _, _, _ = self.trade(Portfolio.FIFO)
+        apply_sell(portfolio, self.stock, 1, Decimal('21.00'), 5, Decimal('20.00'))
+        client = APIClient()
+        client.force_authenticate(self.user)
+        body = client.get(f'/api/portfolios/{portfolio.id}/pnl/').json()
+        self.assertEqual(body['cost_basis_method'], 'FIFO')
+        self.assertEqual(Decimal(body['realized_total']), Decimal('251.00'))
+        self.assertEqual(body['unrealized'][0]['quantity'], 4)
+        self.assertEqual(Decimal(body['unrealized_total']), Decimal('20.00'))
+        lots = client.get(f'/api/portfolios/{portfolio.id}/lots/').json()
+        self.assertEqual([(lot['stock_symbol'], lot['quantity']) for lot in lots], [('LOTS', 4)])
+
+SNAPSHOT_NOW = datetime.datetime(2024, 6, 10, 12, 2, tzinfo=datetime.timezone.utc)
+
+@override_settings(SNAPSHOT_INTERVAL_MINUTES=5, SNAPSHOT_RAW_RETENTION_HOURS=24, SNAPSHOT_HOURLY_RETENTION_DAYS=30)
+class SnapshotTests(TestCase):
+    """
+    Intraday capture and the raw -> hourly -> daily rollups, with the clock fixed
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='snapshots')
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Snapshots', cash_balance=Decimal('100.00'))
+        self.enterContext(mock.patch('portfolios.snapshots.timezone.now', return_value=SNAPSHOT_NOW))
+
+    def point(self, ago, value, resolution=PortfolioSnapshot.RAW):
+        build_snapshot(self.portfolio.id, Decimal(value), Decimal('0'), SNAPSHOT_NOW - ago, resolution).save()
+
+    def series(self, resolution):
+        return [(point.timestamp, point.total_value) for point in (PortfolioSnapshot.objects
+                                                                   .filter(portfolio=self.portfolio,
+                                                                           resolution=resolution)
+                                                                   .order_by('timestamp'))]
+
+    def test_truncate(self):
+        self.assertEqual(truncate(SNAPSHOT_NOW, PortfolioSnapshot.RAW), SNAPSHOT_NOW.replace(minute=0))
+        self.assertEqual(truncate(SNAPSHOT_NOW.replace(minute=59), PortfolioSnapshot.RAW),
+                         SNAPSHOT_NOW.replace(minute=55))
+        self.assertEqual(truncate(SNAPSHOT_NOW, PortfolioSnapshot.HOURLY), SNAPSHOT_NOW.replace(minute=0))
+        self.assertEqual(truncate(SNAPSHOT_NOW, PortfolioSnapshot.DAILY), SNAPSHOT_NOW.replace(hour=0, minute=0))
+
+    def test_capture_is_idempotent_per_interval(self):
+        stock = Stock.objects.create(symbol='SNAP', company_name='Snap Inc', last_price=Decimal('2.50'))
+        Position.objects.create(portfolio=self.portfolio, stock=stock, quantity=4, average_buy_price=Decimal('2.00'))
+        self.assertEqual(capture_snapshots(), 1)
+        capture_snapshots()
+        snapshot = PortfolioSnapshot.objects.get(portfolio=self.portfolio)
+        self.assertEqual((snapshot.timestamp, snapshot.stock_value, snapshot.total_value),
+                         (SNAPSHOT_NOW.replace(minute=0), Decimal('10.00'), Decimal('110.00')))
+
+    def test_downsample_keeps_the_last_point_of_each_bucket(self):
+        # Six raw points 30 hours ago, 20 minutes apart, and one from the last hour
+        for k in range(6):
+            self.point(datetime.timedelta(hours=30) - datetime.timedelta(minutes=20 * k), k)
+        self.point(datetime.timedelta(hours=1), 9)
+        self.point(datetime.timedelta(days=40), 7, PortfolioSnapshot.HOURLY)
+        self.point(datetime.timedelta(days=40, hours=-1), 8, PortfolioSnapshot.HOURLY)
+
+        self.assertEqual(downsample_snapshots(), (2, 1))
+        self.assertEqual(self.series(PortfolioSnapshot.RAW), [(SNAPSHOT_NOW - datetime.timedelta(hours=1), 9)])
+        self.assertEqual(self.series(PortfolioSnapshot.HOURLY), [
+            (datetime.datetime(2024, 6, 9, 6, tzinfo=datetime.timezone.utc), 2),
+            (datetime.datetime(2024, 6, 9, 7, tzinfo=datetime.timezone.utc), 5),
+        ])
+        self.assertEqual(self.series(PortfolioSnapshot.DAILY),
+                         [(datetime.datetime(2024, 5, 1, tzinfo=datetime.timezone.utc), 8)])
+        # A second run has nothing left to roll up
+        self.assertEqual(downsample_snapshots(), (0, 0))
+
+    def test_series_resolution(self):
+        self.assertEqual(resolution_for_range(SNAPSHOT_NOW - datetime.timedelta(hours=6), SNAPSHOT_NOW), 'raw')
+        self.assertEqual(resolution_for_range(SNAPSHOT_NOW - datetime.timedelta(days=7), SNAPSHOT_NOW), '1h')
+        self.assertEqual(resolution_for_range(SNAPSHOT_NOW - datetime.timedelta(days=90), SNAPSHOT_NOW), '1d')
+
+        # Raw points not yet rolled up are bucketed on the fly
+        for k in range(4):
+            self.point(datetime.timedelta(minutes=80 - 25 * k), k)
+        resolution, points = snapshot_series(self.portfolio, resolution=PortfolioSnapshot.HOURLY)
+        self.assertEqual((resolution, [point.total_value for point in points]), ('1h', [3, 0]))
+        resolution, points = snapshot_series(self.portfolio, start=SNAPSHOT_NOW - datetime.timedelta(hours=2))
+        self.assertEqual((resolution, len(points)), ('raw', 4))
+
+    def test_unknown_resolution(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f'/api/portfolios/{self.portfolio.id}/snapshots/', {'resolution': '5m'})
+        self.assertEqual(response.status_code, 400)
+
+@override_settings(DASHBOARD_TOP_POSITIONS=2, DASHBOARD_RECENT_TRANSACTIONS=2)
+class DashboardTests(TestCase):
+    """
+    The per-user summary, its query budget and its cache
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='dashboard')
+        self.stocks = [Stock.objects.create(symbol=f'DSH{i}', company_name=f'Dash {i}', last_price=Decimal(10 + i))
+                       for i in range(4)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_portfolio(self, name, holdings):
+        portfolio = Portfolio.objects.create(user=self.user, name=name, cash_balance=Decimal('100.00'))
+        for stock, quantity in zip(self.stocks, holdings):
+            Position.objects.create(portfolio=portfolio, stock=stock, quantity=quantity,
+                                    average_buy_price=Decimal('10.00'))
+            Transaction.objects.create(portfolio=portfolio, stock=stock, transaction_type=Transaction.BUY,
+                                       quantity=quantity, price=Decimal('10.00'))
+        return portfolio
+
+    def fetch(self):
+        return self.client.get('/api/dashboard/').json()
+
+    def test_summary(self):
+        portfolio = self.add_portfolio('Main', [1, 2, 3])
+        day = timezone.now() - datetime.timedelta(days=2)
+        for hour, value in ((1, '150.00'), (5, '160.00')):
+            PortfolioSnapshot.objects.create(portfolio=portfolio, timestamp=day.replace(hour=hour), date=day.date(),
+                                             cash_balance=Decimal(value), stock_value=0, total_value=Decimal(value))
+
+        data = build_dashboard(self.user)
+        # 10 + 2 * 11 + 3 * 12 in stocks
+        self.assertEqual(data['totals']['total_value'], Decimal('168.00'))
+        summary = data['portfolios'][0]
+        self.assertEqual(summary['positions_count'], 3)
+        self.assertEqual([row['symbol'] for row in summary['top_positions']], ['DSH2', 'DSH1'])
+        self.assertEqual(summary['top_positions'][0]['profit_loss'], Decimal('6.00'))
+        self.assertEqual([row['stock_symbol'] for row in summary['recent_transactions']], ['DSH2', 'DSH1'])
+        self.assertEqual(summary['sparkline'], [{'date': day.date(), 'total_value': Decimal('160.00')}])
+
+    def test_query_count_does_not_grow_with_portfolios(self):
+        self.add_portfolio('One', [1])
+        with CaptureQueriesContext(connection) as small:
+            build_dashboard(self.user)
+        for i in range(5):
+            self.add_portfolio(f'More {i}', [1, 2, 3, 4])
+        with self.assertNumQueries(len(small)):
+            data = build_dashboard(self.user)
+        self.assertEqual(len(data['portfolios']), 6)
+
+    def test_cached_until_portfolio_data_changes(self):
+        portfolio = self.add_portfolio('Main', [1])
+        first = self.fetch()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.fetch(), first)
+        Position.objects.filter(portfolio=portfolio).get().delete()
+        self.assertEqual(self.fetch()['portfolios'][0]['positions_count'], 0)
+
+class CorporateActionTests(TestCase):
+    """
+    Feed ingestion and applying splits and dividends to holders
+    """
+    def setUp(self):
+        self.stock = Stock.objects.create(symbol='CORP', company_name='Corp Inc', last_price=Decimal('30.00'))
+        self.holders = []
+        for i, quantity in enumerate((5, 4, 10)):
+            user = User.objects.create(username=f'holder{i}')
+            portfolio = Portfolio.objects.create(user=user, name='Main', cash_balance=Decimal('0.00'))
+            Position.objects.create(portfolio=portfolio, stock=self.stock, quantity=quantity,
+                                    average_buy_price=Decimal('10.00'))
+            TaxLot.objects.create(portfolio=portfolio, stock=self.stock, quantity=quantity, cost_price=Decimal('10'))
+            self.holders.append(portfolio)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.feed = os.path.join(tmp.name, 'actions.csv')
+
+    def action(self, **kwargs):
+        return CorporateAction.objects.create(stock=self.stock, ex_date=datetime.date(2024, 3, 1), **kwargs)
+
+    def holding(self, portfolio):
+        portfolio.refresh_from_db()
+        position = Position.objects.get(portfolio=portfolio)
+        lot = TaxLot.objects.get(portfolio=portfolio)
+        return position.quantity, position.average_buy_price, lot.cost_price, portfolio.cash_balance
+
+    def test_parse_event(self):
+        event = parse_event({'symbol': ' corp ', 'type': 'Split', 'ex_date': '2024-03-01', 'ratio': '3:2'})
+        self.assertEqual((event['symbol'], event['split_to'], event['split_from']), ('CORP', 3, 2))
+        event = parse_event({'symbol': 'CORP', 'kind': 'dividend', 'ex_date': '2024-03-01', 'amount': '0.25'})
+        self.assertEqual(event['cash_per_share'], Decimal('0.25'))
+        with self.assertRaises(ValueError):
+            parse_event({'symbol': 'CORP', 'type': 'split', 'ex_date': '2024-03-01', 'ratio': '0:1'})
+        with self.assertRaises(ValueError):
+            parse_event({'symbol': 'CORP', 'type': 'merger', 'ex_date': '2024-03-01'})
+
+    def test_ingest_is_idempotent(self):
+        with open(self.feed, 'w') as fh:
+            fh.write("symbol,type,ex_date,ratio,amount\n"
+                     "CORP,split,2024-03-01,3:2,\n"
+                     "CORP,dividend,2024-03-01,,0.25\n"
+                     "NOPE,dividend,2024-03-01,,1.00\n")
+        provider = FileProvider(self.feed)
+        self.assertEqual(ingest(provider), (2, ['NOPE']))
+        self.assertEqual(ingest(provider), (0, ['NOPE']))
+
+    @override_settings(CORPORATE_ACTIONS_PROVIDER='file')
+    def test_missing_feed_still_applies_due_actions(self):
+        self.action(kind=CorporateAction.DIVIDEND, cash_per_share=Decimal('1.00'))
+        with override_settings(CORPORATE_ACTIONS_PATH=self.feed), self.assertLogs('portfolios.tasks', 'INFO'):
+            result = apply_corporate_actions()
+        self.assertEqual(result, {'ingested': 0, 'applied': 1, 'holders': 3})
+
+    def test_split_pays_cash_in_lieu(self):
+        action = self.action(kind=CorporateAction.SPLIT, split_to=3, split_from=2)
+        self.assertEqual(apply_due_actions(as_of=datetime.date(2024, 3, 1)), (1, 3))
+        # 5 shares become 7.5: 7 shares and half a $20 share in cash
+        self.assertEqual(self.holding(self.holders[0]), (7, Decimal('6.67'), Decimal('6.6667'), Decimal('10.00')))
+        self.assertEqual(self.holding(self.holders[1]), (6, Decimal('6.67'), Decimal('6.6667'), Decimal('0.00')))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.last_price, Decimal('20.00'))
+        audit = Transaction.objects.get(portfolio=self.holders[0], corporate_action=action)
+        self.assertEqual((audit.transaction_type, audit.quantity, audit.total_amount), ('SPLT', 2, Decimal('10.00')))
+
+    def test_dividend_rounds_half_up_to_the_cent(self):
+        self.action(kind=CorporateAction.DIVIDEND, cash_per_share=Decimal('0.3333'))
+        apply_due_actions(as_of=datetime.date(2024, 3, 1))
+        # 5 * 0.3333 = 1.6665, 4 * 0.3333 = 1.3332, 10 * 0.3333 = 3.333
+        self.assertEqual([self.holding(portfolio)[3] for portfolio in self.holders],
+                         [Decimal('1.67'), Decimal('1.33'), Decimal('3.33')])
+
+    def test_resume_never_adjusts_a_holder_twice(self):
+        action = self.action(kind=CorporateAction.DIVIDEND, cash_per_share=Decimal('1.00'))
+        self.assertEqual(apply_chunk(action.pk, 2), (2, False))
+        action.refresh_from_db()
+        self.assertEqual(action.status, CorporateAction.PROCESSING)
+
+        # Trades in the symbol wait until the action is applied
+        client = APIClient()
+        client.force_authenticate(self.holders[0].user)
+        response = client.post('/api/trading/buy/', {'portfolio_id': self.holders[0].id, 'stock_symbol': 'CORP',
+                                                     'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+        # A lost cursor write only re-reads holders that already have an audit row
+        CorporateAction.objects.filter(pk=action.pk).update(cursor=0)
+        self.assertEqual(apply_action(action, chunk_size=2), 1)
+        self.assertEqual(apply_action(action, chunk_size=2), 0)
+        self.assertEqual([self.holding(portfolio)[3] for portfolio in self.holders],
+                         [Decimal('5.00'), Decimal('4.00'), Decimal('10.00')])
+        action.refresh_from_db()
+        self.assertEqual((action.status, action.holders_processed), (CorporateAction.APPLIED, 3))
@@ -0,0 +1,34 @@
+from django.db.models import BigIntegerField, Count, F, Prefetch, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Round
+from .models import Portfolio, Position
+
+# Set-based portfolio valuation
+#
+# Portfolio totals are summed by the database and come back as integer
+# cents, so listing portfolios costs one query however many positions they
+# hold. Per-position values are computed in cents on the model.
+
+def stock_value_cents_expression(prefix=''):
+    """
+    SUM(quantity * last_price) over positions, as integer cents
+    """
+    value = Sum(F(f'{prefix}quantity') * F(f'{prefix}stock__last_price'))
+    return Coalesce(Cast(Round(value * 100), BigIntegerField()), Value(0))
+
+def with_valuation(queryset=None):
+    """
+    Annotate portfolios with their stock value (cents) and position count
+    """
+    queryset = Portfolio.objects.all() if queryset is None else queryset
+    return queryset.annotate(
+        annotated_stock_value_cents=stock_value_cents_expression('positions__'),
+        annotated_positions_count=Count('positions'),
+    )
+
+def with_positions(queryset):
+    """
+    Prefetch positions with their stocks for serializing a portfolio in full
+    """
+    return queryset.prefetch_related(
+        Prefetch('positions', queryset=Position.objects.select_related('stock').order_by('id'))
+    )
@@ -2,21 +2,59 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.views import APIView
 from django.db.models import Sum
-from .models import Portfolio, Position, Transaction, PortfolioSnapshot
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from decimal import Decimal
+import datetime
+from .models import Portfolio, Position, Transaction, PortfolioSnapshot, TaxLot
 from .serializers import (PortfolioSerializer, PortfolioDetailSerializer, 
                          PositionSerializer, TransactionSerializer,
-                         PortfolioSnapshotSerializer)
-from .tasks import create_portfolio_snapshot
+                         PortfolioSnapshotSerializer, TaxLotSerializer)
+from .ledger import portfolio_transactions
+from .lots import realized_by_stock, unrealized_by_stock
+from .snapshots import capture_portfolio_snapshot, snapshot_series
+from .history import reconstruct, day_end
+from .dashboard import get_dashboard
+from .valuation import with_valuation, with_positions
+from .sharding import ShardedViewMixin
 
 # Portfolios viewset
 
-class PortfolioViewSet(viewsets.ModelViewSet):
+def parse_range_param(value):
+    """
+    Accept either a date or a datetime for snapshot range filters
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            return None
+        parsed = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+class PortfolioViewSet(ShardedViewMixin, viewsets.ModelViewSet):
     serializer_class = PortfolioSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Portfolio.objects.filter(user=self.request.user)
+        portfolios = Portfolio.objects.filter(user=self.request.user)
+        if self.action == 'list':
+            # Contest portfolios are listed per competition, not with regular ones
+            competition = self.request.query_params.get('competition')
+            if competition:
+                portfolios = portfolios.filter(competition_id=competition if competition.isdigit() else None)
+            else:
+                portfolios = portfolios.filter(competition__isnull=True)
+            return with_valuation(portfolios)
+        if self.action == 'retrieve':
+            return with_positions(portfolios)
+        return portfolios
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -29,7 +67,7 @@ class PortfolioViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def transactions(self, request, pk=None):
         portfolio = self.get_object()
-        transactions = Transaction.objects.filter(portfolio=portfolio).order_by('-timestamp')
+        transactions = portfolio_transactions(portfolio)
         page = self.paginate_queryset(transactions)
         if page is not None:
             serializer = TransactionSerializer(page, many=True)
@@ -40,7 +78,13 @@ class PortfolioViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def snapshots(self, request, pk=None):
         portfolio = self.get_object()
-        snapshots = PortfolioSnapshot.objects.filter(portfolio=portfolio).order_by('-date')
+        start = parse_range_param(request.query_params.get('start'))
+        end = parse_range_param(request.query_params.get('end'))
+        resolution = request.query_params.get('resolution')
+        if resolution and resolution not in dict(PortfolioSnapshot.RESOLUTIONS):
+            return Response({'error': f"Unknown resolution: {resolution}"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        resolution, snapshots = snapshot_series(portfolio, start, end, resolution)
         page = self.paginate_queryset(snapshots)
         if page is not None:
             serializer = PortfolioSnapshotSerializer(page, many=True)
@@ -48,27 +92,61 @@ class PortfolioViewSet(viewsets.ModelViewSet):
         serializer = PortfolioSnapshotSerializer(snapshots, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def historical(self, request, pk=None):
+        portfolio = self.get_object()
+        value = request.query_params.get('at')
+        # A bare date means the close of that day
+        day = parse_date(value) if value else None
+        at = day_end(day) if day else parse_range_param(value)
+        if at is None:
+            return Response({'error': "Provide 'at' as a date or datetime"}, status=status.HTTP_400_BAD_REQUEST)
+        if at > timezone.now():
+            return Response({'error': "'at' cannot be in the future"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(reconstruct(portfolio, at))
+    
+    @action(detail=True, methods=['get'])
+    def lots(self, request, pk=None):
+        portfolio = self.get_object()
+        lots = TaxLot.objects.filter(portfolio=portfolio).select_related('stock').order_by('stock__symbol', 'opened_at')
+        serializer = TaxLotSerializer(lots, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def pnl(self, request, pk=None):
+        portfolio = self.get_object()
+        realized = realized_by_stock(portfolio)
+        unrealized = unrealized_by_stock(portfolio)
+        return Response({
+            'cost_basis_method': portfolio.cost_basis_method,
+            'realized_total': sum((row['realized'] for row in realized), Decimal('0.00')),
+            'unrealized_total': sum((row['unrealized'] for row in unrealized), Decimal('0.00')),
+            'realized': realized,
+            'unrealized': unrealized
+        })
+    
     @action(detail=True, methods=['post'])
     def create_snapshot(self, request, pk=None):
         portfolio = self.get_object()
         try:
             # Instead of using Celery task, directly create snapshot
-            stock_value = portfolio.total_stock_value
-            total_value = portfolio.total_value
-            
-            PortfolioSnapshot.objects.create(
-                portfolio=portfolio,
-                cash_balance=portfolio.cash_balance,
-                stock_value=stock_value,
-                total_value=total_value
-            )
+            capture_portfolio_snapshot(portfolio)
             return Response({'status': 'snapshot created'}, status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class PositionViewSet(viewsets.ReadOnlyModelViewSet):
+class PositionViewSet(ShardedViewMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = PositionSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Position.objects.filter(portfolio__user=self.request.user)
+        return Position.objects.filter(portfolio__user=self.request.user).select_related('stock')
+
+class DashboardView(ShardedViewMixin, APIView):
+    """
+    Everything the landing page needs in one request
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        return Response(get_dashboard(request.user))
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from portfolios.admin import ShardedAdmin
+from .models import SymbolExposure, RiskAlert
+
+@admin.register(SymbolExposure)
+class SymbolExposureAdmin(ShardedAdmin):
+    list_display = ['stock', 'quantity', 'holders', 'last_price', 'notional', 'updated_at']
+    list_select_related = ['stock']
+    search_fields = ['stock__symbol']
+    ordering = ['-notional']
+
+@admin.register(RiskAlert)
+class RiskAlertAdmin(admin.ModelAdmin):
+    list_display = ['stock', 'kind', 'threshold', 'value', 'opened_at', 'cleared_at']
+    list_select_related = ['stock']
+    list_filter = ['kind', 'cleared_at']
+    search_fields = ['stock__symbol']
@@ -0,0 +1,180 @@
+import logging
+from decimal import Decimal
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Sum, Value, When
+from django.utils import timezone
+from portfolios.models import Position
+from portfolios.sharding import current_database, for_each_shard
+from .models import SymbolExposure, RiskAlert
+
+logger = logging.getLogger(__name__)
+
+# Per-symbol exposure aggregates
+#
+# Trade views call record_fill() inside the trade's transaction and price
+# updates call reprice(). Both are single UPDATE statements relative to the
+# stored values, so concurrent fills on one symbol serialize on its row
+# without losing updates. With sharding each shard keeps the aggregates of
+# its own holders, updated in the trade's commit on that shard, and reports
+# add the shards up. rebuild_exposures() recomputes everything from Position
+# and is only needed to seed the table or reconcile drift.
+
+NOTIONAL_FIELD = DecimalField(max_digits=20, decimal_places=2)
+
+def record_fill(stock, quantity_delta, holder_delta=0):
+    """
+    Apply a fill at the stock's current price on the active shard.
+    holder_delta is +1 when the fill opened a position and -1 when it closed one.
+    """
+    price = stock.last_price
+    now = timezone.now()
+    quantity = F('quantity') + quantity_delta
+    updated = SymbolExposure.objects.filter(stock_id=stock.id).update(
+        quantity=quantity,
+        holders=F('holders') + holder_delta,
+        last_price=price,
+        notional=ExpressionWrapper(quantity * price, output_field=NOTIONAL_FIELD),
+        updated_at=now
+    )
+    if updated:
+        return
+    try:
+        # First fill for this symbol; the savepoint keeps a lost race recoverable
+        with transaction.atomic(using=current_database()):
+            SymbolExposure.objects.create(stock_id=stock.id, quantity=quantity_delta, holders=holder_delta,
+                                          last_price=price, notional=quantity_delta * price, updated_at=now)
+    except IntegrityError:
+        record_fill(stock, quantity_delta, holder_delta)
+
+def reprice(prices, batch_size=500):
+    """
+    Revalue exposures on every shard from a {stock_id: price} mapping, one
+    UPDATE per batch
+    """
+    stock_ids = list(prices)
+    now = timezone.now()
+
+    def reprice_shard():
+        for start in range(0, len(stock_ids), batch_size):
+            batch = stock_ids[start:start + batch_size]
+            price = Case(*[When(stock_id=stock_id, then=Value(prices[stock_id])) for stock_id in batch],
+                         output_field=DecimalField(max_digits=15, decimal_places=2))
+            SymbolExposure.objects.filter(stock_id__in=batch).update(
+                last_price=price,
+                notional=ExpressionWrapper(F('quantity') * price, output_field=NOTIONAL_FIELD),
+                updated_at=now
+            )
+
+    for_each_shard(reprice_shard)
+
+def rebuild_exposures(stock_ids=None):
+    """
+    Recompute aggregates from Position in one grouped query per shard, for
+    every symbol or just `stock_ids`. Returns the symbols held.
+    """
+    now = timezone.now()
+
+    def rebuild_shard():
+        existing = SymbolExposure.objects.all()
+        positions = Position.objects.all()
+        if stock_ids is not None:
+            existing = existing.filter(stock_id__in=stock_ids)
+            positions = positions.filter(stock_id__in=stock_ids)
+        exposures = [
+            SymbolExposure(stock_id=row['stock_id'], quantity=row['total'], holders=row['holder_count'],
+                           last_price=row['stock__last_price'], notional=row['total'] * row['stock__last_price'],
+                           updated_at=now)
+            for row in (positions
+                        .values('stock_id', 'stock__last_price')
+                        .annotate(total=Sum('quantity'), holder_count=Count('id')))
+        ]
+        with transaction.atomic(using=current_database()):
+            existing.delete()
+            SymbolExposure.objects.bulk_create(exposures, batch_size=1000)
+        return {exposure.stock_id for exposure in exposures}
+
+    return len(set().union(*for_each_shard(rebuild_shard)))
+
+def book_exposures(symbol=None):
+    """
+    Open exposures across the whole book, largest notional first; with
+    sharding, each symbol's rows from every shard added up
+    """
+    def shard_exposures():
+        exposures = SymbolExposure.objects.filter(quantity__gt=0).select_related('stock')
+        if symbol:
+            exposures = exposures.filter(stock__symbol=symbol)
+        return list(exposures)
+
+    merged = {}
+    for exposures in for_each_shard(shard_exposures):
+        for exposure in exposures:
+            total = merged.get(exposure.stock_id)
+            if total is None:
+                merged[exposure.stock_id] = exposure
+                continue
+            total.quantity += exposure.quantity
+            total.holders += exposure.holders
+            total.notional += exposure.notional
+            if exposure.updated_at > total.updated_at:
+                total.last_price, total.updated_at = exposure.last_price, exposure.updated_at
+    return sorted(merged.values(), key=lambda exposure: exposure.notional, reverse=True)
+
+def concentration_report(top=10):
+    """
+    Share of the book held in each of the largest symbols, plus the
+    Herfindahl index over all symbols (1.0 means a single-symbol book)
+    """
+    exposures = book_exposures()
+    total = sum((exposure.notional for exposure in exposures), Decimal('0'))
+    shares = [exposure.notional / total if total else Decimal('0') for exposure in exposures]
+    return {
+        'total_notional': total,
+        'symbols': len(exposures),
+        'herfindahl_index': round(sum(share * share for share in shares), 6),
+        'top_share': round(sum(shares[:top]), 6),
+        'top': [
+            {
+                'symbol': exposure.stock.symbol,
+                'notional': exposure.notional,
+                'share': round(share, 6),
+                'holders': exposure.holders,
+            }
+            for exposure, share in zip(exposures[:top], shares)
+        ],
+    }
+
+def check_thresholds():
+    """
+    Open an alert for every symbol over a limit and clear alerts for
+    symbols that are back under it. Returns (opened, cleared).
+    """
+    notional_limit = Decimal(str(settings.RISK_SYMBOL_NOTIONAL_LIMIT))
+    concentration_limit = Decimal(str(settings.RISK_CONCENTRATION_LIMIT))
+    exposures = book_exposures()
+    total = sum((exposure.notional for exposure in exposures), Decimal('0'))
+
+    breaches = {}
+    for exposure in exposures:
+        if notional_limit and exposure.notional > notional_limit:
+            breaches[(exposure.stock_id, RiskAlert.NOTIONAL)] = (exposure, notional_limit, exposure.notional)
+        share = exposure.notional / total if total else Decimal('0')
+        if concentration_limit and share > concentration_limit:
+            breaches[(exposure.stock_id, RiskAlert.CONCENTRATION)] = (exposure, concentration_limit, share)
+
+    open_alerts = {(alert.stock_id, alert.kind): alert
+                   for alert in RiskAlert.objects.filter(cleared_at__isnull=True)}
+
+    opened = []
+    for key, (exposure, threshold, value) in breaches.items():
+        if key not in open_alerts:
+            opened.append(RiskAlert(stock=exposure.stock, kind=key[1], threshold=threshold,
+                                    value=round(value, 4)))
+            logger.warning("Risk limit crossed: %s %s %s > %s", exposure.stock.symbol, key[1], value, threshold)
+    cleared = [alert.id for key, alert in open_alerts.items() if key not in breaches]
+
+    with transaction.atomic():
+        RiskAlert.objects.bulk_create(opened)
+        RiskAlert.objects.filter(id__in=cleared).update(cleared_at=timezone.now())
+    return len(opened), len(cleared)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from risk.exposure import check_thresholds, rebuild_exposures
+
+class Command(BaseCommand):
+    help = "Recompute per-symbol exposure aggregates from positions (seeding or reconciliation)"
+
+    def handle(self, *args, **options):
+        symbols = rebuild_exposures()
+        opened, cleared = check_thresholds()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt exposure for {symbols} symbols; opened {opened} and cleared {cleared} alerts"
+        ))
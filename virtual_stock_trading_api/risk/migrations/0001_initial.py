@@ -0,0 +1,46 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:31
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('stocks', '0003_watchlists'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SymbolExposure',
+            fields=[
+                ('stock', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='exposure', serialize=False, to='stocks.stock')),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('holders', models.IntegerField(default=0)),
+                ('last_price', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('notional', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20)),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-notional'], name='risk_symbol_notiona_5116f0_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RiskAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('notional', 'Symbol notional'), ('concentration', 'Book concentration')], max_length=20)),
+                ('threshold', models.DecimalField(decimal_places=4, max_digits=20)),
+                ('value', models.DecimalField(decimal_places=4, max_digits=20)),
+                ('opened_at', models.DateTimeField(auto_now_add=True)),
+                ('cleared_at', models.DateTimeField(blank=True, null=True)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='risk_alerts', to='stocks.stock')),
+            ],
+            options={
+                'ordering': ['-opened_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import models
+from decimal import Decimal
+from stocks.models import Stock
+
+# Risk models
+class SymbolExposure(models.Model):
+    """
+    Book-wide holdings of one symbol, maintained incrementally on every
+    fill and price update so reports never scan Position. With sharding,
+    each shard holds the part of its own holders.
+    """
+    stock = models.OneToOneField(Stock, on_delete=models.CASCADE, primary_key=True, related_name='exposure')
+    quantity = models.BigIntegerField(default=0)
+    holders = models.IntegerField(default=0)
+    last_price = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    notional = models.DecimalField(max_digits=20, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-notional']),
+        ]
+
+    def __str__(self):
+        return f"{self.stock.symbol}: {self.quantity} shares, ${self.notional}"
+
+class RiskAlert(models.Model):
+    NOTIONAL = 'notional'
+    CONCENTRATION = 'concentration'
+
+    KINDS = [
+        (NOTIONAL, 'Symbol notional'),
+        (CONCENTRATION, 'Book concentration'),
+    ]
+
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='risk_alerts')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    threshold = models.DecimalField(max_digits=20, decimal_places=4)
+    value = models.DecimalField(max_digits=20, decimal_places=4)
+    opened_at = models.DateTimeField(auto_now_add=True)
+    cleared_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-opened_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} alert for {self.stock.symbol}: {self.value} > {self.threshold}"
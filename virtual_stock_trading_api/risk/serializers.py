@@ -0,0 +1,16 @@
+from rest_framework import serializers
+from .models import SymbolExposure, RiskAlert
+
+class SymbolExposureSerializer(serializers.ModelSerializer):
+    symbol = serializers.CharField(source='stock.symbol')
+
+    class Meta:
+        model = SymbolExposure
+        fields = ['symbol', 'quantity', 'holders', 'last_price', 'notional', 'updated_at']
+
+class RiskAlertSerializer(serializers.ModelSerializer):
+    symbol = serializers.CharField(source='stock.symbol')
+
+    class Meta:
+        model = RiskAlert
+        fields = ['id', 'symbol', 'kind', 'threshold', 'value', 'opened_at', 'cleared_at']
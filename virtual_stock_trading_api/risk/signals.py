@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from portfolios.models import Portfolio, Position
+from portfolios.sharding import use_shard
+from stocks.models import Stock
+from stocks.signals import prices_updated
+from .exposure import record_fill, reprice
+
+# Keep exposures in step with price changes and deleted portfolios.
+# Fills are applied by the trade views themselves.
+
+@receiver(post_save, sender=Stock)
+def reprice_saved_stock(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        reprice({instance.id: instance.last_price})
+
+@receiver(prices_updated, sender=Stock)
+def reprice_refreshed_stocks(sender, prices, **kwargs):
+    reprice(prices)
+
+@receiver(pre_delete, sender=Portfolio)
+def release_portfolio_exposure(sender, instance, **kwargs):
+    # The exposures live on the portfolio's shard, next to its positions
+    with use_shard(instance._state.db):
+        for position in Position.objects.using(instance._state.db).filter(portfolio=instance).select_related('stock'):
+            record_fill(position.stock, -position.quantity, holder_delta=-1)
@@ -0,0 +1,11 @@
+from celery import shared_task
+from virtual_stock_trading_api.celery import app  # noqa: F401 (binds shared_task to the project app)
+from .exposure import check_thresholds
+
+@shared_task
+def check_risk_thresholds():
+    """
+    Open and clear risk alerts from the current exposure aggregates
+    """
+    opened, cleared = check_thresholds()
+    return f"Opened {opened} and cleared {cleared} risk alerts"
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import ExposureListView, ConcentrationView, RiskAlertListView
+
+urlpatterns = [
+    path('exposures/', ExposureListView.as_view(), name='risk-exposures'),
+    path('concentration/', ConcentrationView.as_view(), name='risk-concentration'),
+    path('alerts/', RiskAlertListView.as_view(), name='risk-alerts'),
+]
@@ -0,0 +1,42 @@
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .exposure import book_exposures, concentration_report
+from .models import RiskAlert
+from .serializers import SymbolExposureSerializer, RiskAlertSerializer
+
+# Risk API views (operations only)
+
+class ExposureListView(generics.ListAPIView):
+    """
+    Per-symbol exposure across all portfolios, largest notional first
+    """
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = SymbolExposureSerializer
+
+    def get_queryset(self):
+        symbol = self.request.query_params.get('symbol')
+        return book_exposures(symbol.upper() if symbol else None)
+
+class ConcentrationView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            top = max(1, int(request.query_params.get('top', 10)))
+        except ValueError:
+            return Response({"error": "top must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(concentration_report(top))
+
+class RiskAlertListView(generics.ListAPIView):
+    """
+    Open alerts; pass ?all=true to include cleared ones
+    """
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = RiskAlertSerializer
+
+    def get_queryset(self):
+        alerts = RiskAlert.objects.select_related('stock')
+        if self.request.query_params.get('all') != 'true':
+            alerts = alerts.filter(cleared_at__isnull=True)
+        return alerts
@@ -1,8 +1,29 @@
 from django.contrib import admin
-from .models import Stock
+from .models import Stock, PriceBar, Watchlist, CorporateAction
 
 @admin.register(Stock)
 class StockAdmin(admin.ModelAdmin):
     list_display = ['symbol', 'company_name', 'last_price', 'last_updated']
     search_fields = ['symbol', 'company_name']
     list_filter = ['last_updated']
+
+@admin.register(PriceBar)
+class PriceBarAdmin(admin.ModelAdmin):
+    list_display = ['stock', 'date', 'open', 'high', 'low', 'close', 'volume']
+    search_fields = ['stock__symbol']
+    list_filter = ['date']
+
+@admin.register(Watchlist)
+class WatchlistAdmin(admin.ModelAdmin):
+    list_display = ['name', 'user', 'created_at']
+    search_fields = ['name', 'user__username']
+    filter_horizontal = ['stocks']
+
+@admin.register(CorporateAction)
+class CorporateActionAdmin(admin.ModelAdmin):
+    list_display = ['stock', 'kind', 'ex_date', 'split_to', 'split_from', 'cash_per_share',
+                    'status', 'holders_processed', 'applied_at']
+    list_select_related = ['stock']
+    list_filter = ['kind', 'status']
+    search_fields = ['stock__symbol']
+    readonly_fields = ['status', 'reference_price', 'cursor', 'holders_processed', 'started_at', 'applied_at']
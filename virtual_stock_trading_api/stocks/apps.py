@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class StocksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'stocks'
+
+    def ready(self):
+        from django.conf import settings
+        if settings.PROFILE_CACHE_PREWARM:
+            # Warm on the first request of each worker rather than at import
+            # time, so management commands like migrate never touch the table
+            request_started.connect(prewarm_profile_cache, dispatch_uid='stocks.prewarm_profile_cache')
+
+
+def prewarm_profile_cache(sender, **kwargs):
+    from .cache import prewarm
+    request_started.disconnect(dispatch_uid='stocks.prewarm_profile_cache')
+    prewarm()
@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.core.cache import cache
+from .models import Stock
+
+# Company profile cache
+#
+# Profiles barely change, so they are kept for a long time. Symbols Finnhub
+# doesn't know are cached as a NOT_FOUND marker for a shorter time so typos
+# and delisted symbols stop costing upstream calls.
+#
+# Quotes fetched by the watchlist refresh cycle are cached under their own
+# prefix so watchlist reads don't need to go upstream.
+
+KEY_PREFIX = 'stock:profile:'
+QUOTE_PREFIX = 'stock:quote:'
+STATS_PREFIX = 'stock:profile:stats:'
+NOT_FOUND = {'__not_found__': True}
+MISS = object()
+
+def profile_key(symbol):
+    return f"{KEY_PREFIX}{symbol.upper()}"
+
+def _count(stat):
+    key = f"{STATS_PREFIX}{stat}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Missing key; add() keeps concurrent first increments from clobbering each other
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+def get_profile(symbol):
+    """
+    Cached profile dict, None for a known-unknown symbol, or MISS
+    """
+    profile = cache.get(profile_key(symbol), MISS)
+    if profile is MISS:
+        _count('misses')
+        return MISS
+    if profile == NOT_FOUND:
+        _count('negative_hits')
+        return None
+    _count('hits')
+    return profile
+
+def is_known_missing(symbol):
+    return get_profile(symbol) is None
+
+def set_profile(symbol, profile):
+    cache.set(profile_key(symbol), profile, timeout=settings.PROFILE_CACHE_TTL)
+
+def set_not_found(symbol):
+    cache.set(profile_key(symbol), NOT_FOUND, timeout=settings.PROFILE_NEGATIVE_CACHE_TTL)
+
+def prewarm(batch_size=500):
+    """
+    Seed the cache from the Stock table, skipping symbols already cached
+    """
+    warmed = 0
+    stocks = Stock.objects.exclude(company_name='').values_list('symbol', 'company_name')
+    batch = {}
+    for symbol, name in stocks.iterator(chunk_size=batch_size):
+        batch[profile_key(symbol)] = {'ticker': symbol, 'name': name}
+        if len(batch) >= batch_size:
+            warmed += _fill_missing(batch)
+            batch = {}
+    if batch:
+        warmed += _fill_missing(batch)
+    return warmed
+
+def _fill_missing(batch):
+    cached = cache.get_many(list(batch))
+    missing = {key: value for key, value in batch.items() if key not in cached}
+    cache.set_many(missing, timeout=settings.PROFILE_CACHE_TTL)
+    return len(missing)
+
+def stats():
+    values = cache.get_many([f"{STATS_PREFIX}{stat}" for stat in ('hits', 'negative_hits', 'misses')])
+    hits = values.get(f"{STATS_PREFIX}hits", 0)
+    negative_hits = values.get(f"{STATS_PREFIX}negative_hits", 0)
+    misses = values.get(f"{STATS_PREFIX}misses", 0)
+    lookups = hits + negative_hits + misses
+    return {
+        'hits': hits,
+        'negative_hits': negative_hits,
+        'misses': misses,
+        'hit_ratio': (hits + negative_hits) / lookups if lookups else 0.0,
+    }
+
+def quote_key(symbol):
+    return f"{QUOTE_PREFIX}{symbol.upper()}"
+
+def set_quotes(quotes):
+    """
+    Cache a {symbol: quote} mapping in one round trip
+    """
+    cache.set_many({quote_key(symbol): quote for symbol, quote in quotes.items()},
+                   timeout=settings.QUOTE_CACHE_TTL)
+
+def get_quotes(symbols):
+    """
+    Cached quotes for the given symbols in one round trip
+    """
+    cached = cache.get_many([quote_key(symbol) for symbol in symbols])
+    return {key[len(QUOTE_PREFIX):]: quote for key, quote in cached.items()}
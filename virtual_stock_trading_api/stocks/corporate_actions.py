@@ -0,0 +1,141 @@
+import csv
+import datetime
+import json
+import os
+import random
+import zlib
+from decimal import Decimal
+from django.conf import settings
+from django.utils import timezone
+from portfolios.sharding import mirror
+from .models import Stock, CorporateAction
+
+# Corporate action feeds
+#
+# Providers return events as dicts of {symbol, kind, ex_date, split_to,
+# split_from, cash_per_share}. Ingestion is idempotent: an event is keyed
+# by (stock, kind, ex_date), so re-reading a feed never duplicates it.
+# Applying events to holders lives in portfolios.corporate_actions.
+
+class CorporateActionProvider:
+    name = ''
+
+    def available(self):
+        """
+        Whether there is a feed to read right now
+        """
+        return True
+
+    def fetch(self):
+        raise NotImplementedError
+
+def parse_event(row):
+    """
+    Normalise one feed row. Splits give `ratio` as "N:M" (N new shares for
+    every M held) or split_to/split_from; dividends give `amount` per share.
+    """
+    kind = row['kind' if 'kind' in row else 'type'].strip().lower()
+    if kind not in (CorporateAction.SPLIT, CorporateAction.DIVIDEND):
+        raise ValueError(f"Unknown corporate action type: {kind}")
+    event = {
+        'symbol': row['symbol'].strip().upper(),
+        'kind': kind,
+        'ex_date': datetime.date.fromisoformat(str(row['ex_date']).strip()),
+        'split_to': 1,
+        'split_from': 1,
+        'cash_per_share': Decimal('0'),
+    }
+    if kind == CorporateAction.SPLIT:
+        if row.get('ratio'):
+            split_to, split_from = str(row['ratio']).split(':')
+        else:
+            split_to, split_from = row['split_to'], row['split_from']
+        event['split_to'], event['split_from'] = int(split_to), int(split_from)
+        if event['split_to'] <= 0 or event['split_from'] <= 0:
+            raise ValueError(f"Invalid split ratio for {event['symbol']}")
+    else:
+        event['cash_per_share'] = Decimal(str(row['amount' if 'amount' in row else 'cash_per_share']))
+    return event
+
+class FileProvider(CorporateActionProvider):
+    """
+    Local CSV (header: symbol,type,ex_date,ratio,amount) or JSON lines file
+    """
+    name = 'file'
+
+    def __init__(self, path):
+        self.path = path
+
+    def available(self):
+        return os.path.exists(self.path)
+
+    def fetch(self):
+        with open(self.path, newline='', encoding='utf-8') as fh:
+            if self.path.endswith(('.jsonl', '.json')):
+                rows = [json.loads(line) for line in fh if line.strip()]
+            else:
+                rows = list(csv.DictReader(fh))
+        return [parse_event(row) for row in rows]
+
+class StubProvider(CorporateActionProvider):
+    """
+    Deterministic synthetic feed for development: a quarterly dividend for
+    most symbols and an occasional split, derived from the symbol and seed
+    """
+    name = 'stub'
+
+    def __init__(self, symbols, seed=0, as_of=None):
+        self.symbols = symbols
+        self.seed = seed
+        self.as_of = as_of or timezone.localdate()
+
+    def fetch(self):
+        events = []
+        quarter_start = datetime.date(self.as_of.year, 3 * ((self.as_of.month - 1) // 3) + 1, 1)
+        for symbol in self.symbols:
+            rng = random.Random(zlib.crc32(f"{self.seed}:{symbol}".encode()))
+            ex_date = quarter_start + datetime.timedelta(days=rng.randint(0, 27))
+            if ex_date > self.as_of:
+                continue
+            if rng.random() < 0.8:
+                events.append({
+                    'symbol': symbol, 'kind': CorporateAction.DIVIDEND, 'ex_date': ex_date,
+                    'split_to': 1, 'split_from': 1,
+                    'cash_per_share': Decimal(rng.randint(5, 150)).scaleb(-2),
+                })
+            if rng.random() < 0.05:
+                split_to, split_from = rng.choice([(2, 1), (3, 1), (4, 1), (3, 2), (1, 10)])
+                events.append({
+                    'symbol': symbol, 'kind': CorporateAction.SPLIT, 'ex_date': ex_date,
+                    'split_to': split_to, 'split_from': split_from, 'cash_per_share': Decimal('0'),
+                })
+        return events
+
+def build_provider(kind=None, path=None):
+    kind = kind or settings.CORPORATE_ACTIONS_PROVIDER
+    if kind == 'file':
+        return FileProvider(path or settings.CORPORATE_ACTIONS_PATH)
+    if kind == 'stub':
+        symbols = list(Stock.objects.filter(positions__isnull=False).distinct().values_list('symbol', flat=True))
+        return StubProvider(symbols, seed=settings.SYNTHETIC_MARKET_SEED)
+    raise ValueError(f"Unknown CORPORATE_ACTIONS_PROVIDER: {kind}")
+
+def ingest(provider):
+    """
+    Store new events from a provider. Returns (new, unknown symbols).
+    """
+    events = provider.fetch()
+    stocks = dict(Stock.objects
+                  .filter(symbol__in={event['symbol'] for event in events})
+                  .values_list('symbol', 'id'))
+    unknown = sorted({event['symbol'] for event in events if event['symbol'] not in stocks})
+    actions = [
+        CorporateAction(stock_id=stocks[event['symbol']], kind=event['kind'], ex_date=event['ex_date'],
+                        split_to=event['split_to'], split_from=event['split_from'],
+                        cash_per_share=event['cash_per_share'], source=provider.name)
+        for event in events if event['symbol'] in stocks
+    ]
+    before = CorporateAction.objects.count()
+    CorporateAction.objects.bulk_create(actions, ignore_conflicts=True, batch_size=1000)
+    mirror(CorporateAction, CorporateAction.objects.filter(stock_id__in=stocks.values()))
+    return CorporateAction.objects.count() - before, unknown
@@ -0,0 +1,91 @@
+import json
+import random
+import statistics
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from django.core.management.base import BaseCommand
+from stocks.providers import FinnhubProvider, HedgedProvider
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Finnhub-shaped quote endpoint with a configurable slow tail and error rate
+    """
+    def do_GET(self):
+        server = self.server
+        if random.random() < server.error_rate:
+            self.send_response(500)
+            self.end_headers()
+            return
+        delay = server.slow_latency if random.random() < server.slow_rate else server.base_latency
+        time.sleep(delay * random.uniform(0.8, 1.2))
+        body = json.dumps({'c': 100.0, 'd': 0.0, 'dp': 0.0, 'h': 100.0, 'l': 100.0,
+                           'o': 100.0, 'pc': 100.0, 't': int(time.time())}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_stand_in(base_latency, slow_latency, slow_rate, error_rate):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    server.base_latency = base_latency
+    server.slow_latency = slow_latency
+    server.slow_rate = slow_rate
+    server.error_rate = error_rate
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000
+    return f"p50={pick(50):.1f}ms p95={pick(95):.1f}ms p99={pick(99):.1f}ms mean={statistics.mean(ordered) * 1000:.1f}ms"
+
+class Command(BaseCommand):
+    help = "Compare single-provider and hedged quote latency against local stand-in servers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--servers', type=int, default=3)
+        parser.add_argument('--base-latency', type=float, default=0.01)
+        parser.add_argument('--slow-latency', type=float, default=0.3)
+        parser.add_argument('--slow-rate', type=float, default=0.05)
+        parser.add_argument('--error-rate', type=float, default=0.01)
+        parser.add_argument('--dead-servers', type=int, default=1,
+                            help="Extra endpoints that refuse connections, to exercise the circuit breakers")
+
+    def handle(self, *args, **options):
+        servers = [
+            start_stand_in(options['base_latency'], options['slow_latency'],
+                           options['slow_rate'], options['error_rate'])
+            for _ in range(options['servers'])
+        ]
+        urls = [f"http://127.0.0.1:{server.server_address[1]}" for server in servers]
+        # Nothing listens on port 9 locally, so these fail fast
+        dead = [f"http://127.0.0.1:9/dead{i}" for i in range(options['dead_servers'])]
+
+        single = FinnhubProvider('bench-key', base_url=urls[0], timeout=5)
+        hedged = HedgedProvider(
+            [FinnhubProvider(f'bench-key-{i}', base_url=url, timeout=5) for i, url in enumerate(urls + dead)],
+            max_attempts=2, failure_threshold=3, cooldown=30
+        )
+
+        for label, provider in [('single', single), ('hedged', hedged)]:
+            latencies = []
+            failures = 0
+            for _ in range(options['requests']):
+                started = time.monotonic()
+                if provider.get_quote('BENCH') is None:
+                    failures += 1
+                latencies.append(time.monotonic() - started)
+            self.stdout.write(f"{label:>7}: {summarize(latencies)} failures={failures}")
+
+        open_breakers = sum(1 for _, breaker, _ in hedged.members if breaker.is_open)
+        self.stdout.write(f"Open circuit breakers after the run: {open_breakers}")
+
+        for server in servers:
+            server.shutdown()
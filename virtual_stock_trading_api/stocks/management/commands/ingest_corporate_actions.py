@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from stocks.corporate_actions import build_provider, ingest
+
+class Command(BaseCommand):
+    help = "Load split and dividend events from the corporate actions feed (idempotent)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provider', choices=['file', 'stub'], default=None)
+        parser.add_argument('--path', default=None, help="CSV or JSON lines file for the file provider")
+
+    def handle(self, *args, **options):
+        created, unknown = ingest(build_provider(options['provider'], options['path']))
+        if unknown:
+            self.stdout.write(self.style.WARNING(f"Skipped unknown symbols: {', '.join(unknown)}"))
+        self.stdout.write(self.style.SUCCESS(f"Stored {created} new corporate actions"))
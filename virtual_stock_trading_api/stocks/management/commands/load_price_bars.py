@@ -0,0 +1,77 @@
+import csv
+import datetime
+import random
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from stocks.models import Stock, PriceBar
+
+class Command(BaseCommand):
+    help = "Load daily price bars from a CSV file or generate a synthetic random-walk dataset"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', help="CSV with symbol,date,open,high,low,close,volume columns")
+        parser.add_argument('--synthetic', nargs='+', metavar='SYMBOL',
+                            help="Generate synthetic bars for these symbols")
+        parser.add_argument('--days', type=int, default=500)
+        parser.add_argument('--end', type=datetime.date.fromisoformat, default=None,
+                            help="Last bar date for synthetic data (YYYY-MM-DD, default today)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['csv']:
+            rows = self.read_csv(options['csv'])
+        elif options['synthetic']:
+            rows = self.synthetic_rows(options['synthetic'], options['days'],
+                                       options['end'] or datetime.date.today(), options['seed'])
+        else:
+            raise CommandError("Pass --csv FILE or --synthetic SYMBOL [SYMBOL ...]")
+
+        stocks = {}
+        batch = []
+        loaded = 0
+        for symbol, date, open_, high, low, close, volume in rows:
+            if symbol not in stocks:
+                stocks[symbol], _ = Stock.objects.get_or_create(
+                    symbol=symbol, defaults={'company_name': symbol}
+                )
+            batch.append(PriceBar(stock=stocks[symbol], date=date, open=open_, high=high,
+                                  low=low, close=close, volume=volume))
+            if len(batch) >= options['batch_size']:
+                PriceBar.objects.bulk_create(batch, ignore_conflicts=True)
+                loaded += len(batch)
+                batch = []
+        if batch:
+            PriceBar.objects.bulk_create(batch, ignore_conflicts=True)
+            loaded += len(batch)
+
+        # Give symbols without a quote a tradable price from their newest bar
+        for stock in stocks.values():
+            latest = stock.bars.order_by('-date').first()
+            if latest and stock.last_price == Decimal('0.00'):
+                stock.last_price = latest.close
+                stock.save()
+
+        self.stdout.write(self.style.SUCCESS(f"Loaded {loaded} bars for {len(stocks)} symbols"))
+
+    def read_csv(self, path):
+        with open(path, newline='') as fh:
+            for row in csv.DictReader(fh):
+                yield (row['symbol'].upper(), datetime.date.fromisoformat(row['date']),
+                       Decimal(row['open']), Decimal(row['high']), Decimal(row['low']),
+                       Decimal(row['close']), int(row.get('volume') or 0))
+
+    def synthetic_rows(self, symbols, days, end, seed):
+        rng = random.Random(seed)
+        cent = Decimal('0.01')
+        for symbol in symbols:
+            price = rng.uniform(20, 300)
+            for offset in range(days - 1, -1, -1):
+                open_ = price
+                price = max(1.0, price * (1 + rng.gauss(0.0003, 0.02)))
+                high = max(open_, price) * (1 + abs(rng.gauss(0, 0.005)))
+                low = min(open_, price) * (1 - abs(rng.gauss(0, 0.005)))
+                yield (symbol.upper(), end - datetime.timedelta(days=offset),
+                       Decimal(open_).quantize(cent), Decimal(high).quantize(cent),
+                       Decimal(low).quantize(cent), Decimal(price).quantize(cent),
+                       int(rng.uniform(1e5, 5e6)))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from portfolios.sharding import mirror
+from stocks.models import Stock
+from stocks.providers import get_provider, RandomWalkProvider
+
+class Command(BaseCommand):
+    help = "Create Stock rows for the synthetic random-walk universe so the stack can be load tested offline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        provider = get_provider()
+        inner = getattr(provider, 'inner', provider)
+        if not isinstance(inner, RandomWalkProvider):
+            raise CommandError("Set MARKET_DATA_PROVIDER=random_walk to seed a synthetic market")
+
+        stocks = []
+        for symbol in inner.universe():
+            quote = inner.get_quote(symbol)
+            profile = inner.get_company_profile(symbol)
+            stocks.append(Stock(symbol=symbol, company_name=profile['name'], last_price=quote['c']))
+        Stock.objects.bulk_create(stocks, batch_size=options['batch_size'], ignore_conflicts=True)
+        mirror(Stock, Stock.objects.filter(symbol__in=[stock.symbol for stock in stocks]))
+        self.stdout.write(self.style.SUCCESS(f"Seeded {len(stocks)} synthetic symbols"))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from stocks.cache import prewarm, stats
+
+class Command(BaseCommand):
+    help = "Seed the company profile cache from the Stock table"
+
+    def handle(self, *args, **options):
+        warmed = prewarm()
+        self.stdout.write(self.style.SUCCESS(f"Cached {warmed} company profiles"))
+        self.stdout.write(f"Profile cache stats: {stats()}")
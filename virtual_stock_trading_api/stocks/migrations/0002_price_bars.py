@@ -0,0 +1,31 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('open', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('close', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('volume', models.BigIntegerField(default=0)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bars', to='stocks.stock')),
+            ],
+            options={
+                'ordering': ['date'],
+                'unique_together': {('stock', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('stocks', '0002_price_bars'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Watchlist',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('stocks', models.ManyToManyField(blank=True, related_name='watchlists', to='stocks.stock')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watchlists', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:43
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0003_watchlists'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorporateAction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('split', 'Split'), ('dividend', 'Cash dividend')], max_length=10)),
+                ('ex_date', models.DateField()),
+                ('split_to', models.PositiveIntegerField(default=1)),
+                ('split_from', models.PositiveIntegerField(default=1)),
+                ('cash_per_share', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=12)),
+                ('source', models.CharField(blank=True, max_length=50)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('applied', 'Applied')], default='pending', max_length=10)),
+                ('reference_price', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('cursor', models.BigIntegerField(default=0)),
+                ('holders_processed', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('applied_at', models.DateTimeField(blank=True, null=True)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='corporate_actions', to='stocks.stock')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'ex_date'], name='corpaction_status_idx')],
+                'unique_together': {('stock', 'kind', 'ex_date')},
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.auth.models import User
 from decimal import Decimal
 
 
@@ -11,3 +12,81 @@ class Stock(models.Model):
     
     def __str__(self):
         return f"{self.symbol} - {self.company_name}"
+
+class PriceBar(models.Model):
+    """
+    Daily OHLCV bar for a stock
+    """
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='bars')
+    date = models.DateField()
+    open = models.DecimalField(max_digits=15, decimal_places=2)
+    high = models.DecimalField(max_digits=15, decimal_places=2)
+    low = models.DecimalField(max_digits=15, decimal_places=2)
+    close = models.DecimalField(max_digits=15, decimal_places=2)
+    volume = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('stock', 'date')
+        ordering = ['date']
+    
+    def __str__(self):
+        return f"{self.stock.symbol} {self.date} close {self.close}"
+
+class Watchlist(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='watchlists')
+    name = models.CharField(max_length=100)
+    stocks = models.ManyToManyField(Stock, related_name='watchlists', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.user.username})"
+
+class CorporateAction(models.Model):
+    """
+    A split or cash dividend for a stock, applied to every holder by
+    portfolios.corporate_actions. An N-for-M split turns M shares into N.
+    """
+    SPLIT = 'split'
+    DIVIDEND = 'dividend'
+    KINDS = [
+        (SPLIT, 'Split'),
+        (DIVIDEND, 'Cash dividend'),
+    ]
+    
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    APPLIED = 'applied'
+    STATUSES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (APPLIED, 'Applied'),
+    ]
+    
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='corporate_actions')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    ex_date = models.DateField()
+    split_to = models.PositiveIntegerField(default=1)
+    split_from = models.PositiveIntegerField(default=1)
+    cash_per_share = models.DecimalField(max_digits=12, decimal_places=4, default=Decimal('0'))
+    source = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    # Price used for cash in lieu of fractional shares, fixed when processing starts
+    reference_price = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    # Holders are processed in portfolio id order; the last one done
+    cursor = models.BigIntegerField(default=0)
+    holders_processed = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    applied_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ('stock', 'kind', 'ex_date')
+        indexes = [
+            models.Index(fields=['status', 'ex_date'], name='corpaction_status_idx'),
+        ]
+    
+    def __str__(self):
+        if self.kind == self.SPLIT:
+            return f"{self.stock.symbol} {self.split_to}-for-{self.split_from} split on {self.ex_date}"
+        return f"{self.stock.symbol} ${self.cash_per_share} dividend on {self.ex_date}"
@@ -0,0 +1,367 @@
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Market data providers
+#
+# FinnhubService delegates to one of these. All providers return
+# Finnhub-shaped payloads: quotes as {'c', 'd', 'dp', 'h', 'l', 'o', 'pc', 't'}
+# and profiles as {'name', 'ticker', ...}. They return None when the upstream
+# call fails and an empty dict for a profile the provider doesn't know.
+
+class MarketDataProvider:
+    def get_quote(self, symbol):
+        raise NotImplementedError
+
+    def get_company_profile(self, symbol):
+        raise NotImplementedError
+
+class FinnhubProvider(MarketDataProvider):
+    """
+    Live Finnhub REST API
+    """
+    def __init__(self, api_key, base_url="https://finnhub.io/api/v1", timeout=10):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def _get(self, path, symbol, label):
+        import requests
+        endpoint = f"{self.base_url}/{path}"
+        params = {
+            'symbol': symbol.upper(),
+            'token': self.api_key
+        }
+
+        try:
+            response = requests.get(endpoint, params=params, timeout=self.timeout)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                print(f"Error getting {label}: {response.status_code} - {response.text}")
+                return None
+        except Exception as e:
+            print(f"Exception getting {label}: {str(e)}")
+            return None
+
+    def get_quote(self, symbol):
+        return self._get('quote', symbol, 'quote')
+
+    def get_company_profile(self, symbol):
+        return self._get('stock/profile2', symbol, 'company profile')
+
+class RecordingProvider(MarketDataProvider):
+    """
+    Pass calls through to another provider and append every response to a
+    JSON lines file that ReplayProvider can read back
+    """
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _record(self, kind, symbol, response):
+        line = json.dumps({'kind': kind, 'symbol': symbol.upper(), 'response': response})
+        with self.lock, open(self.path, 'a', encoding='utf-8') as fh:
+            fh.write(line + '\n')
+        return response
+
+    def get_quote(self, symbol):
+        return self._record('quote', symbol, self.inner.get_quote(symbol))
+
+    def get_company_profile(self, symbol):
+        return self._record('profile', symbol, self.inner.get_company_profile(symbol))
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Serve recorded responses in order per symbol. Once a symbol's recording
+    is exhausted its last response is repeated, so runs are deterministic.
+    """
+    def __init__(self, path):
+        self.responses = {}
+        self.positions = {}
+        self.lock = threading.Lock()
+        with open(path, encoding='utf-8') as fh:
+            for line in fh:
+                if line.strip():
+                    row = json.loads(line)
+                    self.responses.setdefault((row['kind'], row['symbol']), []).append(row['response'])
+
+    def _next(self, kind, symbol):
+        key = (kind, symbol.upper())
+        responses = self.responses.get(key)
+        if not responses:
+            return None
+        with self.lock:
+            index = self.positions.get(key, 0)
+            self.positions[key] = index + 1
+        return responses[min(index, len(responses) - 1)]
+
+    def get_quote(self, symbol):
+        return self._next('quote', symbol)
+
+    def get_company_profile(self, symbol):
+        profile = self._next('profile', symbol)
+        return {} if profile is None else profile
+
+class RandomWalkProvider(MarketDataProvider):
+    """
+    Synthetic market: each symbol follows a seeded geometric random walk that
+    advances one step every tick_seconds. Any symbol is accepted, and
+    universe() lists a generated set for load tests.
+    """
+    def __init__(self, symbols=1000, seed=0, tick_seconds=1.0, volatility=0.001, clock=time.time):
+        self.symbol_count = symbols
+        self.seed = seed
+        self.tick_seconds = tick_seconds
+        self.volatility = volatility
+        self.clock = clock
+        self.state = {}
+        self.lock = threading.Lock()
+
+    def universe(self):
+        return [f"SYN{i:05d}" for i in range(self.symbol_count)]
+
+    def _rng(self, symbol):
+        return random.Random(zlib.crc32(symbol.encode()) ^ self.seed)
+
+    def _advance(self, symbol):
+        tick = int(self.clock() / self.tick_seconds)
+        with self.lock:
+            state = self.state.get(symbol)
+            if state is None:
+                rng = self._rng(symbol)
+                open_price = rng.uniform(10, 500)
+                state = self.state[symbol] = {
+                    'rng': rng, 'tick': tick, 'price': open_price,
+                    'open': open_price, 'high': open_price, 'low': open_price,
+                }
+            steps = tick - state['tick']
+            if steps > 0:
+                # n steps of a log-normal walk collapse into one draw
+                drift = state['rng'].gauss(0, self.volatility * math.sqrt(steps))
+                state['price'] = max(0.01, state['price'] * math.exp(drift))
+                state['high'] = max(state['high'], state['price'])
+                state['low'] = min(state['low'], state['price'])
+                state['tick'] = tick
+            return dict(state)
+
+    def get_quote(self, symbol):
+        state = self._advance(symbol.upper())
+        price = round(state['price'], 2)
+        previous = round(state['open'], 2)
+        return {
+            'c': price,
+            'd': round(price - previous, 2),
+            'dp': round((price - previous) / previous * 100, 4),
+            'h': round(state['high'], 2),
+            'l': round(state['low'], 2),
+            'o': previous,
+            'pc': previous,
+            't': int(state['tick'] * self.tick_seconds),
+        }
+
+    def get_company_profile(self, symbol):
+        symbol = symbol.upper()
+        return {'ticker': symbol, 'name': f"{symbol} Synthetic Corp", 'currency': 'USD'}
+
+class CircuitBreaker:
+    """
+    Open after `failure_threshold` consecutive failures. Once `cooldown`
+    seconds pass, one trial call is let through; success closes the breaker.
+    """
+    def __init__(self, failure_threshold=5, cooldown=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.clock() - self.opened_at >= self.cooldown:
+                # Half-open: re-arm so only this caller gets the trial
+                self.opened_at = self.clock()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+class LatencyTracker:
+    """
+    Recent successful call latencies for one provider
+    """
+    def __init__(self, window=200, min_samples=20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, pct):
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+class HedgedProvider(MarketDataProvider):
+    """
+    Fan a call out over several providers (e.g. one per Finnhub API key).
+    Calls start on the next provider in round-robin order, which spreads
+    rate limits across keys. If that provider hasn't answered within its
+    recent latency percentile, a hedge request goes to the next healthy
+    provider and the first good answer wins. Providers that keep failing
+    are skipped by their circuit breaker until the cooldown ends.
+    """
+    def __init__(self, providers, hedge_percentile=95, min_hedge_delay=0.05,
+                 max_attempts=2, timeout=5, failure_threshold=5, cooldown=30):
+        self.members = [
+            (provider, CircuitBreaker(failure_threshold, cooldown), LatencyTracker())
+            for provider in providers
+        ]
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.counter = itertools.count()
+        self.pool = ThreadPoolExecutor(max_workers=max(4, len(providers) * 8),
+                                       thread_name_prefix='quote-hedge')
+
+    def _candidates(self):
+        """
+        Healthy members in round-robin order, checked lazily so half-open
+        breakers only hand out their trial call when it is actually used
+        """
+        start = next(self.counter) % len(self.members)
+        for member in self.members[start:] + self.members[:start]:
+            if member[1].allow():
+                yield member
+
+    def _hedge_delay(self, member):
+        observed = member[2].percentile(self.hedge_percentile)
+        return max(self.min_hedge_delay, observed or 0)
+
+    def _attempt(self, member, method, symbol):
+        provider, breaker, latency = member
+        started = time.monotonic()
+        try:
+            result = getattr(provider, method)(symbol)
+        except Exception:
+            result = None
+        if result is None:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+            latency.record(time.monotonic() - started)
+        return result
+
+    def _call(self, method, symbol):
+        candidates = self._candidates()
+        deadline = time.monotonic() + self.timeout
+        pending = set()
+        in_flight_budget = self.max_attempts
+        while True:
+            hedge_after = None
+            member = next(candidates, None) if in_flight_budget > 0 else None
+            if member is not None:
+                in_flight_budget -= 1
+                pending.add(self.pool.submit(self._attempt, member, method, symbol))
+                if in_flight_budget > 0:
+                    hedge_after = self._hedge_delay(member)
+            if not pending:
+                return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            done, pending = wait(pending, timeout=min(hedge_after or remaining, remaining),
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result is not None:
+                    return result
+                # A failed attempt frees its slot for another provider
+                in_flight_budget += 1
+            # Either the hedge delay passed or an attempt failed: try the next provider
+
+    def get_quote(self, symbol):
+        return self._call('get_quote', symbol)
+
+    def get_company_profile(self, symbol):
+        return self._call('get_company_profile', symbol)
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def build_hedged_provider():
+    providers = [
+        FinnhubProvider(api_key, base_url=base_url, timeout=settings.QUOTE_TIMEOUT)
+        for base_url in settings.FINNHUB_BASE_URLS
+        for api_key in settings.FINNHUB_API_KEYS
+    ]
+    if not providers:
+        raise ImproperlyConfigured("MARKET_DATA_PROVIDER=hedged needs FINNHUB_API_KEYS (or FINNHUB_API_KEY)")
+    return HedgedProvider(
+        providers,
+        hedge_percentile=settings.QUOTE_HEDGE_PERCENTILE,
+        min_hedge_delay=settings.QUOTE_HEDGE_MIN_DELAY,
+        max_attempts=settings.QUOTE_MAX_ATTEMPTS,
+        timeout=settings.QUOTE_TIMEOUT,
+        failure_threshold=settings.QUOTE_BREAKER_THRESHOLD,
+        cooldown=settings.QUOTE_BREAKER_COOLDOWN
+    )
+
+def build_provider():
+    kind = settings.MARKET_DATA_PROVIDER
+    if kind == 'finnhub':
+        provider = FinnhubProvider(settings.FINNHUB_API_KEY)
+    elif kind == 'hedged':
+        provider = build_hedged_provider()
+    elif kind == 'replay':
+        provider = ReplayProvider(settings.MARKET_DATA_REPLAY_PATH)
+    elif kind == 'random_walk':
+        provider = RandomWalkProvider(
+            symbols=settings.SYNTHETIC_MARKET_SYMBOLS,
+            seed=settings.SYNTHETIC_MARKET_SEED,
+            tick_seconds=settings.SYNTHETIC_MARKET_TICK_SECONDS,
+            volatility=settings.SYNTHETIC_MARKET_VOLATILITY
+        )
+    else:
+        raise ValueError(f"Unknown MARKET_DATA_PROVIDER: {kind}")
+
+    if settings.MARKET_DATA_RECORD_PATH:
+        provider = RecordingProvider(provider, settings.MARKET_DATA_RECORD_PATH)
+    return provider
+
+def get_provider():
+    """
+    Process-wide provider; replay positions and random walks are stateful
+    """
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = build_provider()
+        return _provider
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Stock
+from .models import Stock, Watchlist
 
 class StockSerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,4 +8,36 @@ class StockSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'last_updated']
 
 class StockSearchSerializer(serializers.Serializer):
-    symbol = serializers.CharField(max_length=10)
\ No newline at end of file
+    symbol = serializers.CharField(max_length=10)
+
+class WatchlistSerializer(serializers.ModelSerializer):
+    symbols = serializers.ListField(child=serializers.CharField(max_length=10), write_only=True, required=False)
+    stocks = StockSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = Watchlist
+        fields = ['id', 'name', 'symbols', 'stocks', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    def validate_symbols(self, value):
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in value))
+        stocks = list(Stock.objects.filter(symbol__in=symbols))
+        unknown = set(symbols) - {stock.symbol for stock in stocks}
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown symbols: {', '.join(sorted(unknown))}. Search for them first."
+            )
+        return stocks
+    
+    def create(self, validated_data):
+        stocks = validated_data.pop('symbols', [])
+        watchlist = Watchlist.objects.create(**validated_data)
+        watchlist.stocks.set(stocks)
+        return watchlist
+    
+    def update(self, instance, validated_data):
+        stocks = validated_data.pop('symbols', None)
+        instance = super().update(instance, validated_data)
+        if stocks is not None:
+            instance.stocks.set(stocks)
+        return instance
@@ -1,50 +1,73 @@
-import os
-import requests
-from django.conf import settings
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.utils import timezone
+from .models import Stock
+from .providers import get_provider
+from . import cache as stock_cache
+from .signals import prices_updated
 
 class FinnhubService:
-    def __init__(self):
-        self.api_key = settings.FINNHUB_API_KEY
-        self.base_url = "https://finnhub.io/api/v1"
+    """
+    Market data entry point for the app. Calls go to the provider selected by
+    MARKET_DATA_PROVIDER (live Finnhub by default).
+    """
+    def __init__(self, provider=None):
+        self.provider = provider or get_provider()
     
     def get_quote(self, symbol):
         """
         Get real-time quote data for a stock
         """
-        endpoint = f"{self.base_url}/quote"
-        params = {
-            'symbol': symbol.upper(),
-            'token': self.api_key
-        }
-        
-        try:
-            response = requests.get(endpoint, params=params)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"Error getting quote: {response.status_code} - {response.text}")
-                return None
-        except Exception as e:
-            print(f"Exception getting quote: {str(e)}")
-            return None
+        return self.provider.get_quote(symbol)
     
     def get_company_profile(self, symbol):
         """
-        Get general information of a company
+        Get general information of a company.
+        Served from the profile cache when possible; returns {} for
+        symbols Finnhub doesn't know.
         """
-        endpoint = f"{self.base_url}/stock/profile2"
-        params = {
-            'symbol': symbol.upper(),
-            'token': self.api_key
-        }
+        cached = stock_cache.get_profile(symbol)
+        if cached is None:
+            return {}
+        if cached is not stock_cache.MISS:
+            return cached
         
-        try:
-            response = requests.get(endpoint, params=params)
-            if response.status_code == 200:
-                return response.json()
+        profile = self.fetch_company_profile(symbol)
+        if profile is not None:
+            if profile.get('name'):
+                stock_cache.set_profile(symbol, profile)
             else:
-                print(f"Error getting company profile: {response.status_code} - {response.text}")
-                return None
-        except Exception as e:
-            print(f"Exception getting company profile: {str(e)}")
-            return None
\ No newline at end of file
+                stock_cache.set_not_found(symbol)
+        return profile
+    
+    def fetch_company_profile(self, symbol):
+        """
+        Get general information of a company from the provider
+        """
+        return self.provider.get_company_profile(symbol)
+
+def refresh_quotes(stocks, max_workers=8):
+    """
+    Fetch one quote per stock concurrently, then write prices back with a
+    single bulk update and cache the raw quotes. Returns the updated stocks.
+    """
+    service = FinnhubService()
+    stocks = list(stocks)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        quotes = list(pool.map(lambda stock: service.get_quote(stock.symbol), stocks))
+    
+    now = timezone.now()
+    updated = []
+    cached = {}
+    for stock, quote in zip(stocks, quotes):
+        if quote and quote.get('c'):
+            stock.last_price = Decimal(str(quote['c']))
+            stock.last_updated = now
+            updated.append(stock)
+            cached[stock.symbol] = quote
+    
+    if updated:
+        Stock.objects.bulk_update(updated, ['last_price', 'last_updated'], batch_size=500)
+        stock_cache.set_quotes(cached)
+        prices_updated.send(sender=Stock, prices={stock.id: stock.last_price for stock in updated})
+    return updated
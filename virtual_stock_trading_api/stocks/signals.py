@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent by refresh_quotes() after a bulk price update, which skips post_save.
+# `prices` maps stock id to the new last_price.
+prices_updated = Signal()
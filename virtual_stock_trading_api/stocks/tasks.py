@@ -0,0 +1,14 @@
+from celery import shared_task
+from virtual_stock_trading_api.celery import app  # noqa: F401 (binds shared_task to the project app)
+from django.conf import settings
+from .models import Stock
+from .services import refresh_quotes
+
+@shared_task
+def refresh_watched_prices():
+    """
+    Refresh every watched symbol once per cycle, however many users watch it
+    """
+    stocks = Stock.objects.filter(watchlists__isnull=False).distinct()
+    updated = refresh_quotes(stocks, max_workers=settings.WATCHLIST_REFRESH_CONCURRENCY)
+    return f"Refreshed {len(updated)} watched symbols"
@@ -1,3 +1,278 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from . import cache as stock_cache
+from .models import Stock, Watchlist
+from .providers import (CircuitBreaker, FinnhubProvider, HedgedProvider, RandomWalkProvider, RecordingProvider,
+                        ReplayProvider, build_hedged_provider, build_provider)
+from .services import FinnhubService
+from .tasks import refresh_watched_prices
 
-# Create your tests here.
+class StubQuoteServer:
+    """
+    Local stand-in for the Finnhub quote endpoint. Answers with `price` after
+    `delay` seconds, or with `status` when it isn't 200, and records the API
+    key of every request.
+    """
+    def __init__(self, price, delay=0.0, status=200):
+        self.price = price
+        self.delay = delay
+        self.status = status
+        self.tokens = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.tokens.append(parse_qs(urlparse(self.path).query)['token'][0])
+                time.sleep(stub.delay)
+                body = json.dumps({'c': stub.price} if stub.status == 200 else {'error': 'down'}).encode()
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def provider(self, api_key='key'):
+        return FinnhubProvider(api_key, base_url=self.url, timeout=2)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class HedgedProviderTests(SimpleTestCase):
+    def stub(self, *args, **kwargs):
+        server = StubQuoteServer(*args, **kwargs)
+        self.addCleanup(server.close)
+        return server
+
+    def hedged(self, providers, **kwargs):
+        provider = HedgedProvider(providers, **kwargs)
+        self.addCleanup(provider.pool.shutdown)
+        return provider
+
+    def test_round_robin_over_keys(self):
+        server = self.stub(100.0)
+        provider = self.hedged([server.provider(key) for key in ('k1', 'k2', 'k3')], min_hedge_delay=1)
+        for _ in range(6):
+            self.assertEqual(provider.get_quote('AAPL'), {'c': 100.0})
+        self.assertEqual(server.tokens, ['k1', 'k2', 'k3', 'k1', 'k2', 'k3'])
+
+    def test_hedge_after_the_delay(self):
+        slow, fast = self.stub(1.0, delay=1.0), self.stub(2.0)
+        provider = self.hedged([slow.provider(), fast.provider()], min_hedge_delay=0.05)
+        started = time.monotonic()
+        self.assertEqual(provider.get_quote('AAPL'), {'c': 2.0})
+        self.assertLess(time.monotonic() - started, 0.8)
+        self.assertEqual((len(slow.tokens), len(fast.tokens)), (1, 1))
+
+    def test_no_hedge_within_the_delay(self):
+        first, second = self.stub(1.0, delay=0.1), self.stub(2.0)
+        provider = self.hedged([first.provider(), second.provider()], min_hedge_delay=1)
+        self.assertEqual(provider.get_quote('AAPL'), {'c': 1.0})
+        self.assertEqual(second.tokens, [])
+
+    def test_single_attempt_waits_for_the_slow_provider(self):
+        slow, fast = self.stub(1.0, delay=0.3), self.stub(2.0)
+        provider = self.hedged([slow.provider(), fast.provider()], min_hedge_delay=0.05, max_attempts=1)
+        self.assertEqual(provider.get_quote('AAPL'), {'c': 1.0})
+        self.assertEqual(fast.tokens, [])
+
+    @mock.patch('builtins.print')
+    def test_breaker_skips_a_failing_provider_until_the_cooldown(self, _):
+        bad, good = self.stub(1.0, status=500), self.stub(2.0)
+        provider = self.hedged([bad.provider(), good.provider()], min_hedge_delay=1,
+                               failure_threshold=2, cooldown=0.3)
+        for _ in range(6):
+            self.assertEqual(provider.get_quote('AAPL'), {'c': 2.0})
+        # Calls starting on the bad provider failed over; after two failures it is skipped
+        self.assertEqual(len(bad.tokens), 2)
+        self.assertEqual(len(good.tokens), 6)
+
+        # Half-open after the cooldown: one trial call, which fails and reopens it
+        time.sleep(0.35)
+        for _ in range(4):
+            self.assertEqual(provider.get_quote('AAPL'), {'c': 2.0})
+        self.assertEqual(len(bad.tokens), 3)
+
+        # A successful trial closes it, and it is back to every other call
+        bad.status = 200
+        time.sleep(0.35)
+        self.assertEqual({provider.get_quote('AAPL')['c'] for _ in range(4)}, {1.0, 2.0})
+        self.assertEqual(len(bad.tokens), 5)
+
+    @mock.patch('builtins.print')
+    def test_all_providers_failing(self, _):
+        provider = self.hedged([self.stub(1.0, status=500).provider(), self.stub(2.0, status=503).provider()],
+                               min_hedge_delay=1)
+        self.assertIsNone(provider.get_quote('AAPL'))
+
+    @override_settings(FINNHUB_API_KEYS=[], FINNHUB_BASE_URLS=['https://finnhub.io/api/v1'])
+    def test_hedged_without_keys_is_misconfigured(self):
+        with self.assertRaises(ImproperlyConfigured):
+            build_hedged_provider()
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker(failure_threshold=2, cooldown=10, clock=lambda: self.now)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open)
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_lets_one_trial_through(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now = 10
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertFalse(self.breaker.is_open)
+        self.assertTrue(self.breaker.allow())
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class OfflineProviderTests(SimpleTestCase):
+    """
+    The random walk, and recording it for deterministic replays
+    """
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'market.jsonl')
+        self.clock = FakeClock()
+
+    def walk(self, seed=7):
+        return RandomWalkProvider(symbols=3, seed=seed, tick_seconds=1.0, volatility=0.01, clock=self.clock)
+
+    def test_random_walk_is_seeded_and_ticks_with_the_clock(self):
+        walk = self.walk()
+        self.assertEqual(walk.universe(), ['SYN00000', 'SYN00001', 'SYN00002'])
+        first = walk.get_quote('syn00001')
+        self.assertEqual(walk.get_quote('SYN00001'), first)
+        self.assertEqual(self.walk().get_quote('SYN00001'), first)
+        self.assertNotEqual(self.walk(seed=8).get_quote('SYN00001')['c'], first['c'])
+
+        self.clock.now += 60
+        quote = walk.get_quote('SYN00001')
+        self.assertNotEqual(quote['c'], first['c'])
+        self.assertEqual((quote['o'], quote['t']), (first['c'], 1060))
+        self.assertLessEqual(quote['l'], quote['c'])
+        self.assertGreaterEqual(quote['h'], quote['c'])
+        self.assertEqual(walk.get_company_profile('abc')['name'], 'ABC Synthetic Corp')
+
+    def test_replay_serves_the_recording(self):
+        recorder = RecordingProvider(self.walk(), self.path)
+        recorded = []
+        for _ in range(3):
+            recorded.append(recorder.get_quote('SYN00000'))
+            self.clock.now += 5
+        profile = recorder.get_company_profile('SYN00000')
+
+        replay = ReplayProvider(self.path)
+        self.assertEqual([replay.get_quote('syn00000') for _ in range(3)], recorded)
+        # Exhausted recordings repeat their last response
+        self.assertEqual(replay.get_quote('SYN00000'), recorded[-1])
+        self.assertEqual(replay.get_company_profile('SYN00000'), profile)
+        self.assertIsNone(replay.get_quote('NOPE'))
+        self.assertEqual(replay.get_company_profile('NOPE'), {})
+
+    def test_build_provider(self):
+        with override_settings(MARKET_DATA_PROVIDER='random_walk', MARKET_DATA_RECORD_PATH=self.path):
+            provider = build_provider()
+        self.assertIsInstance(provider, RecordingProvider)
+        self.assertIsInstance(provider.inner, RandomWalkProvider)
+        with override_settings(MARKET_DATA_PROVIDER='replay', MARKET_DATA_REPLAY_PATH=self.path,
+                               MARKET_DATA_RECORD_PATH=''):
+            provider.get_quote('SYN00000')
+            self.assertIsInstance(build_provider(), ReplayProvider)
+        with override_settings(MARKET_DATA_PROVIDER='bloomberg'), self.assertRaises(ValueError):
+            build_provider()
+
+class WatchlistTests(TestCase):
+    """
+    Watchlist CRUD, cached quotes and the shared refresh cycle
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='watcher')
+        self.other = User.objects.create(username='other')
+        for symbol, price in (('AAA', '10.00'), ('BBB', '20.00'), ('CCC', '30.00')):
+            Stock.objects.create(symbol=symbol, company_name=f'{symbol} Inc', last_price=Decimal(price))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, symbols, name='Tech'):
+        return self.client.post('/api/stocks/watchlists/', {'name': name, 'symbols': symbols}, format='json')
+
+    def test_create_and_update(self):
+        response = self.create(['aaa', 'BBB', 'aaa'])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual([stock['symbol'] for stock in response.data['stocks']], ['AAA', 'BBB'])
+        watchlist_id = response.data['id']
+        response = self.client.patch(f'/api/stocks/watchlists/{watchlist_id}/', {'symbols': ['CCC']}, format='json')
+        self.assertEqual([stock['symbol'] for stock in response.data['stocks']], ['CCC'])
+        # Renaming leaves the symbols alone
+        self.client.patch(f'/api/stocks/watchlists/{watchlist_id}/', {'name': 'Renamed'}, format='json')
+        self.assertEqual(list(Watchlist.objects.get(id=watchlist_id).stocks.values_list('symbol', flat=True)),
+                         ['CCC'])
+
+    def test_unknown_symbols_are_rejected(self):
+        response = self.create(['AAA', 'ZZZ'])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ZZZ', str(response.data['symbols']))
+
+    def test_quotes(self):
+        watchlist_id = self.create(['BBB', 'AAA']).data['id']
+        stock_cache.set_quotes({'AAA': {'c': 10, 'd': 0.5, 'dp': 5.0, 'h': 11, 'l': 9}})
+        response = self.client.get(f'/api/stocks/watchlists/{watchlist_id}/quotes/')
+        self.assertEqual([(row['symbol'], row['change'], row['high']) for row in response.data],
+                         [('AAA', 0.5, 11), ('BBB', None, None)])
+
+        # Other users' lists, empty or not, are not found
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(f'/api/stocks/watchlists/{watchlist_id}/quotes/').status_code, 404)
+        empty_id = self.create([], name='Empty').data['id']
+        self.assertEqual(self.client.get(f'/api/stocks/watchlists/{empty_id}/quotes/').data, [])
+
+    def test_refresh_fetches_each_watched_symbol_once(self):
+        self.create(['AAA', 'BBB'])
+        self.client.force_authenticate(self.other)
+        self.create(['BBB'])
+        quotes = {'AAA': {'c': 11.5}, 'BBB': {'c': 0}}
+        with mock.patch.object(FinnhubService, 'get_quote', side_effect=quotes.get) as get_quote:
+            self.assertEqual(refresh_watched_prices(), "Refreshed 1 watched symbols")
+        self.assertEqual(sorted(call.args[0] for call in get_quote.call_args_list), ['AAA', 'BBB'])
+        # A zero price is treated as no quote; unwatched symbols are left alone
+        prices = dict(Stock.objects.values_list('symbol', 'last_price'))
+        self.assertEqual(prices, {'AAA': Decimal('11.50'), 'BBB': Decimal('20.00'), 'CCC': Decimal('30.00')})
+        self.assertEqual(stock_cache.get_quotes(['AAA', 'BBB']), {'AAA': {'c': 11.5}})
@@ -1,8 +1,10 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import StockViewSet
+from .views import StockViewSet, WatchlistViewSet
 
 router = DefaultRouter()
+# Registered before the stock routes so 'watchlists' isn't read as a stock id
+router.register(r'watchlists', WatchlistViewSet, basename='watchlist')
 router.register(r'', StockViewSet, basename='stock')
 
 urlpatterns = router.urls
\ No newline at end of file
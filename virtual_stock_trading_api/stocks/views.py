@@ -4,9 +4,10 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from decimal import Decimal
-from .models import Stock
-from .serializers import StockSerializer, StockSearchSerializer
+from .models import Stock, Watchlist
+from .serializers import StockSerializer, StockSearchSerializer, WatchlistSerializer
 from .services import FinnhubService
+from . import cache as stock_cache
 
 # Stock App ViewSet
 
@@ -17,6 +18,10 @@ class StockViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['symbol']
     search_fields = ['symbol', 'company_name']
+    throttle_scopes = {
+        'search': 'upstream',
+        'refresh_price': 'upstream',
+    }
     
     @action(detail=False, methods=['post'])
     def search(self, request):
@@ -38,9 +43,10 @@ class StockViewSet(viewsets.ReadOnlyModelViewSet):
                 return Response(StockSerializer(stock).data)
                 
             except Stock.DoesNotExist:
-                # Stock not in database, try to get from Finnhub
-                stock_data = finnhub_service.get_quote(symbol)
+                # Stock not in database, try to get from Finnhub.
+                # The profile is checked first so known-unknown symbols skip the quote call.
                 company_data = finnhub_service.get_company_profile(symbol)
+                stock_data = finnhub_service.get_quote(symbol) if company_data else None
                 
                 if stock_data and 'c' in stock_data and company_data and 'name' in company_data:
                     stock = Stock.objects.create(
@@ -56,6 +62,10 @@ class StockViewSet(viewsets.ReadOnlyModelViewSet):
                     )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def profile_cache_stats(self, request):
+        return Response(stock_cache.stats())
+    
     @action(detail=True, methods=['get'])
     def refresh_price(self, request, pk=None):
         stock = self.get_object()
@@ -71,3 +81,36 @@ class StockViewSet(viewsets.ReadOnlyModelViewSet):
                 {"error": "Couldn't retrieve updated price"},
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
+
+class WatchlistViewSet(viewsets.ModelViewSet):
+    serializer_class = WatchlistSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return Watchlist.objects.filter(user=self.request.user).prefetch_related('stocks')
+    
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+    
+    @action(detail=True, methods=['get'])
+    def quotes(self, request, pk=None):
+        if not str(pk).isdigit():
+            return Response({"error": "Watchlist not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        # One query for the watched stocks, one cache round trip for the latest quotes
+        stocks = list(Stock.objects
+                      .filter(watchlists__id=pk, watchlists__user=request.user)
+                      .values('id', 'symbol', 'company_name', 'last_price', 'last_updated')
+                      .order_by('symbol'))
+        if not stocks and not Watchlist.objects.filter(id=pk, user=request.user).exists():
+            return Response({"error": "Watchlist not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        quotes = stock_cache.get_quotes([stock['symbol'] for stock in stocks])
+        for stock in stocks:
+            quote = quotes.get(stock['symbol'], {})
+            stock['last_price'] = str(stock['last_price'])
+            stock['change'] = quote.get('d')
+            stock['change_percent'] = quote.get('dp')
+            stock['high'] = quote.get('h')
+            stock['low'] = quote.get('l')
+        return Response(stocks)
@@ -1,3 +1,18 @@
 from django.contrib import admin
+from portfolios.admin import ShardedAdmin
+from .models import OutboxEvent, SymbolLiquidity
 
-# Register your models here.
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(ShardedAdmin):
+    list_display = ['id', 'event_type', 'portfolio_id', 'created_at', 'published_at']
+    list_filter = ['event_type']
+    search_fields = ['=portfolio_id']
+    readonly_fields = ['event_type', 'portfolio_id', 'payload', 'created_at', 'published_at']
+    show_full_result_count = False
+
+@admin.register(SymbolLiquidity)
+class SymbolLiquidityAdmin(admin.ModelAdmin):
+    list_display = ['stock', 'average_daily_volume', 'daily_volatility', 'spread_bps', 'bars', 'updated_at']
+    list_select_related = ['stock']
+    search_fields = ['stock__symbol']
+    ordering = ['stock__symbol']
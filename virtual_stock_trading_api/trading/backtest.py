@@ -0,0 +1,145 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Backtesting engine
+#
+# This module only depends on NumPy so it can run inside pool workers without
+# setting up Django. Bars are loaded by the caller and passed in as arrays:
+# `closes` is a (days, symbols) float array with NaN where a symbol has no bar.
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool(max_workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn keeps workers independent of the web server's threads and DB connections
+            _pool = ProcessPoolExecutor(max_workers=max_workers,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+def _forward_fill(closes):
+    """
+    Carry the last known close over missing bars
+    """
+    valid = ~np.isnan(closes)
+    index = np.where(valid, np.arange(closes.shape[0])[:, None], 0)
+    np.maximum.accumulate(index, axis=0, out=index)
+    filled = closes[index, np.arange(closes.shape[1])]
+    return filled, np.maximum.accumulate(valid, axis=0)
+
+def _sma(closes, window):
+    """
+    Trailing simple moving average, NaN until the window is full
+    """
+    def trailing(values):
+        cumsum = np.cumsum(values, axis=0)
+        total = np.zeros_like(cumsum)
+        total[window - 1:] = cumsum[window - 1:]
+        total[window:] -= cumsum[:-window]
+        return total
+
+    sums = trailing(np.nan_to_num(closes))
+    counts = trailing((~np.isnan(closes)).astype(float))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts == window, sums / window, np.nan)
+
+def rule_signal(rule, closes):
+    """
+    Boolean (days, symbols) array that is True where the rule wants to be long
+    """
+    kind = rule['type']
+    with np.errstate(invalid='ignore'):
+        if kind == 'sma_cross':
+            return _sma(closes, int(rule['fast'])) > _sma(closes, int(rule['slow']))
+        if kind == 'momentum':
+            lookback = int(rule['lookback'])
+            past = np.full_like(closes, np.nan)
+            past[lookback:] = closes[:-lookback]
+            return closes > past
+        if kind == 'threshold':
+            # Long once the price dips below buy_below, flat once it rises above sell_above
+            if float(rule['buy_below']) >= float(rule['sell_above']):
+                raise ValueError("buy_below must be lower than sell_above")
+            state = np.full(closes.shape, np.nan)
+            state[closes <= float(rule['buy_below'])] = 1.0
+            state[closes >= float(rule['sell_above'])] = 0.0
+            filled, seen = _forward_fill(state)
+            return seen & (filled == 1.0)
+    raise ValueError(f"Unknown rule type: {kind}")
+
+def _simulate_symbol(signal, prices, cash):
+    """
+    Replay entries and exits for one symbol with whole-share fills.
+    Only the signal changes are visited, so the loop is O(trades).
+    """
+    share_delta = np.zeros(len(prices), dtype=np.int64)
+    cash_delta = np.zeros(len(prices))
+    trades = []
+    shares = 0
+    changes = np.flatnonzero(np.diff(signal.astype(np.int8), prepend=0))
+    for t in changes:
+        price = prices[t]
+        if signal[t] and shares == 0:
+            # Same rule as BuyStockView: only buy what the cash covers
+            quantity = int(cash // price)
+            if quantity == 0:
+                continue
+            shares = quantity
+            cash -= quantity * price
+            share_delta[t] += quantity
+            cash_delta[t] -= quantity * price
+            trades.append((int(t), 'BUY', quantity, float(price)))
+        elif not signal[t] and shares > 0:
+            cash += shares * price
+            share_delta[t] -= shares
+            cash_delta[t] += shares * price
+            trades.append((int(t), 'SELL', shares, float(price)))
+            shares = 0
+    return np.cumsum(share_delta), np.cumsum(cash_delta), trades
+
+def run_backtest(closes, symbols, rules, initial_cash):
+    """
+    Run one strategy. Cash is split evenly across symbols and a symbol is held
+    while every rule signals long. Returns the equity curve, trades and stats.
+    """
+    closes = np.asarray(closes, dtype=float)
+    prices, has_bar = _forward_fill(closes)
+
+    signal = has_bar.copy()
+    for rule in rules:
+        signal &= rule_signal(rule, prices)
+
+    sleeve = initial_cash / len(symbols)
+    holdings = np.zeros(prices.shape, dtype=np.int64)
+    cash = np.full(prices.shape[0], float(initial_cash))
+    trades = []
+    for j, symbol in enumerate(symbols):
+        held, spent, symbol_trades = _simulate_symbol(signal[:, j], prices[:, j], sleeve)
+        holdings[:, j] = held
+        cash += spent
+        trades.extend((t, symbol, side, qty, price) for t, side, qty, price in symbol_trades)
+
+    stock_value = np.nansum(holdings * prices, axis=1)
+    total_value = cash + stock_value
+    peak = np.maximum.accumulate(total_value)
+
+    return {
+        'cash_balance': np.round(cash, 2).tolist(),
+        'stock_value': np.round(stock_value, 2).tolist(),
+        'total_value': np.round(total_value, 2).tolist(),
+        'trades': sorted(trades),
+        'total_return': float(total_value[-1] / initial_cash - 1) if len(total_value) else 0.0,
+        'max_drawdown': float(np.max(1 - total_value / peak)) if len(total_value) else 0.0,
+    }
+
+def run_backtests(jobs, max_workers):
+    """
+    Run (closes, symbols, rules, initial_cash) jobs in parallel in the process pool
+    """
+    pool = get_pool(max_workers)
+    futures = [pool.submit(run_backtest, *job) for job in jobs]
+    return [future.result() for future in futures]
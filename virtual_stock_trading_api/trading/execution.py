@@ -0,0 +1,123 @@
+import math
+import threading
+from django.conf import settings
+from portfolios.models import Transaction
+from portfolios.money import to_cents, from_cents
+from .models import SymbolLiquidity
+
+# Simulated order execution
+#
+# Trade views ask the configured execution model how much of an order fills
+# and at what price. 'instant' fills everything at the reference price (the
+# stock's last price). 'impact' treats the reference price as the mid and
+# charges half the quoted spread plus a square-root market impact,
+#     impact = coefficient * daily volatility * sqrt(quantity / ADV),
+# and fills at most EXECUTION_MAX_PARTICIPATION of average daily volume per
+# order; the rest of the order is cancelled.
+#
+# Pricing is plain float arithmetic on the liquidity row, rounded to the
+# cent once at the end, so a fill costs a few microseconds.
+
+class Fill:
+    __slots__ = ('side', 'requested', 'quantity', 'price_cents', 'reference_price')
+
+    def __init__(self, side, requested, quantity, price_cents, reference_price):
+        self.side = side
+        self.requested = requested
+        self.quantity = quantity
+        self.price_cents = price_cents
+        self.reference_price = reference_price
+
+    @property
+    def price(self):
+        return from_cents(self.price_cents)
+
+    @property
+    def unfilled(self):
+        return self.requested - self.quantity
+
+    @property
+    def total_cents(self):
+        return self.price_cents * self.quantity
+
+class Liquidity:
+    """
+    Liquidity parameters for pricing; defaults apply to symbols without a row
+    """
+    __slots__ = ('average_daily_volume', 'daily_volatility', 'spread_bps')
+
+    def __init__(self, average_daily_volume=None, daily_volatility=None, spread_bps=None):
+        # Zero volume means none was recorded for the bars, not an untradeable symbol
+        self.average_daily_volume = average_daily_volume or settings.EXECUTION_DEFAULT_ADV
+        self.daily_volatility = settings.EXECUTION_DEFAULT_VOLATILITY if daily_volatility is None else daily_volatility
+        self.spread_bps = settings.EXECUTION_DEFAULT_SPREAD_BPS if spread_bps is None else spread_bps
+
+    @classmethod
+    def for_stock(cls, stock):
+        row = (SymbolLiquidity.objects
+               .filter(stock=stock)
+               .values_list('average_daily_volume', 'daily_volatility', 'spread_bps')
+               .first())
+        return cls(*row) if row else cls()
+
+class ExecutionModel:
+    def fill(self, side, quantity, reference_price, liquidity):
+        raise NotImplementedError
+
+class InstantExecution(ExecutionModel):
+    """
+    Full fill at the reference price
+    """
+    def fill(self, side, quantity, reference_price, liquidity=None):
+        return Fill(side, quantity, quantity, to_cents(reference_price), reference_price)
+
+class MarketImpactExecution(ExecutionModel):
+    """
+    Half-spread plus square-root impact, capped by participation in daily volume
+    """
+    def __init__(self, impact_coefficient, max_participation):
+        self.impact_coefficient = impact_coefficient
+        self.max_participation = max_participation
+
+    def fill(self, side, quantity, reference_price, liquidity):
+        adv = liquidity.average_daily_volume
+        filled = min(quantity, int(adv * self.max_participation)) if self.max_participation else quantity
+        mid = float(reference_price)
+        if filled <= 0 or mid <= 0:
+            return Fill(side, quantity, 0, 0, reference_price)
+
+        cost = (liquidity.spread_bps / 20000
+                + self.impact_coefficient * liquidity.daily_volatility * math.sqrt(filled / adv))
+        if side == Transaction.BUY:
+            # Round against the taker so cost never rounds away
+            price_cents = math.ceil(mid * (1 + cost) * 100 - 1e-9)
+        else:
+            price_cents = max(math.floor(mid * (1 - cost) * 100 + 1e-9), 1)
+        return Fill(side, quantity, filled, price_cents, reference_price)
+
+_model = None
+_model_lock = threading.Lock()
+
+def build_execution_model():
+    kind = settings.EXECUTION_MODEL
+    if kind == 'instant':
+        return InstantExecution()
+    if kind == 'impact':
+        return MarketImpactExecution(
+            impact_coefficient=settings.EXECUTION_IMPACT_COEFFICIENT,
+            max_participation=settings.EXECUTION_MAX_PARTICIPATION
+        )
+    raise ValueError(f"Unknown EXECUTION_MODEL: {kind}")
+
+def get_execution_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = build_execution_model()
+        return _model
+
+def execute(stock, side, quantity):
+    """
+    Price an order for `stock` at its last price with the configured model
+    """
+    return get_execution_model().fill(side, quantity, stock.last_price, Liquidity.for_stock(stock))
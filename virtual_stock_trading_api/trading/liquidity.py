@@ -0,0 +1,91 @@
+import datetime
+import math
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from stocks.models import PriceBar
+from .models import SymbolLiquidity
+
+# Per-symbol liquidity parameters
+#
+# Recomputed in one pass over the recent bars of every symbol:
+#   average daily volume   mean share volume over the window
+#   daily volatility       standard deviation of daily log returns
+#   spread                 Abdi & Ranaldo (2017) close/high/low estimator:
+#                          s^2 = 4 * mean((c_t - m_t) * (c_t - m_{t+1})), where
+#                          c is the log close and m the log high/low midpoint
+# Symbols without enough bars keep their previous row, or fall back to
+# the EXECUTION_DEFAULT_* settings when they have none.
+
+def _estimate(highs, lows, closes, volumes):
+    """
+    (average daily volume, daily volatility, spread in bps) for one symbol
+    """
+    import numpy as np
+
+    log_close = np.log(closes)
+    returns = np.diff(log_close)
+    volatility = float(returns.std(ddof=1)) if len(returns) > 1 else 0.0
+    midpoint = (np.log(highs) + np.log(lows)) / 2
+    s2 = 4 * float(np.mean((log_close[:-1] - midpoint[:-1]) * (log_close[:-1] - midpoint[1:])))
+    # The estimator goes negative on quiet windows; treat that as no measurable spread
+    spread_bps = max(math.sqrt(max(s2, 0.0)) * 10000, settings.EXECUTION_MIN_SPREAD_BPS)
+    return float(volumes.mean()), volatility, spread_bps
+
+def compute_liquidity(window_days=None, min_bars=5, batch_size=1000):
+    """
+    Recompute liquidity for every symbol with at least `min_bars` bars in
+    the last `window_days` trading days. Returns how many symbols were updated.
+    """
+    import numpy as np
+
+    window_days = window_days or settings.LIQUIDITY_WINDOW_DAYS
+    latest = PriceBar.objects.aggregate(latest=Max('date'))['latest']
+    if latest is None:
+        return 0
+    # Calendar days covering the trading-day window
+    since = latest - datetime.timedelta(days=math.ceil(window_days * 7 / 5))
+    rows = (PriceBar.objects
+            .filter(date__gte=since, high__gt=0, low__gt=0, close__gt=0)
+            .order_by('stock_id', 'date')
+            .values_list('stock_id', 'high', 'low', 'close', 'volume')
+            .iterator(chunk_size=10000))
+
+    now = timezone.now()
+    pending = []
+    updated = 0
+
+    def flush():
+        SymbolLiquidity.objects.bulk_create(
+            pending, update_conflicts=True, unique_fields=['stock'],
+            update_fields=['average_daily_volume', 'daily_volatility', 'spread_bps', 'bars', 'updated_at']
+        )
+        pending.clear()
+
+    def add(stock_id, bars):
+        if len(bars) < min_bars:
+            return
+        highs, lows, closes, volumes = np.array(bars[-window_days:], dtype=float).T
+        adv, volatility, spread_bps = _estimate(highs, lows, closes, volumes)
+        pending.append(SymbolLiquidity(stock_id=stock_id, average_daily_volume=adv,
+                                       daily_volatility=volatility, spread_bps=spread_bps,
+                                       bars=len(closes), updated_at=now))
+
+    current = None
+    bars = []
+    for stock_id, high, low, close, volume in rows:
+        if stock_id != current:
+            if current is not None:
+                add(current, bars)
+            current = stock_id
+            bars = []
+        bars.append((high, low, close, volume))
+        if len(pending) >= batch_size:
+            updated += len(pending)
+            flush()
+    if current is not None:
+        add(current, bars)
+    updated += len(pending)
+    if pending:
+        flush()
+    return updated
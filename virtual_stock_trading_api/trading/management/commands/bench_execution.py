@@ -0,0 +1,79 @@
+import datetime
+import math
+import random
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from portfolios.models import Transaction
+from stocks.models import Stock, PriceBar
+from trading.execution import Liquidity, MarketImpactExecution, execute
+from trading.liquidity import compute_liquidity
+from trading.models import SymbolLiquidity
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = "Time liquidity computation and fill pricing on synthetic data; everything is rolled back"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', type=int, default=500)
+        parser.add_argument('--days', type=int, default=60)
+        parser.add_argument('--fills', type=int, default=100000)
+        parser.add_argument('--db-fills', type=int, default=2000,
+                            help="Fills priced through execute(), including the liquidity lookup")
+
+    def rate(self, label, count, elapsed, unit):
+        self.stdout.write(f"{label:<36} {elapsed * 1000:>9.1f} ms  {count / elapsed:>12.0f} {unit}/s")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        try:
+            with transaction.atomic():
+                stocks = Stock.objects.bulk_create([
+                    Stock(symbol=f"BX{i:05d}", company_name=f"Bench {i}",
+                          last_price=Decimal(rng.randint(500, 50000)).scaleb(-2))
+                    for i in range(options['symbols'])
+                ])
+                start = datetime.date.today() - datetime.timedelta(days=options['days'])
+                bars = []
+                for stock in stocks:
+                    close = float(stock.last_price)
+                    volume = 10 ** rng.uniform(4, 7)
+                    for day in range(options['days']):
+                        close = max(close * math.exp(rng.gauss(0, 0.02)), 1.0)
+                        spread = close * rng.uniform(0.002, 0.03)
+                        bars.append(PriceBar(stock=stock, date=start + datetime.timedelta(days=day),
+                                             open=round(close, 2), high=round(close + spread, 2),
+                                             low=round(close - spread, 2), close=round(close, 2),
+                                             volume=int(volume * rng.uniform(0.5, 1.5))))
+                PriceBar.objects.bulk_create(bars, batch_size=5000)
+
+                started = time.perf_counter()
+                updated = compute_liquidity(options['days'])
+                self.rate("compute_liquidity", updated, time.perf_counter() - started, "symbols")
+
+                liquidity = [Liquidity(*row) for row in SymbolLiquidity.objects
+                             .filter(stock__in=stocks)
+                             .values_list('average_daily_volume', 'daily_volatility', 'spread_bps')]
+                model = MarketImpactExecution(impact_coefficient=1.0, max_participation=0.1)
+                orders = [(rng.choice((Transaction.BUY, Transaction.SELL)), int(10 ** rng.uniform(0, 6)),
+                           stocks[i % len(stocks)].last_price, liquidity[i % len(liquidity)])
+                          for i in range(options['fills'])]
+                started = time.perf_counter()
+                partial = 0
+                for side, quantity, price, params in orders:
+                    if model.fill(side, quantity, price, params).unfilled:
+                        partial += 1
+                self.rate("MarketImpactExecution.fill", len(orders), time.perf_counter() - started, "fills")
+                self.stdout.write(f"  {partial / len(orders):.1%} of orders filled partially")
+
+                started = time.perf_counter()
+                for i in range(options['db_fills']):
+                    execute(stocks[i % len(stocks)], Transaction.BUY, int(10 ** rng.uniform(0, 6)))
+                self.rate("execute() with liquidity lookup", options['db_fills'],
+                          time.perf_counter() - started, "fills")
+                raise Rollback
+        except Rollback:
+            pass
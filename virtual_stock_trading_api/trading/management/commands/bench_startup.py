@@ -0,0 +1,62 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter per sample, so nothing is warm from this process
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from virtual_stock_trading_api.wsgi import application
+loaded = time.perf_counter()
+from wsgiref.util import setup_testing_defaults
+environ = {'PATH_INFO': sys.argv[1], 'HTTP_HOST': 'localhost'}
+setup_testing_defaults(environ)
+status = []
+body = b''.join(application(environ, lambda s, h, exc_info=None: status.append(s)))
+done = time.perf_counter()
+print(json.dumps({'boot': loaded - started, 'first_request': done - loaded, 'status': status[0]}))
+"""
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class Command(BaseCommand):
+    help = "Measure cold start: WSGI application import and first request latency in fresh processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10)
+        parser.add_argument('--path', default=f"/api/schema/openapi-{settings.API_VERSION}.json",
+                            help="Path requested once the application is loaded")
+        parser.add_argument('--imports', type=int, default=0,
+                            help="Also list the N slowest imports of one boot (python -X importtime)")
+
+    def probe(self, path, *flags):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE',
+                                                                     'virtual_stock_trading_api.settings'))
+        return subprocess.run([sys.executable, *flags, '-c', PROBE, path], cwd=settings.BASE_DIR,
+                              env=env, capture_output=True, text=True, check=True)
+
+    def handle(self, *args, **options):
+        samples = [json.loads(self.probe(options['path']).stdout.strip().splitlines()[-1])
+                   for _ in range(options['runs'])]
+        self.stdout.write(f"{options['path']} -> {samples[0]['status']} over {len(samples)} fresh processes")
+        for key in ('boot', 'first_request'):
+            values = [sample[key] * 1000 for sample in samples]
+            self.stdout.write(f"{key:<14} median {statistics.median(values):>8.1f} ms  "
+                              f"p95 {percentile(values, 95):>8.1f} ms")
+
+        if options['imports']:
+            timings = []
+            for line in self.probe(options['path'], '-X', 'importtime').stderr.splitlines():
+                if not line.startswith('import time:') or 'self [us]' in line:
+                    continue
+                own, cumulative, module = line[len('import time:'):].split('|')
+                timings.append((int(own), int(cumulative), module.strip()))
+            self.stdout.write("Slowest imports (self / cumulative):")
+            for own, cumulative, module in sorted(timings, reverse=True)[:options['imports']]:
+                self.stdout.write(f"  {own / 1000:>7.1f} ms {cumulative / 1000:>8.1f} ms  {module}")
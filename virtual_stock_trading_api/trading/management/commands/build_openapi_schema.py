@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from virtual_stock_trading_api.schema import build_schema
+
+class Command(BaseCommand):
+    help = "Generate the versioned OpenAPI schema artifact served at /api/schema/"
+
+    def handle(self, *args, **options):
+        path = build_schema()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {path}"))
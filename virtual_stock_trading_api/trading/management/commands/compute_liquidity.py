@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+from trading.liquidity import compute_liquidity
+
+class Command(BaseCommand):
+    help = "Recompute per-symbol liquidity (volume, volatility, spread) from recent daily bars"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, default=None, help="Trading days of bars to use")
+        parser.add_argument('--min-bars', type=int, default=5)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        updated = compute_liquidity(options['window'], min_bars=options['min_bars'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated liquidity for {updated} symbols in {time.perf_counter() - started:.2f}s"
+        ))
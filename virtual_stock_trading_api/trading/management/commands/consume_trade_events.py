@@ -0,0 +1,19 @@
+import json
+import socket
+from django.core.management.base import BaseCommand
+from trading.outbox import consume, get_client
+
+class Command(BaseCommand):
+    help = "Print trade events from the stream as JSON lines, as a consumer group member"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', default='cli')
+        parser.add_argument('--consumer', default=socket.gethostname())
+        parser.add_argument('--once', action='store_true',
+                            help="Exit when no new events arrive within the block timeout")
+        parser.add_argument('--block-ms', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        consume(get_client(), options['group'], options['consumer'],
+                lambda event: self.stdout.write(json.dumps(event)),
+                block_ms=options['block_ms'], once=options['once'])
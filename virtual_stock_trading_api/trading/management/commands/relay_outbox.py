@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from trading.outbox import get_client, relay
+
+class Command(BaseCommand):
+    help = "Publish committed trade events from the outbox to the Redis stream"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once the outbox is drained instead of polling")
+        parser.add_argument('--poll-seconds', type=float)
+
+    def handle(self, *args, **options):
+        total = relay(get_client(), once=options['once'], poll_seconds=options['poll_seconds'],
+                      log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Published {total} events"))
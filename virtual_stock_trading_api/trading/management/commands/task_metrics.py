@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from virtual_stock_trading_api.task_metrics import BUCKETS, read_metrics, reset_metrics
+
+class Command(BaseCommand):
+    help = "Show run counts and durations per Celery task, as recorded by the workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Clear the counters after printing them")
+
+    def handle(self, *args, **options):
+        rows = read_metrics()
+        if not rows:
+            self.stdout.write("No task metrics recorded yet")
+        else:
+            buckets = [f"le_{bound}" for bound in BUCKETS + ('inf',)]
+            self.stdout.write(f"{'task':<52} {'runs':>7} {'fail':>5} {'retry':>5} {'mean ms':>10} {'max ms':>10}  "
+                              + ' '.join(f"{'<=' + name[3:]:>7}" for name in buckets))
+            for row in rows:
+                self.stdout.write(
+                    f"{row['task']:<52} {row['runs']:>7} {row['failures']:>5} {row['retries']:>5} "
+                    f"{row['mean_ms']:>10.1f} {row['max_ms']:>10.1f}  "
+                    + ' '.join(f"{row['buckets'][name]:>7}" for name in buckets)
+                )
+        if options['reset']:
+            self.stdout.write(f"Cleared metrics for {reset_metrics()} tasks")
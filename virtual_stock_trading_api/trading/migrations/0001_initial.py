@@ -0,0 +1,28 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_type', models.CharField(choices=[('trade.executed', 'Trade executed')], max_length=50)),
+                ('portfolio_id', models.BigIntegerField()),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['published_at', 'id'], name='trading_out_publish_40a441_idx')],
+            },
+        ),
+    ]
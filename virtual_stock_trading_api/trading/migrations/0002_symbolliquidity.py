@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-19 15:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0003_watchlists'),
+        ('trading', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SymbolLiquidity',
+            fields=[
+                ('stock', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='liquidity', serialize=False, to='stocks.stock')),
+                ('average_daily_volume', models.FloatField()),
+                ('daily_volatility', models.FloatField()),
+                ('spread_bps', models.FloatField()),
+                ('bars', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'symbol liquidity',
+            },
+        ),
+    ]
@@ -1,3 +1,47 @@
 from django.db import models
 
-# Create your models here.
+class OutboxEvent(models.Model):
+    """
+    Trade event written in the same DB transaction as the trade, then
+    published to the Redis stream by the relay
+    """
+    TRADE_EXECUTED = 'trade.executed'
+
+    EVENT_TYPES = [
+        (TRADE_EXECUTED, 'Trade executed'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    event_type = models.CharField(max_length=50, choices=EVENT_TYPES)
+    portfolio_id = models.BigIntegerField()
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The relay scans unpublished events in id order
+            models.Index(fields=['published_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.id} (portfolio {self.portfolio_id})"
+
+class SymbolLiquidity(models.Model):
+    """
+    Per-symbol liquidity parameters for the execution model, computed in
+    batch from recent daily bars by `manage.py compute_liquidity`
+    """
+    stock = models.OneToOneField('stocks.Stock', on_delete=models.CASCADE, primary_key=True,
+                                 related_name='liquidity')
+    average_daily_volume = models.FloatField()
+    daily_volatility = models.FloatField()
+    spread_bps = models.FloatField()
+    bars = models.PositiveIntegerField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = 'symbol liquidity'
+
+    def __str__(self):
+        return f"{self.stock_id}: ADV {self.average_daily_volume:.0f}, vol {self.daily_volatility:.4f}"
@@ -0,0 +1,167 @@
+import datetime
+import json
+import time
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from portfolios.sharding import current_database, for_each_shard
+from .models import OutboxEvent
+
+# Transactional outbox for trade events
+#
+# Trade views append an OutboxEvent inside the trade's transaction, so an
+# event exists exactly when the trade committed. With sharding the event is
+# written to the portfolio's shard along with the rest of the trade, and the
+# relay drains every shard in turn, copying unpublished events to a Redis
+# stream in id order and marking them published. Delivery is at-least-once:
+# if the relay dies between XADD and marking the batch, the batch is sent
+# again, so consumers should skip event ids they have seen (event ids are
+# unique across shards).
+#
+# Consumers read the stream through a consumer group. Each group keeps its
+# own offset, and entries stay pending until acknowledged, so a consumer
+# that crashes picks up where it left off.
+
+def emit_trade(portfolio, stock, transaction_type, quantity, price, position_quantity,
+               average_price, realized=None):
+    """
+    Record a trade event on the portfolio's database; call inside the
+    trade's transaction.atomic() for that database
+    """
+    payload = {
+        'portfolio_id': portfolio.id,
+        'user_id': portfolio.user_id,
+        'symbol': stock.symbol,
+        'side': transaction_type,
+        'quantity': quantity,
+        'price': str(price),
+        'cash_balance': str(portfolio.cash_balance),
+        'position_quantity': position_quantity,
+        'average_price': str(average_price) if position_quantity else None,
+        'realized_profit_loss': None if realized is None else str(realized),
+        'executed_at': timezone.now().isoformat(),
+    }
+    return OutboxEvent.objects.using(portfolio._state.db).create(
+        event_type=OutboxEvent.TRADE_EXECUTED,
+        portfolio_id=portfolio.id,
+        payload=payload
+    )
+
+def get_client():
+    # Only the relay and consumers talk to Redis; web workers never import it
+    import redis
+    return redis.Redis.from_url(settings.OUTBOX_REDIS_URL, decode_responses=True)
+
+def publish_pending(client, stream=None, batch_size=None):
+    """
+    Publish one batch of unpublished events from the active shard (or the
+    default database). Returns how many were sent.
+    """
+    stream = stream or settings.OUTBOX_STREAM
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    with transaction.atomic(using=current_database()):
+        # skip_locked lets several relays share the backlog on PostgreSQL
+        events = list(OutboxEvent.objects
+                      .filter(published_at__isnull=True)
+                      .order_by('id')
+                      .select_for_update(skip_locked=True)[:batch_size])
+        if not events:
+            return 0
+
+        pipe = client.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(stream, {
+                'event_id': event.id,
+                'type': event.event_type,
+                'portfolio_id': event.portfolio_id,
+                'payload': json.dumps(event.payload),
+            }, maxlen=settings.OUTBOX_STREAM_MAXLEN, approximate=True)
+        # A Redis error here rolls back, leaving the batch unpublished
+        pipe.execute()
+
+        OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(published_at=timezone.now())
+    return len(events)
+
+def prune_published(older_than_hours=None):
+    """
+    Delete events that were published long enough ago, on every shard
+    """
+    hours = settings.OUTBOX_RETENTION_HOURS if older_than_hours is None else older_than_hours
+    cutoff = timezone.now() - datetime.timedelta(hours=hours)
+    return sum(count for count, _ in for_each_shard(
+        lambda: OutboxEvent.objects.filter(published_at__lt=cutoff).delete()
+    ))
+
+def relay(client, once=False, poll_seconds=None, log=None):
+    """
+    Publish until the outbox is drained; keep polling unless `once`.
+    While idle, published events past the retention window are pruned hourly.
+    """
+    poll_seconds = settings.OUTBOX_POLL_SECONDS if poll_seconds is None else poll_seconds
+    total = 0
+    pruned_at = 0
+    while True:
+        sent = sum(for_each_shard(publish_pending, client))
+        total += sent
+        if sent and log:
+            log(f"Published {sent} events")
+        if not sent:
+            if once:
+                return total
+            if time.monotonic() - pruned_at > 3600:
+                prune_published()
+                pruned_at = time.monotonic()
+            time.sleep(poll_seconds)
+
+def ensure_group(client, group, stream=None, start_id='0'):
+    """
+    Create a consumer group; start_id '0' replays the retained stream,
+    '$' only sees new events
+    """
+    import redis
+    try:
+        client.xgroup_create(stream or settings.OUTBOX_STREAM, group, id=start_id, mkstream=True)
+    except redis.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+def decode_entry(fields):
+    return {
+        'event_id': int(fields['event_id']),
+        'type': fields['type'],
+        'portfolio_id': int(fields['portfolio_id']),
+        'payload': json.loads(fields['payload']),
+    }
+
+def consume(client, group, consumer, handler, stream=None, count=100, block_ms=5000,
+            claim_idle_ms=60000, once=False):
+    """
+    Feed stream entries to handler(event) and acknowledge the ones it
+    handled without raising. Entries left pending by a consumer that stopped for more
+    than claim_idle_ms are claimed and retried first.
+    """
+    stream = stream or settings.OUTBOX_STREAM
+    ensure_group(client, group, stream)
+    while True:
+        # Take over stale entries, then retry everything pending for this consumer
+        client.xautoclaim(stream, group, consumer, min_idle_time=claim_idle_ms,
+                          start_id='0-0', count=count, justid=True)
+        pending = client.xreadgroup(group, consumer, {stream: '0'}, count=count)
+        entries = pending[0][1] if pending else []
+        if not entries:
+            fresh = client.xreadgroup(group, consumer, {stream: '>'}, count=count, block=block_ms)
+            entries = fresh[0][1] if fresh else []
+
+        done = []
+        try:
+            for entry_id, fields in entries:
+                # Entries trimmed from the stream while pending come back without fields
+                if fields:
+                    handler(decode_entry(fields))
+                done.append(entry_id)
+        finally:
+            if done:
+                client.xack(stream, group, *done)
+
+        if once and not entries:
+            return
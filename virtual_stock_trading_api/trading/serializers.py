@@ -1,5 +1,10 @@
+from decimal import Decimal
 from rest_framework import serializers
 
+# Rule kinds handled by backtest.rule_signal; defined here so the API can
+# validate requests without importing NumPy
+RULE_TYPES = ('sma_cross', 'momentum', 'threshold')
+
 class TradeSerializer(serializers.Serializer):
     portfolio_id = serializers.IntegerField()
     stock_symbol = serializers.CharField(max_length=10)
@@ -8,4 +13,39 @@ class TradeSerializer(serializers.Serializer):
     def validate_quantity(self, value):
         if value <= 0:
             raise serializers.ValidationError("Quantity must be positive")
-        return value
\ No newline at end of file
+        return value
+
+class BacktestRuleSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=RULE_TYPES)
+    fast = serializers.IntegerField(min_value=1, required=False)
+    slow = serializers.IntegerField(min_value=2, required=False)
+    lookback = serializers.IntegerField(min_value=1, required=False)
+    buy_below = serializers.DecimalField(max_digits=15, decimal_places=2, required=False)
+    sell_above = serializers.DecimalField(max_digits=15, decimal_places=2, required=False)
+    
+    REQUIRED_PARAMS = {
+        'sma_cross': ['fast', 'slow'],
+        'momentum': ['lookback'],
+        'threshold': ['buy_below', 'sell_above'],
+    }
+    
+    def validate(self, attrs):
+        missing = [name for name in self.REQUIRED_PARAMS[attrs['type']] if name not in attrs]
+        if missing:
+            raise serializers.ValidationError(f"{attrs['type']} rule requires: {', '.join(missing)}")
+        if attrs['type'] == 'sma_cross' and attrs['fast'] >= attrs['slow']:
+            raise serializers.ValidationError("fast window must be shorter than slow window")
+        if attrs['type'] == 'threshold' and attrs['buy_below'] >= attrs['sell_above']:
+            raise serializers.ValidationError("buy_below must be lower than sell_above")
+        return attrs
+
+class BacktestSerializer(serializers.Serializer):
+    symbols = serializers.ListField(child=serializers.CharField(max_length=10), min_length=1, max_length=50)
+    rules = BacktestRuleSerializer(many=True)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    initial_cash = serializers.DecimalField(max_digits=15, decimal_places=2,
+                                            min_value=Decimal('1.00'), default=Decimal('10000.00'))
+    
+    def validate_symbols(self, value):
+        return list(dict.fromkeys(symbol.upper() for symbol in value))
@@ -0,0 +1,11 @@
+from celery import shared_task
+from virtual_stock_trading_api.celery import app  # noqa: F401 (binds shared_task to the project app)
+from .liquidity import compute_liquidity
+
+@shared_task
+def refresh_liquidity():
+    """
+    Recompute execution liquidity parameters from the latest daily bars
+    """
+    updated = compute_liquidity()
+    return f"Updated liquidity for {updated} symbols"
@@ -1,3 +1,405 @@
-from django.test import TestCase
+import datetime
+import itertools
+import math
+from decimal import Decimal
+from unittest import mock
+import numpy as np
+import redis
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from portfolios.models import Portfolio, Transaction
+from stocks import cache as stock_cache
+from stocks.models import PriceBar, Stock
+from stocks.services import FinnhubService
+from . import execution
+from .backtest import _forward_fill, _sma, rule_signal, run_backtest
+from .execution import InstantExecution, Liquidity, MarketImpactExecution
+from .liquidity import _estimate, compute_liquidity
+from .models import OutboxEvent, SymbolLiquidity
+from .outbox import consume, ensure_group, prune_published, publish_pending, relay
 
-# Create your tests here.
+EXECUTION_DEFAULTS = dict(EXECUTION_DEFAULT_ADV=1000000, EXECUTION_DEFAULT_VOLATILITY=0.02,
+                          EXECUTION_DEFAULT_SPREAD_BPS=10, EXECUTION_MIN_SPREAD_BPS=1)
+
+@override_settings(**EXECUTION_DEFAULTS)
+class ExecutionModelTests(SimpleTestCase):
+    def setUp(self):
+        self.model = MarketImpactExecution(impact_coefficient=1.0, max_participation=0.1)
+        # 1M shares a day, 2% daily volatility, 10 bps spread
+        self.liquidity = Liquidity(1000000, 0.02, 10)
+
+    def test_instant_fills_everything_at_the_reference_price(self):
+        fill = InstantExecution().fill(Transaction.BUY, 10 ** 7, Decimal('100.00'))
+        self.assertEqual((fill.quantity, fill.unfilled, fill.price), (10 ** 7, 0, Decimal('100.00')))
+
+    def test_impact_price(self):
+        # Half spread 5 bps plus 0.02 * sqrt(10000 / 1M) = 20 bps
+        buy = self.model.fill(Transaction.BUY, 10000, Decimal('100.00'), self.liquidity)
+        sell = self.model.fill(Transaction.SELL, 10000, Decimal('100.00'), self.liquidity)
+        self.assertEqual((buy.quantity, buy.price), (10000, Decimal('100.25')))
+        self.assertEqual((sell.quantity, sell.price), (10000, Decimal('99.75')))
+        self.assertEqual(buy.total_cents, 10025 * 10000)
+
+    def test_partial_fill_caps_participation(self):
+        fill = self.model.fill(Transaction.BUY, 250000, Decimal('100.00'), self.liquidity)
+        self.assertEqual((fill.requested, fill.quantity, fill.unfilled), (250000, 100000, 150000))
+        # Impact is charged on the filled quantity: 5 bps + 0.02 * sqrt(0.1), rounded up
+        expected = math.ceil(100 * (1 + 0.0005 + 0.02 * math.sqrt(0.1)) * 100)
+        self.assertEqual(fill.price_cents, expected)
+
+    def test_no_participation_cap(self):
+        model = MarketImpactExecution(impact_coefficient=1.0, max_participation=0)
+        self.assertEqual(model.fill(Transaction.BUY, 250000, Decimal('100.00'), self.liquidity).quantity, 250000)
+
+    def test_nothing_fills_without_volume_or_price(self):
+        thin = Liquidity(5, 0.02, 10)
+        self.assertEqual(self.model.fill(Transaction.BUY, 100, Decimal('100.00'), thin).quantity, 0)
+        self.assertEqual(self.model.fill(Transaction.BUY, 100, Decimal('0.00'), self.liquidity).quantity, 0)
+
+    def test_rounds_against_the_taker(self):
+        # 0.5 bps of cost on $10.00 is a twentieth of a cent either way
+        tight = Liquidity(1000000, 0.0, 1)
+        self.assertEqual(self.model.fill(Transaction.BUY, 1, Decimal('10.00'), tight).price_cents, 1001)
+        self.assertEqual(self.model.fill(Transaction.SELL, 1, Decimal('10.00'), tight).price_cents, 999)
+
+    def test_liquidity_defaults(self):
+        liquidity = Liquidity()
+        self.assertEqual((liquidity.average_daily_volume, liquidity.daily_volatility, liquidity.spread_bps),
+                         (1000000, 0.02, 10))
+        # No recorded volume falls back to the default instead of blocking the symbol
+        self.assertEqual(Liquidity(0, 0.01, 5).average_daily_volume, 1000000)
+
+@override_settings(**EXECUTION_DEFAULTS)
+class SpreadEstimatorTests(SimpleTestCase):
+    def bars(self, log_mids, log_closes, half_range=0.01):
+        mids, closes = np.array(log_mids), np.array(log_closes)
+        return (np.exp(mids + half_range), np.exp(mids - half_range), np.exp(closes),
+                np.full(len(closes), 5000.0))
+
+    def test_spread_from_bounce_around_the_midpoint(self):
+        # Closes 10 bps either side of a flat midpoint: s^2 = 4 * 0.001^2, s = 20 bps
+        base = math.log(100)
+        closes = [base + 0.001 * (-1) ** t for t in range(6)]
+        adv, volatility, spread_bps = _estimate(*self.bars([base] * 6, closes))
+        self.assertAlmostEqual(spread_bps, 20.0, places=6)
+        self.assertEqual(adv, 5000.0)
+        # Five returns of +-20 bps around a small mean
+        self.assertAlmostEqual(volatility, float(np.diff(closes).std(ddof=1)), places=12)
+
+    def test_negative_estimate_floors_at_the_minimum_spread(self):
+        # Each close above its own midpoint and below the next one
+        base = math.log(100)
+        mids = [base + 0.002 * t for t in range(6)]
+        spread_bps = _estimate(*self.bars(mids, [mid + 0.001 for mid in mids]))[2]
+        self.assertEqual(spread_bps, 1)
+
+class ComputeLiquidityTests(TestCase):
+    def test_rows_from_recent_bars(self):
+        liquid = Stock.objects.create(symbol='LIQ', company_name='Liquid', last_price=Decimal('100.00'))
+        sparse = Stock.objects.create(symbol='SPR', company_name='Sparse', last_price=Decimal('100.00'))
+        start = datetime.date(2026, 1, 5)
+        PriceBar.objects.bulk_create(
+            [PriceBar(stock=liquid, date=start + datetime.timedelta(days=day), open=100, high=110, low=90,
+                      close=100, volume=1000 * (day + 1)) for day in range(10)]
+            + [PriceBar(stock=sparse, date=start, open=100, high=101, low=99, close=100, volume=10)]
+        )
+        self.assertEqual(compute_liquidity(window_days=20), 1)
+        row = SymbolLiquidity.objects.get(stock=liquid)
+        self.assertEqual((row.bars, row.average_daily_volume, row.daily_volatility), (10, 5500.0, 0.0))
+        # A flat close inside a fixed 90-110 range: s = 2 * (log 100 - (log 110 + log 90) / 2)
+        expected = 2 * (math.log(100) - (math.log(110) + math.log(90)) / 2) * 10000
+        self.assertAlmostEqual(row.spread_bps, expected, places=6)
+        self.assertFalse(SymbolLiquidity.objects.filter(stock=sparse).exists())
+
+class TradeExecutionTests(TestCase):
+    """
+    Buys through the API against a thin symbol: 10k shares a day, 20 bps spread
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='trader')
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Main', cash_balance=Decimal('100000.00'))
+        self.stock = Stock.objects.create(symbol='THIN', company_name='Thin', last_price=Decimal('10.00'))
+        SymbolLiquidity.objects.create(stock=self.stock, average_daily_volume=10000, daily_volatility=0.02,
+                                       spread_bps=20, bars=60, updated_at=timezone.now())
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def buy(self, quantity):
+        with mock.patch.object(execution, '_model', None):
+            response = self.client.post('/api/trading/buy/', {'portfolio_id': self.portfolio.id,
+                                                              'stock_symbol': 'THIN', 'quantity': quantity},
+                                        format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    @override_settings(EXECUTION_MODEL='instant')
+    def test_instant_fills_in_full_at_the_last_price(self):
+        self.assertEqual(self.buy(5000)['filled_quantity'], 5000)
+        self.assertEqual(Transaction.objects.get(portfolio=self.portfolio).price, Decimal('10.00'))
+
+    @override_settings(EXECUTION_MODEL='impact', EXECUTION_IMPACT_COEFFICIENT=1.0, EXECUTION_MAX_PARTICIPATION=0.1)
+    def test_impact_fills_large_orders_partially(self):
+        body = self.buy(5000)
+        # 10% of the daily volume, at 10 bps half spread + 0.02 * sqrt(0.1)
+        self.assertEqual((body['requested_quantity'], body['filled_quantity']), (5000, 1000))
+        price = Decimal(math.ceil(10 * (1 + 0.001 + 0.02 * math.sqrt(0.1)) * 100)) / 100
+        self.assertEqual(Decimal(body['transaction_total']), price * 1000)
+        txn = Transaction.objects.get(portfolio=self.portfolio)
+        self.assertEqual((txn.quantity, txn.price), (1000, price))
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.cash_balance, Decimal('100000.00') - price * 1000)
+
+class UnknownSymbolTests(TestCase):
+    """
+    Buying a symbol the profile marks unknown costs no quote call
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='typo')
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Main')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def buy(self, symbol):
+        with mock.patch.object(FinnhubService, 'get_quote') as get_quote:
+            response = self.client.post('/api/trading/buy/', {'portfolio_id': self.portfolio.id,
+                                                              'stock_symbol': symbol, 'quantity': 1},
+                                        format='json')
+        self.assertEqual(response.status_code, 404, response.content)
+        get_quote.assert_not_called()
+        self.assertFalse(Stock.objects.filter(symbol=symbol).exists())
+
+    def test_cached_unknown_symbol(self):
+        stock_cache.set_not_found('NOPE')
+        with mock.patch.object(FinnhubService, 'fetch_company_profile') as fetch:
+            self.buy('NOPE')
+        fetch.assert_not_called()
+
+    def test_empty_profile_upstream(self):
+        with mock.patch.object(FinnhubService, 'fetch_company_profile', return_value={}):
+            self.buy('GONE')
+        self.assertTrue(stock_cache.is_known_missing('GONE'))
+
+# Synthetic closes for the backtest tests: one symbol dipping to 8 and recovering to 12
+DIP = [10.0, 8.0, 9.0, 12.0, 11.0]
+
+class BacktestEngineTests(SimpleTestCase):
+    def test_sma(self):
+        closes = np.array([[1.0], [2.0], [3.0], [np.nan], [5.0], [6.0]])
+        sma = _sma(closes, 2)[:, 0]
+        # NaN until the window is full and wherever it spans a missing bar
+        np.testing.assert_array_equal(np.isnan(sma), [True, False, False, True, True, False])
+        np.testing.assert_allclose(sma[[1, 2, 5]], [1.5, 2.5, 5.5])
+
+    def test_forward_fill(self):
+        closes = np.array([[np.nan, 1.0], [2.0, np.nan], [np.nan, np.nan], [4.0, 5.0]])
+        filled, seen = _forward_fill(closes)
+        np.testing.assert_array_equal(filled[1:], [[2.0, 1.0], [2.0, 1.0], [4.0, 5.0]])
+        np.testing.assert_array_equal(seen[:, 0], [False, True, True, True])
+
+    def test_signals(self):
+        closes = np.array(DIP)[:, None]
+        threshold = rule_signal({'type': 'threshold', 'buy_below': 8, 'sell_above': 12}, closes)[:, 0]
+        self.assertEqual(threshold.tolist(), [False, True, True, False, False])
+        momentum = rule_signal({'type': 'momentum', 'lookback': 1}, closes)[:, 0]
+        self.assertEqual(momentum.tolist(), [False, False, True, True, False])
+        cross = rule_signal({'type': 'sma_cross', 'fast': 1, 'slow': 2}, closes)[:, 0]
+        self.assertEqual(cross.tolist(), [False, False, True, True, False])
+
+    def test_inverted_threshold_is_rejected(self):
+        with self.assertRaises(ValueError):
+            rule_signal({'type': 'threshold', 'buy_below': 12, 'sell_above': 8}, np.array(DIP)[:, None])
+
+    def test_threshold_pnl(self):
+        result = run_backtest(np.array(DIP)[:, None], ['DIP'],
+                              [{'type': 'threshold', 'buy_below': 8, 'sell_above': 12}], 100.0)
+        # 12 shares at 8 leave $4 of cash; they are sold at 12
+        self.assertEqual(result['trades'], [(1, 'DIP', 'BUY', 12, 8.0), (3, 'DIP', 'SELL', 12, 12.0)])
+        self.assertEqual(result['cash_balance'], [100.0, 4.0, 4.0, 148.0, 148.0])
+        self.assertEqual(result['stock_value'], [0.0, 96.0, 108.0, 0.0, 0.0])
+        self.assertEqual(result['total_value'], [100.0, 100.0, 112.0, 148.0, 148.0])
+        self.assertAlmostEqual(result['total_return'], 0.48)
+        self.assertEqual(result['max_drawdown'], 0.0)
+
+    def test_momentum_pnl_with_two_symbols(self):
+        # The second symbol has no bar on day 0 and is flat afterwards
+        closes = np.array([[10.0, np.nan], [11.0, 20.0], [9.0, 20.0], [10.0, 20.0]])
+        result = run_backtest(closes, ['UP', 'FLAT'], [{'type': 'momentum', 'lookback': 1}], 200.0)
+        # Half the cash per symbol: 9 shares of UP at 11, sold at 9, then 8 of the $82 left bought at 10
+        self.assertEqual(result['trades'], [(1, 'UP', 'BUY', 9, 11.0), (2, 'UP', 'SELL', 9, 9.0),
+                                            (3, 'UP', 'BUY', 8, 10.0)])
+        self.assertEqual(result['cash_balance'], [200.0, 101.0, 182.0, 102.0])
+        self.assertEqual(result['total_value'], [200.0, 200.0, 182.0, 182.0])
+        self.assertAlmostEqual(result['total_return'], -0.09)
+        self.assertAlmostEqual(result['max_drawdown'], 0.09)
+
+class BacktestViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='backtester'))
+        stock = Stock.objects.create(symbol='DIP', company_name='Dip', last_price=Decimal('11.00'))
+        start = datetime.date(2026, 3, 2)
+        PriceBar.objects.bulk_create([
+            PriceBar(stock=stock, date=start + datetime.timedelta(days=day), open=close, high=close, low=close,
+                     close=close)
+            for day, close in enumerate(DIP)
+        ])
+
+    def post(self, data):
+        # Run inline instead of in the process pool
+        inline = lambda jobs, max_workers: [run_backtest(*job) for job in jobs]
+        with mock.patch('trading.backtest.run_backtests', inline):
+            return self.client.post('/api/trading/backtest/', data, format='json')
+
+    def test_equity_curve(self):
+        response = self.post({'symbols': ['dip'], 'initial_cash': '100.00',
+                              'rules': [{'type': 'threshold', 'buy_below': '8.00', 'sell_above': '12.00'}]})
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        self.assertAlmostEqual(body['total_return'], 0.48)
+        self.assertEqual([(trade['date'], trade['transaction_type'], trade['quantity']) for trade in body['trades']],
+                         [('2026-03-03', 'BUY', 12), ('2026-03-05', 'SELL', 12)])
+        self.assertEqual(body['equity_curve'][2], {'date': '2026-03-04', 'cash_balance': 4.0,
+                                                   'stock_value': 108.0, 'total_value': 112.0})
+
+    def test_inverted_threshold_is_a_bad_request(self):
+        for buy_below, sell_above in (('12.00', '8.00'), ('10.00', '10.00')):
+            response = self.post({'symbols': ['DIP'],
+                                  'rules': [{'type': 'threshold', 'buy_below': buy_below, 'sell_above': sell_above}]})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('buy_below must be lower than sell_above', str(response.json()))
+
+class FakeStreams:
+    """
+    The slice of the redis-py stream API the outbox uses, for one process.
+    Pending entries are always idle enough to be claimed.
+    """
+    def __init__(self):
+        self.streams = {}
+        self.groups = {}
+        self.ids = itertools.count(1)
+        self.fail_next_execute = False
+
+    def pipeline(self, transaction=True):
+        client = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def xadd(self, *args, **kwargs):
+                self.calls.append((args, kwargs))
+
+            def execute(self):
+                if client.fail_next_execute:
+                    client.fail_next_execute = False
+                    raise redis.ConnectionError("connection lost")
+                return [client.xadd(*args, **kwargs) for args, kwargs in self.calls]
+
+        return Pipeline()
+
+    def xadd(self, stream, fields, maxlen=None, approximate=True):
+        entry_id = f"{next(self.ids)}-0"
+        self.streams.setdefault(stream, []).append((entry_id, {key: str(value) for key, value in fields.items()}))
+        return entry_id
+
+    def xgroup_create(self, stream, group, id='$', mkstream=False):
+        if (stream, group) in self.groups:
+            raise redis.ResponseError("BUSYGROUP Consumer Group name already exists")
+        entries = self.streams.setdefault(stream, [])
+        self.groups[(stream, group)] = {'delivered': 0 if id == '0' else len(entries), 'pending': {}}
+
+    def xautoclaim(self, stream, group, consumer, min_idle_time, start_id='0-0', count=None, justid=False):
+        pending = self.groups[(stream, group)]['pending']
+        claimed = list(pending)[:count]
+        for entry_id in claimed:
+            pending[entry_id] = consumer
+        return claimed
+
+    def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        (stream, start), = streams.items()
+        state = self.groups[(stream, group)]
+        entries = dict(self.streams[stream])
+        if start == '0':
+            ids = [entry_id for entry_id, owner in state['pending'].items() if owner == consumer][:count]
+            return [[stream, [(entry_id, entries[entry_id]) for entry_id in ids]]]
+        fresh = self.streams[stream][state['delivered']:state['delivered'] + count]
+        if not fresh:
+            return []
+        state['delivered'] += len(fresh)
+        for entry_id, _ in fresh:
+            state['pending'][entry_id] = consumer
+        return [[stream, fresh]]
+
+    def xack(self, stream, group, *entry_ids):
+        for entry_id in entry_ids:
+            self.groups[(stream, group)]['pending'].pop(entry_id, None)
+
+@override_settings(OUTBOX_STREAM='trades', OUTBOX_BATCH_SIZE=2, EXECUTION_MODEL='instant')
+class OutboxTests(TestCase):
+    """
+    Trade events from the API through the relay to consumer groups
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='outbox')
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Main', cash_balance=Decimal('100.00'))
+        Stock.objects.create(symbol='OBX', company_name='Outbox Inc', last_price=Decimal('10.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.redis = FakeStreams()
+
+    def buy(self, quantity):
+        with mock.patch.object(execution, '_model', None):
+            return self.client.post('/api/trading/buy/', {'portfolio_id': self.portfolio.id, 'stock_symbol': 'OBX',
+                                                          'quantity': quantity}, format='json')
+
+    def test_event_is_written_with_the_trade(self):
+        self.assertEqual(self.buy(3).status_code, 201)
+        # Not enough cash: no trade, so no event
+        self.assertEqual(self.buy(50).status_code, 400)
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.event_type, event.portfolio_id), (OutboxEvent.TRADE_EXECUTED, self.portfolio.id))
+        self.assertEqual({key: event.payload[key] for key in ('symbol', 'side', 'quantity', 'price', 'cash_balance')},
+                         {'symbol': 'OBX', 'side': 'BUY', 'quantity': 3, 'price': '10.00', 'cash_balance': '70.00'})
+        self.assertIsNone(event.published_at)
+
+    def test_publish_in_batches(self):
+        for _ in range(3):
+            self.buy(1)
+        self.redis.fail_next_execute = True
+        with self.assertRaises(redis.ConnectionError):
+            publish_pending(self.redis)
+        # The failed batch stays unpublished and goes out again
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=False).exists())
+        self.assertEqual(relay(self.redis, once=True), 3)
+        self.assertEqual(publish_pending(self.redis), 0)
+        events = list(OutboxEvent.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual([int(fields['event_id']) for _, fields in self.redis.streams['trades']], events)
+
+        self.assertEqual(prune_published(older_than_hours=1), 0)
+        self.assertEqual(prune_published(older_than_hours=0), 3)
+
+    def test_consumers_ack_only_handled_events(self):
+        for _ in range(3):
+            self.buy(1)
+        relay(self.redis, once=True)
+        ensure_group(self.redis, 'audit')
+        # A second create of the same group is a no-op
+        ensure_group(self.redis, 'audit')
+
+        seen = []
+        def flaky(event):
+            if event['payload']['cash_balance'] == '80.00':
+                raise RuntimeError("downstream unavailable")
+            seen.append(event['payload']['cash_balance'])
+
+        with self.assertRaises(RuntimeError):
+            consume(self.redis, 'audit', 'worker-1', flaky, count=10, once=True)
+        self.assertEqual(seen, ['90.00'])
+
+        # Another consumer takes over what worker-1 left pending
+        consume(self.redis, 'audit', 'worker-2', lambda event: seen.append(event['payload']['cash_balance']),
+                count=10, once=True)
+        self.assertEqual(seen, ['90.00', '80.00', '70.00'])
+        self.assertEqual(self.redis.groups[('trades', 'audit')]['pending'], {})
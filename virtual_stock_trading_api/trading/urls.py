@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import BuyStockView, SellStockView
+from .views import BuyStockView, SellStockView, BacktestView
 
 urlpatterns = [
     path('buy/', BuyStockView.as_view(), name='buy-stock'),
     path('sell/', SellStockView.as_view(), name='sell-stock'),
+    path('backtest/', BacktestView.as_view(), name='backtest'),
 ]
\ No newline at end of file
@@ -1,18 +1,34 @@
 from django.shortcuts import render
+from django.conf import settings
 from decimal import Decimal
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from django.db import transaction
 from portfolios.models import Portfolio, Position, Transaction
-from stocks.models import Stock
+from portfolios.corporate_actions import action_in_progress, lock_actions
+from portfolios.ledger import record_transaction
+from portfolios.money import to_cents, from_cents
+from portfolios.sharding import ShardedViewMixin
+from portfolios.lots import apply_buy, apply_sell
+from risk.exposure import record_fill
+from stocks.models import Stock, PriceBar
 from stocks.services import FinnhubService
-from .serializers import TradeSerializer
+from .serializers import TradeSerializer, BacktestSerializer
+from .outbox import emit_trade
+from .execution import execute
 
 # Trading Viewsets
 
-class BuyStockView(generics.CreateAPIView):
+def action_conflict(stock_symbol):
+    return Response(
+        {"error": f"A corporate action for {stock_symbol} is being applied; try again shortly"},
+        status=status.HTTP_409_CONFLICT
+    )
+
+class BuyStockView(ShardedViewMixin, generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = TradeSerializer
+    throttle_scope = 'upstream'
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -25,22 +41,42 @@ class BuyStockView(generics.CreateAPIView):
         
         try:
             # Check if portfolio belongs to the user
-            portfolio = Portfolio.objects.get(id=portfolio_id, user=request.user)
+            portfolio = Portfolio.objects.select_related('competition').get(id=portfolio_id, user=request.user)
         except Portfolio.DoesNotExist:
             return Response(
                 {"error": "Portfolio not found or access denied"},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        # Contest portfolios only trade while their competition is running
+        if portfolio.competition is not None and not portfolio.competition.is_open():
+            return Response(
+                {"error": f"Competition {portfolio.competition.name} is not open for trading"},
+                status=status.HTTP_403_FORBIDDEN
+            )
             
         try:
+            finnhub_service = FinnhubService()
+            company_data = None
+            if not Stock.objects.filter(symbol=stock_symbol).exists():
+                # The profile is checked first so known-unknown symbols skip the quote call
+                # (an empty profile means the symbol is unknown; None an upstream failure)
+                company_data = finnhub_service.get_company_profile(stock_symbol)
+                if company_data is not None and not company_data.get('name'):
+                    return Response(
+                        {"error": "Stock not found"},
+                        status=status.HTTP_404_NOT_FOUND
+                    )
+            
             # Get or create the stock
             stock, created = Stock.objects.get_or_create(symbol=stock_symbol)
             
             # If stock was just created or doesn't have a price, fetch it from Finnhub
             if created or stock.last_price == Decimal('0.00'):
-                finnhub_service = FinnhubService()
                 stock_data = finnhub_service.get_quote(stock_symbol)
-                company_data = finnhub_service.get_company_profile(stock_symbol)
+                if not created:
+                    # A new stock's profile was fetched above
+                    company_data = finnhub_service.get_company_profile(stock_symbol)
                 
                 if not stock_data or 'c' not in stock_data:
                     return Response(
@@ -48,7 +84,7 @@ class BuyStockView(generics.CreateAPIView):
                         status=status.HTTP_503_SERVICE_UNAVAILABLE
                     )
                     
-                stock.last_price = Decimal(str(stock_data['c']))
+                stock.last_price = from_cents(to_cents(stock_data['c']))
                 
                 if company_data and 'name' in company_data:
                     stock.company_name = company_data['name']
@@ -57,8 +93,20 @@ class BuyStockView(generics.CreateAPIView):
                     
                 stock.save()
             
-            current_price = stock.last_price
-            total_cost = current_price * Decimal(str(quantity))
+            # Holders are being adjusted for a split or dividend
+            if action_in_progress(stock):
+                return action_conflict(stock_symbol)
+            
+            # Price the order against the symbol's liquidity; large orders fill partially
+            fill = execute(stock, Transaction.BUY, quantity)
+            if not fill.quantity:
+                return Response(
+                    {"error": "No liquidity available for this order"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            quantity = fill.quantity
+            current_price = fill.price
+            total_cost = from_cents(fill.total_cents)
             
             # Check if enough cash in portfolio
             if portfolio.cash_balance < total_cost:
@@ -67,14 +115,30 @@ class BuyStockView(generics.CreateAPIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
                 
-            # Execute the trade
-            with transaction.atomic():
+            # Execute the trade; every write (outbox event and exposure included)
+            # commits on the portfolio's shard. The default database only holds
+            # the corporate action locks taken below.
+            with transaction.atomic(), transaction.atomic(using=portfolio._state.db):
+                # Re-check under the lock apply_chunk holds, so an action can't
+                # start between the check above and these writes
+                if lock_actions(stock):
+                    return action_conflict(stock_symbol)
+                
+                # Cash may have moved (a dividend) since the portfolio was loaded
+                portfolio.cash_balance = (Portfolio.objects.select_for_update()
+                                          .values_list('cash_balance', flat=True).get(pk=portfolio.pk))
+                if portfolio.cash_balance < total_cost:
+                    return Response(
+                        {"error": "Insufficient funds in portfolio"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
                 # Update portfolio cash balance
                 portfolio.cash_balance -= total_cost
                 portfolio.save()
                 
                 # Update or create position
-                position, created = Position.objects.get_or_create(
+                position, created = Position.objects.select_for_update().get_or_create(
                     portfolio=portfolio,
                     stock=stock,
                     defaults={
@@ -83,18 +147,20 @@ class BuyStockView(generics.CreateAPIView):
                     }
                 )
                 
+                # Open a tax lot; the average price is derived from the open lots
+                average_price = apply_buy(
+                    portfolio, stock, quantity, current_price,
+                    held_before=0 if created else position.quantity,
+                    fallback_price=position.average_buy_price
+                )
+                
                 if not created:
-                    # Update average purchase price
-                    total_shares = position.quantity + quantity
-                    position.average_buy_price = (
-                        (position.quantity * position.average_buy_price) + 
-                        (quantity * current_price)
-                    ) / total_shares
-                    position.quantity = total_shares
+                    position.quantity += quantity
+                    position.average_buy_price = average_price
                     position.save()
                 
                 # Record the transaction
-                Transaction.objects.create(
+                record_transaction(
                     portfolio=portfolio,
                     stock=stock,
                     transaction_type=Transaction.BUY,
@@ -102,10 +168,20 @@ class BuyStockView(generics.CreateAPIView):
                     price=current_price
                 )
                 
+                # Publish the trade to downstream consumers once committed
+                emit_trade(portfolio, stock, Transaction.BUY, quantity, current_price,
+                           position.quantity, position.average_buy_price)
+                
+                # Book-wide exposure for the symbol
+                record_fill(stock, quantity, holder_delta=1 if created else 0)
+                
             return Response({
                 "message": f"Successfully bought {quantity} shares of {stock_symbol} at ${current_price}",
                 "portfolio_balance": portfolio.cash_balance,
                 "transaction_total": total_cost,
+                "requested_quantity": fill.requested,
+                "filled_quantity": fill.quantity,
+                "reference_price": fill.reference_price,
                 "current_position": {
                     "symbol": stock.symbol,
                     "quantity": position.quantity,
@@ -119,9 +195,10 @@ class BuyStockView(generics.CreateAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class SellStockView(generics.CreateAPIView):
+class SellStockView(ShardedViewMixin, generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = TradeSerializer
+    throttle_scope = 'upstream'
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -134,12 +211,19 @@ class SellStockView(generics.CreateAPIView):
             
         try:
             # Check if portfolio belongs to the user
-            portfolio = Portfolio.objects.get(id=portfolio_id, user=request.user)
+            portfolio = Portfolio.objects.select_related('competition').get(id=portfolio_id, user=request.user)
         except Portfolio.DoesNotExist:
             return Response(
                 {"error": "Portfolio not found or access denied"},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        # Contest portfolios only trade while their competition is running
+        if portfolio.competition is not None and not portfolio.competition.is_open():
+            return Response(
+                {"error": f"Competition {portfolio.competition.name} is not open for trading"},
+                status=status.HTTP_403_FORBIDDEN
+            )
             
         try:
             # Get the stock
@@ -164,24 +248,59 @@ class SellStockView(generics.CreateAPIView):
             stock_data = finnhub_service.get_quote(stock_symbol)
             
             if stock_data and 'c' in stock_data:
-                stock.last_price = Decimal(str(stock_data['c']))
+                stock.last_price = from_cents(to_cents(stock_data['c']))
                 stock.save()
                 
-            current_price = stock.last_price
-            total_value = current_price * Decimal(str(quantity))
+            # Holders are being adjusted for a split or dividend
+            if action_in_progress(stock):
+                return action_conflict(stock_symbol)
             
-            # Execute the trade
-            with transaction.atomic():
+            fill = execute(stock, Transaction.SELL, quantity)
+            if not fill.quantity:
+                return Response(
+                    {"error": "No liquidity available for this order"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            quantity = fill.quantity
+            current_price = fill.price
+            total_value = from_cents(fill.total_cents)
+            
+            # Execute the trade; every write (outbox event and exposure included)
+            # commits on the portfolio's shard. The default database only holds
+            # the corporate action locks taken below.
+            with transaction.atomic(), transaction.atomic(using=portfolio._state.db):
+                # Re-check under the lock apply_chunk holds, then re-read the
+                # position and cash, which a chunk may have adjusted meanwhile
+                if lock_actions(stock):
+                    return action_conflict(stock_symbol)
+                
+                position = Position.objects.select_for_update().filter(pk=position.pk).first()
+                if position is None or position.quantity < quantity:
+                    return Response(
+                        {"error": f"Not enough shares to sell. You have {position.quantity if position else 0} shares."},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                portfolio.cash_balance = (Portfolio.objects.select_for_update()
+                                          .values_list('cash_balance', flat=True).get(pk=portfolio.pk))
+                
                 # Update portfolio cash balance
                 portfolio.cash_balance += total_value
                 portfolio.save()
                 
+                # Close tax lots and book the realized profit/loss
+                realized, average_price = apply_sell(
+                    portfolio, stock, quantity, current_price,
+                    held_before=position.quantity,
+                    fallback_price=position.average_buy_price
+                )
+                
                 # Update position
                 position.quantity -= quantity
                 if position.quantity == 0:
                     position.delete()
                     position_data = "No position"
                 else:
+                    position.average_buy_price = average_price
                     position.save()
                     position_data = {
                         "symbol": stock.symbol,
@@ -190,7 +309,7 @@ class SellStockView(generics.CreateAPIView):
                     }
                 
                 # Record the transaction
-                Transaction.objects.create(
+                record_transaction(
                     portfolio=portfolio,
                     stock=stock,
                     transaction_type=Transaction.SELL,
@@ -198,10 +317,21 @@ class SellStockView(generics.CreateAPIView):
                     price=current_price
                 )
                 
+                # Publish the trade to downstream consumers once committed
+                emit_trade(portfolio, stock, Transaction.SELL, quantity, current_price,
+                           position.quantity, position.average_buy_price, realized=realized)
+                
+                # Book-wide exposure for the symbol
+                record_fill(stock, -quantity, holder_delta=-1 if position.quantity == 0 else 0)
+                
             return Response({
                 "message": f"Successfully sold {quantity} shares of {stock_symbol} at ${current_price}",
                 "portfolio_balance": portfolio.cash_balance,
                 "transaction_total": total_value,
+                "requested_quantity": fill.requested,
+                "filled_quantity": fill.quantity,
+                "reference_price": fill.reference_price,
+                "realized_profit_loss": realized,
                 "current_position": position_data
             }, status=status.HTTP_200_OK)
             
@@ -215,3 +345,83 @@ class SellStockView(generics.CreateAPIView):
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+def load_closes(symbols, start_date=None, end_date=None):
+    """
+    Load daily closes as a (dates, symbols) array with NaN for missing bars
+    """
+    # NumPy is only needed by backtests, so keep it out of worker start-up
+    import numpy as np
+    
+    bars = PriceBar.objects.filter(stock__symbol__in=symbols)
+    if start_date:
+        bars = bars.filter(date__gte=start_date)
+    if end_date:
+        bars = bars.filter(date__lte=end_date)
+    rows = list(bars.values_list('date', 'stock__symbol', 'close').order_by('date'))
+    
+    dates = sorted({row[0] for row in rows})
+    date_index = {date: i for i, date in enumerate(dates)}
+    symbol_index = {symbol: j for j, symbol in enumerate(symbols)}
+    closes = np.full((len(dates), len(symbols)), np.nan)
+    for date, symbol, close in rows:
+        closes[date_index[date], symbol_index[symbol]] = float(close)
+    return dates, closes
+
+class BacktestView(generics.GenericAPIView):
+    """
+    Replay one strategy, or a list of strategies in parallel, against stored price bars
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = BacktestSerializer
+    throttle_scope = 'backtest'
+    
+    def post(self, request, *args, **kwargs):
+        many = isinstance(request.data, list)
+        serializer = self.get_serializer(data=request.data, many=many)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        strategies = serializer.validated_data if many else [serializer.validated_data]
+        
+        if len(strategies) > settings.BACKTEST_MAX_BATCH:
+            return Response(
+                {"error": f"At most {settings.BACKTEST_MAX_BATCH} strategies per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        jobs = []
+        calendars = []
+        for strategy in strategies:
+            dates, closes = load_closes(strategy['symbols'], strategy.get('start_date'), strategy.get('end_date'))
+            if not dates:
+                return Response(
+                    {"error": f"No price history for {', '.join(strategy['symbols'])}"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            calendars.append(dates)
+            jobs.append((closes, strategy['symbols'], strategy['rules'], float(strategy['initial_cash'])))
+        
+        from .backtest import run_backtests
+        results = run_backtests(jobs, settings.BACKTEST_MAX_WORKERS)
+        
+        response = []
+        for dates, result in zip(calendars, results):
+            # Equity curve points use the PortfolioSnapshot field names
+            equity_curve = [
+                {'date': date, 'cash_balance': cash, 'stock_value': stock_value, 'total_value': total}
+                for date, cash, stock_value, total in zip(
+                    dates, result['cash_balance'], result['stock_value'], result['total_value']
+                )
+            ]
+            trades = [
+                {'date': dates[t], 'stock_symbol': symbol, 'transaction_type': side,
+                 'quantity': quantity, 'price': round(price, 2)}
+                for t, symbol, side, quantity, price in result['trades']
+            ]
+            response.append({
+                'total_return': result['total_return'],
+                'max_drawdown': result['max_drawdown'],
+                'trades': trades,
+                'equity_curve': equity_curve
+            })
+        return Response(response if many else response[0])
@@ -1,5 +1,12 @@
-# This will make sure the app is always imported when
-# Django starts so that shared_task will use this app.
-from .celery import app as celery_app
+# The Celery app is created on first use instead of at import time, so web
+# workers don't pay for importing Celery on start-up. The worker
+# (`celery -A virtual_stock_trading_api worker`) loads .celery directly, and
+# every tasks module imports it so queued tasks always use this app.
 
-__all__ = ('celery_app',)
\ No newline at end of file
+__all__ = ('celery_app',)
+
+def __getattr__(name):
+    if name == 'celery_app':
+        from .celery import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
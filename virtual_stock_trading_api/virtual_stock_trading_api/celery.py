@@ -1,12 +1,51 @@
 import os
 from celery import Celery
+from celery.signals import task_failure, task_postrun, task_prerun, task_retry
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'virtual_stock_trading_api.settings')
 
+# Queues, routes and the beat schedule come from the CELERY_* settings.
+# Run one worker per queue in production, sized by its profile:
+#   CELERY_WORKER_PROFILE=snapshots celery -A virtual_stock_trading_api worker -Q snapshots
 app = Celery('virtual_stock_trading_api')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+def apply_worker_profile(profile_name):
+    from django.conf import settings
+    profile = settings.TASK_WORKER_PROFILES.get(profile_name)
+    if profile is None:
+        raise ValueError(f"Unknown CELERY_WORKER_PROFILE: {profile_name}")
+    # Command line options (-c, --prefetch-multiplier) still take precedence
+    app.conf.worker_concurrency = profile['concurrency']
+    app.conf.worker_prefetch_multiplier = profile['prefetch_multiplier']
+
+@app.on_after_configure.connect
+def add_daily_schedule(sender, **kwargs):
+    # The end-of-day sweep needs a crontab, so it is added here rather than
+    # in settings, which web workers load without importing Celery
+    from celery.schedules import crontab
+    from django.conf import settings
+    sender.add_periodic_task(
+        crontab(hour=settings.SNAPSHOT_DAILY_HOUR, minute=0),
+        sender.signature('portfolios.tasks.create_daily_portfolio_snapshots'),
+        name='create-daily-portfolio-snapshots'
+    )
+
+def connect_metrics():
+    from django.conf import settings
+    if not settings.TASK_METRICS_ENABLED:
+        return
+    from . import task_metrics
+    task_prerun.connect(task_metrics.task_started, weak=False)
+    task_postrun.connect(task_metrics.task_finished, weak=False)
+    task_failure.connect(task_metrics.task_failed, weak=False)
+    task_retry.connect(task_metrics.task_retried, weak=False)
+
+if os.getenv('CELERY_WORKER_PROFILE'):
+    apply_worker_profile(os.environ['CELERY_WORKER_PROFILE'])
+connect_metrics()
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
-    print(f'Request: {self.request!r}')
\ No newline at end of file
+    print(f'Request: {self.request!r}')
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import threading
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import condition, require_GET
+
+# Prebuilt OpenAPI schema
+#
+# `manage.py build_openapi_schema` generates the document once at build time
+# into OPENAPI_SCHEMA_DIR as openapi-<API_VERSION>.json. Web workers serve
+# that file from memory with an ETag, so clients revalidate with a 304 and
+# requests never trigger schema generation. drf_yasg is only imported when
+# building the schema or when the Swagger UI is first opened.
+
+_lock = threading.Lock()
+_document = None
+_swagger_ui = None
+
+def schema_path():
+    return os.path.join(settings.OPENAPI_SCHEMA_DIR, f"openapi-{settings.API_VERSION}.json")
+
+def api_info():
+    from drf_yasg import openapi
+    return openapi.Info(
+        title="Virtual Stock Trading API",
+        default_version=settings.API_VERSION,
+        description="API for virtual stock trading platform",
+    )
+
+def generate_schema():
+    """
+    Render the full OpenAPI document as JSON bytes
+    """
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+    generator = OpenAPISchemaGenerator(info=api_info(), version=settings.API_VERSION)
+    return OpenAPICodecJson(validators=[]).encode(generator.get_schema(request=None, public=True))
+
+def build_schema():
+    """
+    Write the schema artifact; returns its path
+    """
+    path = schema_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fh:
+        fh.write(generate_schema())
+    return path
+
+def load_document():
+    """
+    (content, etag) of the artifact, read once per process. Without an
+    artifact (e.g. local development) the schema is generated once instead.
+    """
+    global _document
+    with _lock:
+        if _document is None:
+            try:
+                with open(schema_path(), 'rb') as fh:
+                    content = fh.read()
+            except FileNotFoundError:
+                content = generate_schema()
+            _document = (content, hashlib.sha256(content).hexdigest()[:32])
+        return _document
+
+@require_GET
+@condition(etag_func=lambda request: load_document()[1])
+def openapi_schema(request):
+    response = HttpResponse(load_document()[0], content_type='application/json')
+    response['Cache-Control'] = f"public, max-age={settings.OPENAPI_SCHEMA_MAX_AGE}"
+    return response
+
+def swagger_ui(request, *args, **kwargs):
+    """
+    Swagger UI pointed at the prebuilt schema (SWAGGER_SETTINGS['SPEC_URL'])
+    """
+    global _swagger_ui
+    with _lock:
+        if _swagger_ui is None:
+            from drf_yasg import openapi
+            from drf_yasg.generators import OpenAPISchemaGenerator
+            from drf_yasg.renderers import SwaggerUIRenderer
+            from drf_yasg.views import get_schema_view
+            from rest_framework import permissions
+
+            class ShellGenerator(OpenAPISchemaGenerator):
+                # The page only needs the title and version; the browser
+                # fetches the document itself from SPEC_URL
+                def get_schema(self, request=None, public=False):
+                    return openapi.Swagger(info=self.info, _prefix='/', _version=self.version,
+                                           paths=openapi.Paths({}))
+
+            schema_view = get_schema_view(api_info(), public=True, generator_class=ShellGenerator,
+                                          permission_classes=(permissions.AllowAny,))
+            _swagger_ui = schema_view.as_cached_view(renderer_classes=(SwaggerUIRenderer,))
+    return _swagger_ui(request, *args, **kwargs)
@@ -47,14 +47,22 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
-    'drf_yasg',
     'accounts',
     'portfolios',
     'stocks',
     'trading',
+    'risk',
+    'competitions',
+    'alerts',
 
 ]
 
+# Swagger UI at /swagger/. Turning it off keeps drf_yasg out of the process;
+# the prebuilt schema is served either way.
+API_DOCS_UI = os.getenv('API_DOCS_UI', 'True').lower() == 'true'
+if API_DOCS_UI:
+    INSTALLED_APPS.append('drf_yasg')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -65,6 +73,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'virtual_stock_trading_api.throttling.RateLimitHeadersMiddleware',
 ]
 
 ROOT_URLCONF = 'virtual_stock_trading_api.urls'
@@ -105,6 +114,57 @@ if 'DATABASE_URL' in os.environ:
         conn_health_checks=True,
     )
 
+# Portfolio data sharded by user across the databases in PORTFOLIO_SHARD_URLS
+# (comma separated, e.g. sqlite:///shard0.sqlite3,sqlite:///shard1.sqlite3).
+# Unset keeps everything on the default database.
+PORTFOLIO_SHARD_URLS = [url.strip() for url in os.getenv('PORTFOLIO_SHARD_URLS', '').split(',') if url.strip()]
+PORTFOLIO_SHARDS = [f'shard{index}' for index in range(len(PORTFOLIO_SHARD_URLS))]
+DATABASES.update({
+    alias: dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True)
+    for alias, url in zip(PORTFOLIO_SHARDS, PORTFOLIO_SHARD_URLS)
+})
+DATABASE_ROUTERS = ['portfolios.sharding.ShardRouter']
+# Ids handed out per shard; shard n allocates from (n + 1) * SHARD_ID_SPAN
+SHARD_ID_SPAN = int(os.getenv('SHARD_ID_SPAN', str(10 ** 12)))
+
+# Cache
+# Shared through Redis when CACHE_URL is set, otherwise per-process memory
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if os.getenv('CACHE_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL'),
+    }
+
+# Password hashing: the first hasher is used for new passwords; hashes made
+# with another algorithm or an older cost are upgraded on the next login
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'argon2')
+_PASSWORD_HASHERS = {
+    'argon2': 'accounts.hashers.TunableArgon2PasswordHasher',
+    'bcrypt': 'accounts.hashers.TunableBCryptSHA256PasswordHasher',
+    'pbkdf2': 'accounts.hashers.TunablePBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+]
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', '2'))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', '65536'))  # KiB
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', '1'))
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+PBKDF2_ITERATIONS = int(os.getenv('PBKDF2_ITERATIONS', '600000'))
+
+AUTHENTICATION_BACKENDS = ['accounts.backends.PooledHashingBackend']
+
+# Hashing pool per web process, and how many requests may wait on it
+AUTH_HASH_WORKERS = int(os.getenv('AUTH_HASH_WORKERS', '2'))
+AUTH_HASH_CONCURRENCY = int(os.getenv('AUTH_HASH_CONCURRENCY', '4'))
+AUTH_HASH_WAIT = float(os.getenv('AUTH_HASH_WAIT', '2'))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -152,8 +212,23 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'virtual_stock_trading_api.throttling.TokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        # Actions that call Finnhub or write trades
+        'upstream': os.getenv('THROTTLE_UPSTREAM_RATE', '30/min'),
+        'backtest': os.getenv('THROTTLE_BACKTEST_RATE', '10/min'),
+        'read': os.getenv('THROTTLE_READ_RATE', '600/min'),
+    },
 }
 
+# Token bucket throttling (shared through Redis when THROTTLE_REDIS_URL is set)
+THROTTLE_REDIS_URL = os.getenv('THROTTLE_REDIS_URL', '')
+THROTTLE_LEASE_SIZE = int(os.getenv('THROTTLE_LEASE_SIZE', '5'))
+THROTTLE_LEASE_SECONDS = float(os.getenv('THROTTLE_LEASE_SECONDS', '1'))
+THROTTLE_REDIS_RETRY_SECONDS = 30
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = DEBUG
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:3000').split(',')
@@ -161,5 +236,193 @@ CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:3000'
 # Finnhub API
 FINNHUB_API_KEY = os.getenv('FINNHUB_API_KEY', '')
 
+# Market data provider: 'finnhub', 'hedged' (several endpoints/keys), 'replay' (recorded responses)
+# or 'random_walk' (synthetic)
+MARKET_DATA_PROVIDER = os.getenv('MARKET_DATA_PROVIDER', 'finnhub')
+# Set to a file path to record every provider response for later replay
+MARKET_DATA_RECORD_PATH = os.getenv('MARKET_DATA_RECORD_PATH', '')
+MARKET_DATA_REPLAY_PATH = os.getenv('MARKET_DATA_REPLAY_PATH', os.path.join(BASE_DIR, 'market_data.jsonl'))
+SYNTHETIC_MARKET_SYMBOLS = int(os.getenv('SYNTHETIC_MARKET_SYMBOLS', '1000'))
+SYNTHETIC_MARKET_SEED = int(os.getenv('SYNTHETIC_MARKET_SEED', '0'))
+SYNTHETIC_MARKET_TICK_SECONDS = float(os.getenv('SYNTHETIC_MARKET_TICK_SECONDS', '1'))
+SYNTHETIC_MARKET_VOLATILITY = float(os.getenv('SYNTHETIC_MARKET_VOLATILITY', '0.001'))
+
+# Hedged quote fan-out: every base URL is paired with every API key
+FINNHUB_API_KEYS = [key for key in os.getenv('FINNHUB_API_KEYS', FINNHUB_API_KEY).split(',') if key]
+FINNHUB_BASE_URLS = os.getenv('FINNHUB_BASE_URLS', 'https://finnhub.io/api/v1').split(',')
+QUOTE_HEDGE_PERCENTILE = float(os.getenv('QUOTE_HEDGE_PERCENTILE', '95'))
+QUOTE_HEDGE_MIN_DELAY = float(os.getenv('QUOTE_HEDGE_MIN_DELAY', '0.05'))
+QUOTE_MAX_ATTEMPTS = int(os.getenv('QUOTE_MAX_ATTEMPTS', '2'))
+QUOTE_TIMEOUT = float(os.getenv('QUOTE_TIMEOUT', '5'))
+QUOTE_BREAKER_THRESHOLD = int(os.getenv('QUOTE_BREAKER_THRESHOLD', '5'))
+QUOTE_BREAKER_COOLDOWN = float(os.getenv('QUOTE_BREAKER_COOLDOWN', '30'))
+
+# Company profile cache (profiles barely change; unknown symbols are remembered for less time)
+PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', str(7 * 24 * 60 * 60)))
+PROFILE_NEGATIVE_CACHE_TTL = int(os.getenv('PROFILE_NEGATIVE_CACHE_TTL', str(60 * 60)))
+PROFILE_CACHE_PREWARM = os.getenv('PROFILE_CACHE_PREWARM', 'True').lower() == 'true'
+
+# Watchlist price refresh cycle
+WATCHLIST_REFRESH_SECONDS = int(os.getenv('WATCHLIST_REFRESH_SECONDS', '60'))
+WATCHLIST_REFRESH_CONCURRENCY = int(os.getenv('WATCHLIST_REFRESH_CONCURRENCY', '8'))
+QUOTE_CACHE_TTL = WATCHLIST_REFRESH_SECONDS * 2
+
+# Transaction ledger storage: 'table' (Transaction) or 'partitioned' (compact monthly LedgerEntry)
+TRANSACTION_LEDGER_MODE = os.getenv('TRANSACTION_LEDGER_MODE', 'table')
+LEDGER_ARCHIVE_DIR = os.getenv('LEDGER_ARCHIVE_DIR', os.path.join(BASE_DIR, 'ledger_archive'))
+LEDGER_HOT_MONTHS = int(os.getenv('LEDGER_HOT_MONTHS', '12'))
+
+# Backtesting process pool
+BACKTEST_MAX_WORKERS = int(os.getenv('BACKTEST_MAX_WORKERS', str(os.cpu_count() or 2)))
+BACKTEST_MAX_BATCH = int(os.getenv('BACKTEST_MAX_BATCH', '20'))
+
+# Corporate actions: 'file' reads CORPORATE_ACTIONS_PATH (CSV or JSON lines), 'stub' generates
+# synthetic dividends and splits. Holders are adjusted CORPORATE_ACTION_CHUNK_SIZE per transaction.
+CORPORATE_ACTIONS_PROVIDER = os.getenv('CORPORATE_ACTIONS_PROVIDER', 'file')
+CORPORATE_ACTIONS_PATH = os.getenv('CORPORATE_ACTIONS_PATH', os.path.join(BASE_DIR, 'corporate_actions.csv'))
+CORPORATE_ACTION_CHUNK_SIZE = int(os.getenv('CORPORATE_ACTION_CHUNK_SIZE', '5000'))
+
+# Simulated execution: 'instant' (full fill at the last price) or, opted into, 'impact'
+# (spread, square-root impact, partial fills). Liquidity comes from `manage.py compute_liquidity`.
+EXECUTION_MODEL = os.getenv('EXECUTION_MODEL', 'instant')
+EXECUTION_IMPACT_COEFFICIENT = float(os.getenv('EXECUTION_IMPACT_COEFFICIENT', '1.0'))
+EXECUTION_MAX_PARTICIPATION = float(os.getenv('EXECUTION_MAX_PARTICIPATION', '0.1'))
+EXECUTION_MIN_SPREAD_BPS = float(os.getenv('EXECUTION_MIN_SPREAD_BPS', '1'))
+EXECUTION_DEFAULT_SPREAD_BPS = float(os.getenv('EXECUTION_DEFAULT_SPREAD_BPS', '10'))
+EXECUTION_DEFAULT_VOLATILITY = float(os.getenv('EXECUTION_DEFAULT_VOLATILITY', '0.02'))
+EXECUTION_DEFAULT_ADV = float(os.getenv('EXECUTION_DEFAULT_ADV', '1000000'))
+LIQUIDITY_WINDOW_DAYS = int(os.getenv('LIQUIDITY_WINDOW_DAYS', '60'))
+
+# OpenAPI schema, generated at build time by `manage.py build_openapi_schema`
+API_VERSION = 'v1'
+OPENAPI_SCHEMA_DIR = os.getenv('OPENAPI_SCHEMA_DIR', os.path.join(BASE_DIR, 'openapi'))
+OPENAPI_SCHEMA_MAX_AGE = 300
+SWAGGER_SETTINGS = {
+    'SPEC_URL': 'openapi-schema',
+}
+
+# Admin changelists show the planner's row estimate instead of COUNT(*) past this size
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(os.getenv('ADMIN_ESTIMATED_COUNT_THRESHOLD', '100000'))
+
+# Dashboard summary cache
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', '60'))
+DASHBOARD_TOP_POSITIONS = 5
+DASHBOARD_RECENT_TRANSACTIONS = 5
+DASHBOARD_SPARKLINE_DAYS = 30
+
+# Portfolio snapshots: intraday interval and downsampling retention
+SNAPSHOT_INTERVAL_MINUTES = int(os.getenv('SNAPSHOT_INTERVAL_MINUTES', '5'))
+SNAPSHOT_RAW_RETENTION_HOURS = int(os.getenv('SNAPSHOT_RAW_RETENTION_HOURS', '48'))
+SNAPSHOT_HOURLY_RETENTION_DAYS = int(os.getenv('SNAPSHOT_HOURLY_RETENTION_DAYS', '30'))
+
+# Historical holdings: ledger events between checkpoints, and how far back a
+# past valuation looks for the last stored close
+HISTORY_CHECKPOINT_EVERY = int(os.getenv('HISTORY_CHECKPOINT_EVERY', '500'))
+HISTORY_PRICE_LOOKBACK_DAYS = int(os.getenv('HISTORY_PRICE_LOOKBACK_DAYS', '7'))
+
+# Risk limits checked against the per-symbol exposure aggregates (0 disables a limit)
+RISK_SYMBOL_NOTIONAL_LIMIT = float(os.getenv('RISK_SYMBOL_NOTIONAL_LIMIT', '1000000'))
+RISK_CONCENTRATION_LIMIT = float(os.getenv('RISK_CONCENTRATION_LIMIT', '0.25'))
+RISK_CHECK_SECONDS = int(os.getenv('RISK_CHECK_SECONDS', '60'))
+
+# Trade event outbox, relayed to a Redis stream by `manage.py relay_outbox`
+OUTBOX_REDIS_URL = os.getenv('OUTBOX_REDIS_URL', os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0'))
+OUTBOX_STREAM = os.getenv('OUTBOX_STREAM', 'trade-events')
+OUTBOX_STREAM_MAXLEN = int(os.getenv('OUTBOX_STREAM_MAXLEN', '1000000'))
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_POLL_SECONDS = float(os.getenv('OUTBOX_POLL_SECONDS', '1'))
+OUTBOX_RETENTION_HOURS = int(os.getenv('OUTBOX_RETENTION_HOURS', '72'))
+
+# Price alerts: evaluated in-process on every price change, sent to a Redis stream in batches
+ALERTS_STREAM = os.getenv('ALERTS_STREAM', 'price-alerts')
+ALERTS_STREAM_MAXLEN = int(os.getenv('ALERTS_STREAM_MAXLEN', '1000000'))
+ALERTS_BATCH_SIZE = int(os.getenv('ALERTS_BATCH_SIZE', '500'))
+ALERTS_DISPATCH_SECONDS = int(os.getenv('ALERTS_DISPATCH_SECONDS', '5'))
+ALERTS_SYNC_SECONDS = float(os.getenv('ALERTS_SYNC_SECONDS', '1'))
+# Ids below the high-water mark rescanned on each sync, for alerts that commit late
+ALERTS_SYNC_LOOKBACK = int(os.getenv('ALERTS_SYNC_LOOKBACK', '1000'))
+ALERTS_MAX_PER_USER = int(os.getenv('ALERTS_MAX_PER_USER', '100'))
+
 # Celery settings (if you decide to use it)
-CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
\ No newline at end of file
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+# Work is split by kind so a long snapshot sweep never delays quote refreshes
+# or alert delivery. A worker started without -Q consumes every queue.
+CELERY_TASK_DEFAULT_QUEUE = 'celery'
+CELERY_TASK_QUEUES = {
+    name: {'exchange': name, 'routing_key': name}
+    for name in ('celery', 'market-data', 'snapshots', 'notifications')
+}
+CELERY_TASK_ROUTES = {
+    'stocks.tasks.*': {'queue': 'market-data'},
+    'trading.tasks.refresh_liquidity': {'queue': 'market-data'},
+    'portfolios.tasks.*snapshot*': {'queue': 'snapshots'},
+    'portfolios.tasks.checkpoint_positions': {'queue': 'snapshots'},
+    'alerts.tasks.*': {'queue': 'notifications'},
+}
+# Worker sizing per queue, applied by celery.py when a worker is started with
+# CELERY_WORKER_PROFILE=<queue>. Quote refreshes are short and wait on the
+# network; snapshot batches are long, so they prefetch one at a time and a
+# sweep spreads over every idle worker.
+TASK_WORKER_PROFILES = {
+    'celery': {
+        'concurrency': int(os.getenv('CELERY_DEFAULT_CONCURRENCY', '2')),
+        'prefetch_multiplier': 1,
+    },
+    'market-data': {
+        'concurrency': int(os.getenv('CELERY_MARKET_DATA_CONCURRENCY', '8')),
+        'prefetch_multiplier': 4,
+    },
+    'snapshots': {
+        'concurrency': int(os.getenv('CELERY_SNAPSHOTS_CONCURRENCY', '4')),
+        'prefetch_multiplier': 1,
+    },
+    'notifications': {
+        'concurrency': int(os.getenv('CELERY_NOTIFICATIONS_CONCURRENCY', '2')),
+        'prefetch_multiplier': 8,
+    },
+}
+# Portfolios per snapshot task when a sweep is fanned out
+SNAPSHOT_FANOUT_BATCH = int(os.getenv('SNAPSHOT_FANOUT_BATCH', '2000'))
+# Hour (UTC) of the end-of-day snapshot sweep
+SNAPSHOT_DAILY_HOUR = int(os.getenv('SNAPSHOT_DAILY_HOUR', '21'))
+# Per-task run counts and durations, kept in Redis by the workers
+TASK_METRICS_ENABLED = os.getenv('TASK_METRICS_ENABLED', 'True').lower() == 'true'
+TASK_METRICS_REDIS_URL = os.getenv('TASK_METRICS_REDIS_URL', CELERY_BROKER_URL)
+CELERY_BEAT_SCHEDULE = {
+    'capture-intraday-snapshots': {
+        'task': 'portfolios.tasks.capture_intraday_snapshots',
+        'schedule': SNAPSHOT_INTERVAL_MINUTES * 60,
+    },
+    'downsample-portfolio-snapshots': {
+        'task': 'portfolios.tasks.downsample_portfolio_snapshots',
+        'schedule': 60 * 60,
+    },
+    'refresh-watched-prices': {
+        'task': 'stocks.tasks.refresh_watched_prices',
+        'schedule': WATCHLIST_REFRESH_SECONDS,
+    },
+    'check-risk-thresholds': {
+        'task': 'risk.tasks.check_risk_thresholds',
+        'schedule': RISK_CHECK_SECONDS,
+    },
+    'apply-corporate-actions': {
+        'task': 'portfolios.tasks.apply_corporate_actions',
+        'schedule': 24 * 60 * 60,
+    },
+    'refresh-liquidity': {
+        'task': 'trading.tasks.refresh_liquidity',
+        'schedule': 24 * 60 * 60,
+    },
+    'checkpoint-positions': {
+        'task': 'portfolios.tasks.checkpoint_positions',
+        'schedule': 24 * 60 * 60,
+    },
+    'advance-competitions': {
+        'task': 'competitions.tasks.advance_competitions',
+        'schedule': 60,
+    },
+    'dispatch-price-alerts': {
+        'task': 'alerts.tasks.dispatch_price_alerts',
+        'schedule': ALERTS_DISPATCH_SECONDS,
+    },
+}
\ No newline at end of file
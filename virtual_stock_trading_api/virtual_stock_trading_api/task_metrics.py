@@ -0,0 +1,112 @@
+import logging
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Task timing metrics
+#
+# Workers time every task from task_prerun to task_postrun and fold the
+# duration into a Redis hash per task name: runs, failures, retries, total
+# and max milliseconds, and a count per latency bucket, in one pipelined
+# round trip. Every worker process adds to the same hashes, so the numbers
+# cover the whole pool; `manage.py task_metrics` prints them. A Redis
+# outage only costs the metrics, never the task.
+
+KEY_PREFIX = 'task-metrics:'
+NAMES_KEY = 'task-metrics'
+# Upper bounds in milliseconds
+BUCKETS = (10, 100, 1000, 10000, 60000)
+
+# Keep the larger of the stored and the new value
+MAX_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'max_ms') or '0')
+if tonumber(ARGV[1]) > current then redis.call('HSET', KEYS[1], 'max_ms', ARGV[1]) end
+"""
+
+_client = None
+_started = {}
+
+def get_client():
+    # Created in the worker child on first use, never across a fork
+    global _client
+    if _client is None:
+        import redis
+        _client = redis.Redis.from_url(settings.TASK_METRICS_REDIS_URL, decode_responses=True)
+    return _client
+
+def bucket(ms):
+    for bound in BUCKETS:
+        if ms <= bound:
+            return f"le_{bound}"
+    return 'le_inf'
+
+def _record(name, **fields):
+    try:
+        pipe = get_client().pipeline(transaction=False)
+        key = KEY_PREFIX + name
+        pipe.sadd(NAMES_KEY, name)
+        for field, amount in fields.items():
+            if isinstance(amount, float):
+                pipe.hincrbyfloat(key, field, amount)
+            else:
+                pipe.hincrby(key, field, amount)
+        if 'total_ms' in fields:
+            pipe.eval(MAX_SCRIPT, 1, key, fields['total_ms'])
+        pipe.execute()
+    except Exception:
+        logger.warning("Could not record metrics for %s", name, exc_info=True)
+
+def task_started(task_id=None, task=None, **kwargs):
+    _started[task_id] = time.perf_counter()
+
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is None or task is None:
+        return
+    ms = (time.perf_counter() - started) * 1000
+    queue = (getattr(task.request, 'delivery_info', None) or {}).get('routing_key')
+    logger.info("Task %s [%s] %s in %.1f ms on %s", task.name, task_id, state, ms, queue)
+    _record(task.name, runs=1, total_ms=round(ms, 3), **{bucket(ms): 1})
+
+def task_failed(sender=None, task_id=None, **kwargs):
+    if sender is not None:
+        _record(sender.name, failures=1)
+
+def task_retried(sender=None, request=None, **kwargs):
+    if sender is not None:
+        _record(sender.name, retries=1)
+
+def read_metrics(client=None):
+    """
+    One dict per task name, slowest total first
+    """
+    client = client or get_client()
+    names = sorted(client.smembers(NAMES_KEY))
+    pipe = client.pipeline(transaction=False)
+    for name in names:
+        pipe.hgetall(KEY_PREFIX + name)
+    rows = []
+    for name, fields in zip(names, pipe.execute()):
+        runs = int(fields.get('runs', 0))
+        total_ms = float(fields.get('total_ms', 0))
+        rows.append({
+            'task': name,
+            'runs': runs,
+            'failures': int(fields.get('failures', 0)),
+            'retries': int(fields.get('retries', 0)),
+            'mean_ms': total_ms / runs if runs else 0.0,
+            'max_ms': float(fields.get('max_ms', 0)),
+            'total_ms': total_ms,
+            'buckets': {f"le_{bound}": int(fields.get(f"le_{bound}", 0)) for bound in BUCKETS + ('inf',)},
+        })
+    rows.sort(key=lambda row: row['total_ms'], reverse=True)
+    return rows
+
+def reset_metrics(client=None):
+    client = client or get_client()
+    names = client.smembers(NAMES_KEY)
+    if names:
+        client.delete(*[KEY_PREFIX + name for name in names])
+    client.delete(NAMES_KEY)
+    return len(names)
@@ -0,0 +1,16 @@
+from .settings import *
+
+# Settings for `manage.py test`
+#
+# The suite needs no environment of its own: a fixed secret key, and a
+# shard0 and shard1 for the sharding tests. Configured shards
+# (PORTFOLIO_SHARD_URLS) are used as they are; missing ones become
+# throwaway SQLite databases. Sharding is off unless a test turns it on
+# with override_settings(PORTFOLIO_SHARDS=[...]), so the other tests only
+# need the default database.
+
+SECRET_KEY = 'test-only-secret-key'
+
+for alias in ('shard0', 'shard1'):
+    DATABASES.setdefault(alias, {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / f'{alias}.sqlite3'})
+PORTFOLIO_SHARDS = []
@@ -0,0 +1,32 @@
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from .throttling import TokenBucketStore
+
+@override_settings(THROTTLE_REDIS_URL='', THROTTLE_LEASE_SIZE=5, THROTTLE_LEASE_SECONDS=1)
+class TokenBucketStoreTests(SimpleTestCase):
+    """
+    Leases against the local bucket, with a refill slow enough to ignore
+    """
+    capacity = 30
+    rate = 1e-9
+
+    def spend(self, store, requests, gap):
+        allowed = 0
+        with mock.patch('virtual_stock_trading_api.throttling.time.monotonic') as clock:
+            for index in range(requests):
+                clock.return_value = 1000 + index * gap
+                allowed += store.consume('throttle:test:1', self.capacity, self.rate)[0]
+        return allowed
+
+    def test_burst_spends_the_capacity(self):
+        self.assertEqual(self.spend(TokenBucketStore(), 40, gap=0.01), self.capacity)
+
+    def test_sparse_requests_spend_the_capacity(self):
+        # Every request finds the previous lease expired
+        self.assertEqual(self.spend(TokenBucketStore(), 40, gap=5), self.capacity)
+
+    def test_remaining_counts_the_lease(self):
+        store = TokenBucketStore()
+        with mock.patch('virtual_stock_trading_api.throttling.time.monotonic', return_value=1000):
+            self.assertEqual(store.consume('throttle:test:2', self.capacity, self.rate), (True, 29))
+            self.assertEqual(store.consume('throttle:test:2', self.capacity, self.rate), (True, 28))
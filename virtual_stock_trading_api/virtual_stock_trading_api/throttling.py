@@ -0,0 +1,171 @@
+import threading
+import time
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+# Token-bucket request throttling
+#
+# Buckets live in Redis so every worker shares the same budget. To keep most
+# checks off the network, each process leases a small batch of tokens at a time
+# and spends them locally until the lease runs out or expires; tokens left on an
+# expired lease go back to the bucket with the next lease. When Redis is not
+# configured or unreachable, a per-process bucket is used instead. The redis
+# client library is only imported once THROTTLE_REDIS_URL is set.
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local returned = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate + returned)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {granted, tostring(tokens)}
+"""
+
+def parse_rate(rate):
+    """
+    '30/min' -> (30, 60)
+    """
+    count, period = rate.split('/')
+    seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+    return int(count), seconds
+
+class LocalBucket:
+    """
+    In-process token bucket, used when Redis is unavailable
+    """
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.ts = time.monotonic()
+
+    def take(self, requested, returned=0):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate + returned)
+        self.ts = now
+        granted = min(requested, int(self.tokens))
+        self.tokens -= granted
+        return granted, self.tokens
+
+class Lease:
+    """
+    Tokens taken from the shared bucket and not yet spent by this process
+    """
+    def __init__(self, tokens, remaining, expires):
+        self.tokens = tokens
+        self.remaining = remaining
+        self.expires = expires
+
+class TokenBucketStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.leases = {}
+        self.local_buckets = {}
+        self.client = None
+        self.script = None
+        self.redis_down_until = 0
+
+    def get_client(self):
+        url = getattr(settings, 'THROTTLE_REDIS_URL', '')
+        if not url or time.monotonic() < self.redis_down_until:
+            return None
+        if self.client is None:
+            import redis
+            self.client = redis.Redis.from_url(url, socket_connect_timeout=0.2, socket_timeout=0.2)
+            self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        return self.client
+
+    def take_shared(self, key, capacity, rate, requested, returned=0):
+        """
+        Take up to `requested` tokens after putting back `returned` unspent ones
+        """
+        client = self.get_client()
+        if client is not None:
+            import redis
+            try:
+                granted, remaining = self.script(keys=[key], args=[capacity, rate, requested, returned])
+                return int(granted), float(remaining)
+            except redis.RedisError:
+                # Fall back to local buckets for a while instead of timing out every request
+                self.redis_down_until = time.monotonic() + settings.THROTTLE_REDIS_RETRY_SECONDS
+        bucket = self.local_buckets.get(key)
+        if bucket is None:
+            bucket = self.local_buckets[key] = LocalBucket(capacity, rate)
+        return bucket.take(requested, returned)
+
+    def consume(self, key, capacity, rate):
+        """
+        Spend one token. Returns (allowed, remaining budget).
+        """
+        with self.lock:
+            now = time.monotonic()
+            lease = self.leases.get(key)
+            if lease is None or lease.tokens == 0 or lease.expires < now:
+                batch = min(settings.THROTTLE_LEASE_SIZE, max(1, capacity // 10))
+                # An expired lease hands its unspent tokens back, so sparse
+                # callers spend the full rate instead of one token per lease
+                unspent = lease.tokens if lease is not None else 0
+                granted, remaining = self.take_shared(key, capacity, rate, batch, unspent)
+                lease = self.leases[key] = Lease(granted, remaining, now + settings.THROTTLE_LEASE_SECONDS)
+            if lease.tokens == 0:
+                return False, 0
+            lease.tokens -= 1
+            return True, int(lease.remaining) + lease.tokens
+
+store = TokenBucketStore()
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle each user (or client IP) per scope. Views pick a scope with
+    `throttle_scope`, or per action with `throttle_scopes`; everything else
+    uses the 'read' bucket. Rates come from DEFAULT_THROTTLE_RATES.
+    """
+    default_scope = 'read'
+
+    def get_scope(self, view):
+        scopes = getattr(view, 'throttle_scopes', {})
+        action = getattr(view, 'action', None)
+        return scopes.get(action) or getattr(view, 'throttle_scope', self.default_scope)
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(view)
+        rate = settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {}).get(scope)
+        if rate is None:
+            return True
+
+        capacity, period = parse_rate(rate)
+        self.refill_rate = capacity / period
+        ident = request.user.pk if request.user and request.user.is_authenticated else self.get_ident(request)
+        allowed, remaining = store.consume(f"throttle:{scope}:{ident}", capacity, self.refill_rate)
+
+        # Picked up by RateLimitHeadersMiddleware
+        request._request.rate_limit = {'scope': scope, 'limit': capacity, 'remaining': remaining}
+        return allowed
+
+    def wait(self):
+        return 1 / self.refill_rate
+
+class RateLimitHeadersMiddleware:
+    """
+    Expose the caller's remaining budget on throttled endpoints
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit:
+            response['X-RateLimit-Scope'] = rate_limit['scope']
+            response['X-RateLimit-Limit'] = str(rate_limit['limit'])
+            response['X-RateLimit-Remaining'] = str(rate_limit['remaining'])
+        return response
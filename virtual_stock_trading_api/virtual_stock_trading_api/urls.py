@@ -15,21 +15,11 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Virtual Stock Trading API",
-        default_version='v1',
-        description="API for virtual stock trading platform",
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from portfolios.views import DashboardView
+from .schema import openapi_schema, swagger_ui
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -37,5 +27,12 @@ urlpatterns = [
     path('api/stocks/', include('stocks.urls')),
     path('api/portfolios/', include('portfolios.urls')),
     path('api/trading/', include('trading.urls')),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('api/risk/', include('risk.urls')),
+    path('api/competitions/', include('competitions.urls')),
+    path('api/alerts/', include('alerts.urls')),
+    path('api/dashboard/', DashboardView.as_view(), name='dashboard'),
+    path(f"api/schema/openapi-{settings.API_VERSION}.json", openapi_schema, name='openapi-schema'),
 ]
+
+if settings.API_DOCS_UI:
+    urlpatterns.append(path('swagger/', swagger_ui, name='schema-swagger-ui'))